@@ -0,0 +1,7 @@
+-- Candidate indexes for the DPr queries (get_dpr_data.sql, select_dpr_ids.sql and select_dpr_with_deleted.sql). Each
+-- index contains every column the queries read from its table, so the rows themselves would not be read. They have not
+-- been measured on MariaDB yet: create them in DPr only after python -m benchmarks.dpr_queries (see
+-- benchmarks/README.md) shows that the plans use them and the queries get faster.
+CREATE INDEX IF NOT EXISTS items_status_deleted ON items (status, deleted);
+CREATE INDEX IF NOT EXISTS persons_item_deleted ON persons (item_id, deleted, wiag, factgrid);
+CREATE INDEX IF NOT EXISTS gsn_item_deleted ON gsn (item_id, deleted, nummer);
\ No newline at end of file
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import time
+from datetime import datetime
+from benchmarks.run import REPO_PATH, RESULTS_PATH, version_info
+
+# Compares the DPr queries of the queries folder with their previous versions on a local MariaDB server: the tables
+# items, persons and gsn are filled with synthetic data (in the database given, which is emptied first), then every
+# query is timed and its EXPLAIN plan is recorded, first with the indexes of a bare DPr installation and then again with
+# the candidate indexes of benchmarks/dpr_indexes.sql. The results of the queries are checked against the ones expected
+# from the data. At the end every candidate index is listed with the revised queries whose plans use it and their
+# runtimes without and with the indexes (see evaluate_indexes).
+# Needs PyMySQL (pip install pymysql), e.g.:
+#   python -m benchmarks.dpr_queries --persons 100000 --user root --password <password>
+
+QUERIES_DIR = 'queries'
+QUERY_FILES = ['get_dpr_data.sql', 'select_dpr_ids.sql', 'select_dpr_with_deleted.sql']
+INDEXES_FILE = os.path.join('benchmarks', 'dpr_indexes.sql')
+
+# the queries before they were rewritten - get_dpr_data keeps an arbitrary row of each WIAG-ID (and drops the WIAG-ID if
+# that row does not have the lowest gsn.id)
+PREVIOUS_QUERIES = {
+    'get_dpr_data.sql': """SELECT persons.wiag, persons.id, gsn.id, gsn.nummer
+FROM items
+INNER JOIN persons ON persons.item_id = items.id AND persons.deleted=0 AND items.deleted=0 AND items.status = "online"
+INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted=0
+WHERE persons.wiag IS NOT NULL AND persons.wiag != ''
+group by persons.wiag
+having gsn.id=min(gsn.id)""",
+    'select_dpr_ids.sql': """SELECT persons.factgrid, persons.id, gsn.nummer
+FROM items
+INNER JOIN persons ON persons.item_id = items.id AND persons.deleted=0 AND items.deleted=0 AND items.status = "online"
+INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted=0""",
+    'select_dpr_with_deleted.sql': """SELECT persons.factgrid, persons.id, gsn.nummer, gsn.deleted
+FROM items
+INNER JOIN persons ON persons.item_id = items.id AND items.status = 'online'
+INNER JOIN gsn ON gsn.item_id = items.id""",
+}
+
+# The columns of the DPr tables that the queries use, the keys of the foreign keys and a text column standing in for
+# the other columns of the rows (names, dates, notes, ...), which makes reading whole rows as expensive as in DPr
+SCHEMA = [
+    """CREATE TABLE items (
+  id INT UNSIGNED NOT NULL PRIMARY KEY,
+  status VARCHAR(20) NOT NULL,
+  deleted TINYINT(1) NOT NULL DEFAULT 0,
+  other_columns VARCHAR(1000)
+)""",
+    """CREATE TABLE persons (
+  id INT UNSIGNED NOT NULL PRIMARY KEY,
+  item_id INT UNSIGNED NOT NULL,
+  wiag VARCHAR(255),
+  factgrid VARCHAR(255),
+  deleted TINYINT(1) NOT NULL DEFAULT 0,
+  other_columns VARCHAR(1000),
+  KEY persons_item_id (item_id)
+)""",
+    """CREATE TABLE gsn (
+  id INT UNSIGNED NOT NULL PRIMARY KEY,
+  item_id INT UNSIGNED NOT NULL,
+  nummer VARCHAR(255),
+  deleted TINYINT(1) NOT NULL DEFAULT 0,
+  other_columns VARCHAR(1000),
+  KEY gsn_item_id (item_id)
+)""",
+]
+INSERT_BATCH_SIZE = 5000
+OTHER_COLUMNS_LENGTH = 300
+
+OTHER_ITEMS_SHARE = 0.5 # items that are not persons (institutions, places, ...), with a GSN as well
+OFFLINE_SHARE = 0.05
+DELETED_SHARE = 0.02 # of items, persons and GSNs each
+WIAG_SHARE = 0.6 # persons linked to WIAG
+SHARED_WIAG_SHARE = 0.03 # persons with the WIAG-ID of another person (entries that were merged in WIAG)
+FACTGRID_SHARE = 0.5 # persons linked to FactGrid
+MORE_GSNS_SHARE = 0.05 # items with two or three GSNs
+
+
+# the rows with a random text as the last column (other_columns)
+def with_other_columns(rows: list, rng) -> list:
+    return [row + (rng.randbytes(OTHER_COLUMNS_LENGTH // 2).hex(),) for row in rows]
+
+
+# items, persons and gsn as lists of rows
+def generate(n_persons: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    n_items = int(n_persons / (1 - OTHER_ITEMS_SHARE))
+    items = [(item_id, 'offline' if rng.random() < OFFLINE_SHARE else 'online', int(rng.random() < DELETED_SHARE)) for item_id in range(1, n_items + 1)]
+
+    # the persons are spread over the items, so the IDs of persons and their items differ
+    person_items = sorted(rng.sample(range(1, n_items + 1), n_persons))
+    persons = []
+    for person_id, item_id in enumerate(person_items, start=1):
+        wiag = f"WIAG-Pers-CANON-{person_id:05d}-001" if rng.random() < WIAG_SHARE else rng.choice([None, ''])
+        if wiag and persons and rng.random() < SHARED_WIAG_SHARE:
+            wiag = rng.choice([person[2] for person in persons[-100:] if person[2]] or [wiag])
+        factgrid = f"Q{100000 + person_id}" if rng.random() < FACTGRID_SHARE else rng.choice([None, ''])
+        persons.append((person_id, item_id, wiag, factgrid, int(rng.random() < DELETED_SHARE)))
+
+    # the GSNs are numbered in a different order than the items
+    gsn_items = [item_id for (item_id, _, _) in items for _ in range(rng.choice([2, 3]) if rng.random() < MORE_GSNS_SHARE else 1)]
+    rng.shuffle(gsn_items)
+    gsn = [(gsn_id, item_id, f"{item_id % 1000:03d}-{gsn_id:05d}-001", int(rng.random() < DELETED_SHARE)) for gsn_id, item_id in enumerate(gsn_items, start=1)]
+    return {'items': with_other_columns(items, rng), 'persons': with_other_columns(persons, rng), 'gsn': with_other_columns(gsn, rng)}
+
+
+# the results the queries should return for the data, in their order
+def expected_results(data: dict) -> dict:
+    items = {row[0]: (row[1], row[2]) for row in data['items']}
+    gsn_by_item = {}
+    for row in data['gsn']:
+        gsn_by_item.setdefault(row[1], []).append(row)
+
+    joined = [(person, gsn) for person in data['persons'] for gsn in gsn_by_item.get(person[1], []) if items[person[1]][0] == 'online']
+    active = [(person, gsn) for (person, gsn) in joined if not person[4] and not gsn[3] and not items[person[1]][1]]
+
+    first_by_wiag = {}
+    for (person, gsn) in sorted(active, key=lambda pair: (pair[1][0], pair[0][0])):
+        if person[2]:
+            first_by_wiag.setdefault(person[2], (person[2], person[0], gsn[0], gsn[2]))
+    return {
+        'get_dpr_data.sql': sorted(first_by_wiag.values()),
+        'select_dpr_ids.sql': [(person[3], person[0], gsn[2]) for (person, gsn) in sorted(active, key=lambda pair: (pair[0][0], pair[1][0]))],
+        'select_dpr_with_deleted.sql': [
+            (person[3], person[0], gsn[2], gsn[3]) for (person, gsn) in sorted(joined, key=lambda pair: (pair[0][0], pair[1][0])) if person[3]
+        ],
+    }
+
+
+def connect(args):
+    import pymysql # only needed for this benchmark
+
+    return pymysql.connect(host=args.host, port=args.port, user=args.user, password=args.password, autocommit=True)
+
+
+# creates the database again with the tables of 'schema' and the rows of 'data' (table: rows)
+def load(cursor, database: str, schema: list, data: dict):
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    for statement in schema:
+        cursor.execute(statement)
+    for table, rows in data.items():
+        statement = f"INSERT INTO {table} VALUES ({', '.join(['%s'] * len(rows[0]))})"
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            cursor.executemany(statement, rows[start:start + INSERT_BATCH_SIZE])
+    analyze(cursor, list(data))
+
+
+def analyze(cursor, tables: list):
+    cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+    cursor.fetchall()
+
+
+# the statements of a .sql file (path relative to the repository, separated by semicolons, without comments)
+def read_statements(path: str) -> list:
+    with open(os.path.join(REPO_PATH, path), encoding='utf-8') as f:
+        lines = [line for line in f.read().splitlines() if not line.lstrip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def explain(cursor, query: str) -> list:
+    cursor.execute('EXPLAIN ' + query)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# the runtime of the query (median of 'repeat' runs, including fetching the rows) and its rows
+def time_query(cursor, query: str, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        times.append(time.perf_counter() - start)
+    return (statistics.median(times), [tuple(row) for row in rows])
+
+
+def print_plan(plan: list):
+    for step in plan:
+        print(f"    {step['table'] or '':<20} {step['type'] or '':<8} key={step['key'] or '-':<24} rows={step['rows'] or '-':<10} {step['Extra'] or ''}")
+
+
+# whether the rows are the expected ones - in their order only if the query sorts them
+def as_expected(query: str, rows: list, expected: list) -> bool:
+    return rows == expected if 'ORDER BY' in query.upper() else sorted(rows, key=repr) == sorted(expected, key=repr)
+
+
+# Times every query of 'queries' (file: {version: query}) and checks its rows against the expected ones
+def run_queries(cursor, queries: dict, expected: dict, repeat: int) -> dict:
+    results = {}
+    for filename, versions in queries.items():
+        results[filename] = {}
+        for version, query in versions.items():
+            plan = explain(cursor, query)
+            (seconds, rows) = time_query(cursor, query, repeat)
+            results[filename][version] = {'median_s': round(seconds, 4), 'rows': len(rows), 'as_expected': as_expected(query, rows, expected[filename]), 'plan': plan}
+            print(f"  {filename} ({version}): {seconds:.4f} s, {len(rows)} rows, as expected: {results[filename][version]['as_expected']}")
+            print_plan(plan)
+    return results
+
+
+CREATE_INDEX = re.compile(r'CREATE INDEX (?:IF NOT EXISTS )?(\w+) ON (\w+)', re.IGNORECASE)
+
+
+# The candidate indexes with the revised queries whose plans use them and whether those got faster. Only the indexes
+# that a plan uses and that make all of these queries faster are recommended.
+def evaluate_indexes(statements: list, without_indexes: dict, with_indexes: dict) -> dict:
+    evaluation = {}
+    for statement in statements:
+        if (match := CREATE_INDEX.search(statement)) is None:
+            continue
+        (index, table) = match.groups()
+        used_by = {
+            filename: {'without_s': without_indexes[filename]['revised']['median_s'], 'with_s': versions['revised']['median_s']}
+            for filename, versions in with_indexes.items()
+            if any(index in (step['key'] or '').split(',') for step in versions['revised']['plan']) # 'table' can be an alias
+        }
+        faster = bool(used_by) and all(times['with_s'] < times['without_s'] for times in used_by.values())
+        evaluation[index] = {'table': table, 'used_by': used_by, 'recommended': faster}
+    return evaluation
+
+
+def print_evaluation(evaluation: dict):
+    for index, result in evaluation.items():
+        queries = ', '.join(f"{filename} {times['without_s']:.4f} s -> {times['with_s']:.4f} s" for filename, times in result['used_by'].items())
+        print(f"  {index}: {'recommended' if result['recommended'] else 'not recommended'} ({queries or 'not used by any plan'})")
+
+
+# Loads the data, runs the queries without and with the indexes of indexes_file and saves the results as 'name'
+def run_benchmark(args, name: str, schema: list, data: dict, queries: dict, expected: dict, indexes_file: str) -> str:
+    start = time.perf_counter()
+    connection = connect(args)
+    with connection.cursor() as cursor:
+        # the previous get_dpr_data query groups by persons.wiag alone, which ONLY_FULL_GROUP_BY does not allow
+        cursor.execute("SET SESSION sql_mode = REPLACE(@@sql_mode, 'ONLY_FULL_GROUP_BY', '')")
+        load(cursor, args.database, schema, data)
+        print(f"Loaded {', '.join(f'{len(rows)} rows into {table}' for table, rows in data.items())} in {time.perf_counter() - start:.1f} s.\n")
+        cursor.execute('SELECT VERSION()')
+        server_version = cursor.fetchone()[0]
+
+        print(f"Without the indexes of {indexes_file}:")
+        without_indexes = run_queries(cursor, queries, expected, args.repeat)
+        index_statements = read_statements(indexes_file)
+        for statement in index_statements:
+            cursor.execute(statement)
+        analyze(cursor, list(data))
+        print(f"\nWith the indexes of {indexes_file}:")
+        with_indexes = run_queries(cursor, queries, expected, args.repeat)
+    connection.close()
+
+    indexes = evaluate_indexes(index_statements, without_indexes, with_indexes)
+    print(f"\nThe indexes of {indexes_file}:")
+    print_evaluation(indexes)
+
+    info = version_info() | {'server': server_version}
+    report = {
+        'info': info,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'persons': args.persons,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'queries': {'without_indexes': without_indexes, 'with_indexes': with_indexes},
+        'indexes': indexes,
+    }
+    os.makedirs(args.results_path, exist_ok=True)
+    results_file = os.path.join(args.results_path, f"{datetime.now().strftime('%Y-%m-%d_%H%M%S')}_{info['commit'] or info['version']}_{name}_{args.persons}.json")
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nResults were saved to {results_file}")
+    return results_file
+
+
+def run(args) -> str:
+    data = generate(args.persons, args.seed)
+    queries = {filename: {'previous': PREVIOUS_QUERIES[filename], 'revised': read_statements(os.path.join(QUERIES_DIR, filename))[0]} for filename in QUERY_FILES}
+    return run_benchmark(args, 'dpr_queries', SCHEMA, data, queries, expected_results(data), INDEXES_FILE)
+
+
+# the options of the connection and the data, shared with wiag_queries.py
+def argument_parser(description: str, persons: int, database: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--persons', type=int, default=persons)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default=os.environ.get('MARIADB_PASSWORD', ''), help="default: the environment variable MARIADB_PASSWORD")
+    parser.add_argument('--database', default=database, help="the database is deleted and created again")
+    parser.add_argument('--results-path', default=RESULTS_PATH)
+    return parser
+
+
+if __name__ == '__main__':
+    run(argument_parser("Times the DPr queries and their previous versions on a local MariaDB server with synthetic data.", 100000, 'dpr_benchmark').parse_args())
@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from datetime import datetime
+import pandas as pd
+import polars as pl
+from benchmarks.synthetic import generate
+from scripts.ingest import read_export, read_export_pandas
+from scripts.fg_reference import (
+    FgReference, REFERENCE_TABLES, PERSON_CROSSWALK_VARIABLES, OFFICE_STATEMENTS_COLUMNS, to_frame, to_statements_frame, to_crosswalk_frame, fg_wiag_ids, fg_gsn_items
+)
+from scripts.json_decoding import decode_bindings
+from scripts.label_index import suggest_candidates
+from scripts.glossary import glossary_translation
+from scripts.fg_import_persons_functions import build_descriptions, prepare_persons, write_persons_v1, RELEVANT_ROLE_GROUP_FQ_IDS
+from scripts.wiag_to_factgrid_functions import (
+    DateType, date_parsing, resolve_dioceses, match_inst_roles, office_plan, collect_offices, add_date_clauses, remove_existing_offices,
+    write_offices_v1
+)
+from scripts.artefacts import from_pandas
+from scripts.identity_graph import collect_links, find_conflicts
+from scripts.id_codec import merge_ids
+from scripts.quickstatements import STRING, write_csv
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(REPO_PATH, 'benchmarks', 'results')
+
+
+def version_info() -> dict:
+    with open(os.path.join(REPO_PATH, 'pyproject.toml'), 'rb') as f:
+        version = tomllib.load(f)['project']['version']
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'version': version,
+        'commit': commit,
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+    }
+
+
+# runs function 'repeat' times and returns the last result together with the measured times
+def measure(function, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return (result, times)
+
+
+def read_json(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']['bindings']
+
+
+# the values of 'variables' in a stored SPARQL result, decoded like the responses of the query service
+def read_bindings(path: str, variables) -> dict:
+    with open(path, 'rb') as f:
+        return decode_bindings(f.read(), variables)
+
+
+# the modules imported by the notebooks and command line tools, whose cold start is measured
+STARTUP_MODULES = [
+    'scripts.translate',
+    'scripts.fg_reference',
+    'scripts.wiag_to_factgrid_functions',
+    'scripts.fg_import_persons_functions',
+    'scripts.fg_wiag_ids_functions',
+    'scripts.batch',
+    'standins.server',
+]
+
+
+# Every module is imported in a new Python process (without an API key, which must not be needed for importing), so
+# the time includes everything the module imports. 'python' is the start of the interpreter alone.
+def measure_startup(repeat: int) -> dict:
+    env = {name: value for name, value in os.environ.items() if name != 'API_KEY'}
+    results = {}
+    for module in ['python'] + STARTUP_MODULES:
+        command = [sys.executable, '-c', f"import {module}" if module != 'python' else 'pass']
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=REPO_PATH, env=env, check=True)
+            times.append(time.perf_counter() - start)
+        name = f"import_{module.removeprefix('scripts.')}"
+        results[name] = {'min_s': min(times), 'median_s': statistics.median(times), 'rows': None}
+        print(f"{name:<28} {min(times):>9.4f} s  (median {statistics.median(times):.4f} s)")
+    return results
+
+
+LABEL_INDEXES = ['diocese_index', 'institution_index', 'inst_role_index']
+
+
+# the indexes are built when first used and then kept by the FgReference, so they are removed first
+def build_label_indexes(fg_reference: FgReference) -> list:
+    for name in LABEL_INDEXES:
+        fg_reference.__dict__.pop(name, None)
+    return [getattr(fg_reference, name) for name in LABEL_INDEXES]
+
+
+# the candidates for everything that could not be matched, as in notebook 4 and the batch mode
+def suggest_unmatched(fg_reference: FgReference, missing_inst_df, missing_dioc_df, not_found_df) -> list:
+    return [
+        suggest_candidates(fg_reference.institution_index, missing_inst_df.get_column('institution')),
+        suggest_candidates(fg_reference.diocese_index, missing_dioc_df.get_column('diocese')),
+        suggest_candidates(fg_reference.inst_role_index, not_found_df.get_column('role') + ' ' + not_found_df.get_column('institution')),
+    ]
+
+
+def parse_fg_reference(paths: dict) -> FgReference:
+    tables = {table: to_frame(table, read_bindings(paths[f"sparql_{table}"], REFERENCE_TABLES[table]['columns'])) for table in ['institutions', 'dioceses', 'inst_roles']}
+    diocese_df = tables['dioceses'].with_columns(pl.col('dioc_alt').str.replace('^(BITECA|BETA).*', ''))
+    return FgReference(tables['institutions'], diocese_df, tables['inst_roles'], datetime.now())
+
+
+def parse_dates(offices_df) -> int:
+    failed = 0
+    for (date_begin, date_end) in offices_df.select('date_begin', 'date_end').iter_rows():
+        for (date_string, date_type) in [(date_begin, DateType.BEGIN_DATE), (date_end, DateType.END_DATE)]:
+            if date_string is not None:
+                try:
+                    date_parsing(date_string, date_type)
+                except Exception:
+                    failed += 1
+    return failed
+
+
+# the same loading and cleaning of the query results as in the notebooks fg_wiag_ids, fg_to_dpr and dpr_to_fg
+def parse_fg_ids_pandas(path: str, id_column: str, value_column: str):
+    df = pd.json_normalize(read_json(path))
+    df = df.drop(columns=[column for column in df.columns if column.endswith('type') or column.endswith('xml:lang')])
+    df[f"{id_column}.value"] = df[f"{id_column}.value"].map(lambda x: x.strip('https://database.factgrid.de/entity/'))
+    df.columns = ['fg_id', value_column]
+    return df
+
+
+# the comparisons of the notebooks dpr_recon (4.), fg_wiag_ids (3.), fg_to_dpr (4.) and dpr_to_fg (4.)
+def consistency_merges(data: dict) -> dict:
+    ic_df, dpr_df = data['wiag_person_ids_pd'], data['dpr_persons_pd']
+    joined_df = merge_ids(ic_df, dpr_df, 'gsn', on='gsn', suffixes=('_wiag', '_dpr'))
+    dpr_recon_df = joined_df[joined_df['wiag_id_wiag'] != joined_df['wiag_id_dpr']]
+
+    wiag_persons_df = data['lebensdaten_pd'][['FactGrid_ID', 'id']].set_axis(['wiag_fg_id', 'wiag_id'], axis=1)
+    outer_df = merge_ids(data['p601_pd'], wiag_persons_df, 'wiag', how='outer', left_on='fg_wiag_id', right_on='wiag_id')
+    fg_wiag_ids_df = outer_df[~outer_df['wiag_fg_id'].isna() & outer_df['fg_id'].isna()]
+
+    factgrid_df = data['p472_pd'].rename(columns={'fg_id': 'FactGrid_ID'})
+    joined_df = merge_ids(factgrid_df, data['dpr_ids_pd'], 'gsn', how='outer', on='gsn', suffixes=('_wiag', '_pd'), indicator=True)
+    fg_to_dpr_df = joined_df[(joined_df['_merge'] == 'both') & (joined_df['FactGrid_ID'] != joined_df['fg_id'])]
+
+    joined_df = merge_ids(data['dpr_with_deleted_pd'], factgrid_df, 'qid', left_on='fg_id', right_on='FactGrid_ID', suffixes=('_dpr', '_fg'))
+    dpr_to_fg_df = joined_df[(joined_df['is_deleted'] == 0) & (joined_df['gsn_dpr'] != joined_df['gsn_fg'])]
+
+    return {'dpr_recon': dpr_recon_df, 'fg_wiag_ids': fg_wiag_ids_df, 'fg_to_dpr': fg_to_dpr_df, 'dpr_to_fg': dpr_to_fg_df}
+
+
+# the exports and the FactGrid links of the notebooks 1, 2 and 5 as frames for scripts/identity_graph.py
+def identity_frames(paths: dict, crosswalk_df: pl.DataFrame) -> dict:
+    frames = {kind: read_export(paths[kind], kind, use_cache=False) for kind in ['lebensdaten', 'wiag_person_ids', 'dpr_persons', 'dpr_ids']}
+    frames['fg_wiag_ids'] = fg_wiag_ids(crosswalk_df)
+    frames['fg_gsn_items'] = fg_gsn_items(crosswalk_df)
+    return frames
+
+
+def write_dpr_to_fg_csv(unequal_df, path: str):
+    export_csv = unequal_df[['fg_id', 'gsn_dpr', 'gsn_fg']].rename(columns={'fg_id': 'qid', 'gsn_dpr': 'P472', 'gsn_fg': '-P472'})
+    write_csv(from_pandas(export_csv), path, {'P472': STRING, '-P472': STRING})
+
+
+# Times every stage of the pipeline on the synthetic data in data_path. Stages are run in the order of the workflow,
+# each on the results of the stages before it (computed in the first repetition).
+def run_stages(paths: dict, output_path: str, repeat: int) -> dict:
+    results = {}
+    data = {}
+
+    def stage(name, function, rows=None):
+        (result, times) = measure(function, repeat)
+        results[name] = {
+            'min_s': min(times),
+            'median_s': statistics.median(times),
+            'rows': rows(result) if rows else (len(result) if hasattr(result, '__len__') else None),
+        }
+        print(f"{name:<28} {min(times):>9.4f} s  (median {statistics.median(times):.4f} s)")
+        return result
+
+    data['lebensdaten'] = stage('read_lebensdaten', lambda: read_export(paths['lebensdaten'], 'lebensdaten', use_cache=False))
+    data['aemter'] = stage('read_aemter', lambda: read_export(paths['aemter'], 'aemter', use_cache=False))
+    read_export(paths['aemter'], 'aemter') # stores the artefact
+    stage('read_aemter_cached', lambda: read_export(paths['aemter'], 'aemter'))
+    data['role'] = stage('read_roles', lambda: read_export(paths['role'], 'role', use_cache=False))
+
+    fg_reference = stage('fg_reference_parsing', lambda: parse_fg_reference(paths), rows=lambda r: r.institution_df.height + r.diocese_df.height + r.inst_roles_df.height)
+
+    dioceses_df = stage('resolve_dioceses', lambda: resolve_dioceses(data['aemter'], fg_reference))
+    inst_roles_df = stage('match_inst_roles', lambda: match_inst_roles(data['aemter'], data['role'], fg_reference))
+    plan = office_plan(data['aemter'], fg_reference.institution_df, data['role'], dioceses_df, inst_roles_df)
+    frames = stage('office_plan', lambda: collect_offices(plan), rows=lambda r: r['offices'].height)
+    (missing_inst_df, missing_dioc_df, not_found_df) = (frames['missing_institutions'], frames['missing_dioceses'], frames['missing_inst_roles'])
+    final_offices_df = frames['offices']
+    stage('label_index', lambda: build_label_indexes(fg_reference), rows=lambda r: sum(len(index['ids']) for index in r))
+    unmatched_names = missing_inst_df.get_column('institution').to_list() + missing_dioc_df.get_column('diocese').to_list() + (not_found_df.get_column('role') + ' ' + not_found_df.get_column('institution')).to_list()
+    stage('glossary_translation', lambda: [glossary_translation(role, institution) for (role, institution) in not_found_df.select('role', 'institution').unique().iter_rows()])
+    stage('label_candidates', lambda: suggest_unmatched(fg_reference, missing_inst_df, missing_dioc_df, not_found_df), rows=lambda _: len(set(unmatched_names)))
+
+    stage('date_parsing', lambda: parse_dates(data['aemter']), rows=lambda failed: data['aemter'].height)
+    stage('build_descriptions', lambda: build_descriptions(data['aemter']), rows=lambda r: r[0].height)
+    persons_df = stage('prepare_persons', lambda: prepare_persons(data['lebensdaten'], data['aemter']))
+
+    person_offices_df = data['aemter'].filter(pl.col('role_group_fq_id').is_in(RELEVANT_ROLE_GROUP_FQ_IDS))
+    stage('write_persons_v1', lambda: write_persons_v1(persons_df, person_offices_df, os.path.join(output_path, 'create_persons.v1')), rows=lambda _: persons_df.height)
+    stage('write_offices_v1', lambda: write_offices_v1(final_offices_df, os.path.join(output_path, 'quickstatements-offices.v1')), rows=lambda _: final_offices_df.height)
+    dated_offices_df = add_date_clauses(final_offices_df)
+    statements_df = stage('sparql_parsing_p165', lambda: to_statements_frame(read_bindings(paths['sparql_p165'], OFFICE_STATEMENTS_COLUMNS)))
+    stage('remove_existing_offices', lambda: remove_existing_offices(dated_offices_df, statements_df), rows=lambda _: dated_offices_df.height)
+
+    for kind in ['lebensdaten', 'wiag_person_ids', 'dpr_persons', 'dpr_ids', 'dpr_with_deleted']:
+        data[f"{kind}_pd"] = read_export_pandas(paths[kind], kind)
+    data['p601_pd'] = stage('sparql_parsing_p601', lambda: parse_fg_ids_pandas(paths['sparql_p601'], 'person', 'fg_wiag_id'))
+    data['p472_pd'] = stage('sparql_parsing_p472', lambda: parse_fg_ids_pandas(paths['sparql_p472'], 'item', 'gsn'))
+    merges = stage('consistency_merges', lambda: consistency_merges(data), rows=lambda r: sum(len(df) for df in r.values()))
+    stage('write_dpr_to_fg_csv', lambda: write_dpr_to_fg_csv(merges['dpr_to_fg'], os.path.join(output_path, 'factgrid_dpr_id_update.csv')), rows=lambda _: len(merges['dpr_to_fg']))
+    crosswalk_df = stage('sparql_parsing_crosswalk', lambda: to_crosswalk_frame(read_bindings(paths['sparql_crosswalk'], PERSON_CROSSWALK_VARIABLES)))
+    stage('crosswalk_projections', lambda: (fg_wiag_ids(crosswalk_df), fg_gsn_items(crosswalk_df)), rows=lambda _: crosswalk_df.height)
+    links_df = collect_links(identity_frames(paths, crosswalk_df))
+    stage('identity_conflicts', lambda: find_conflicts(links_df, {'parent': {}, 'current': set()}), rows=lambda _: links_df.height)
+
+    return results
+
+
+# prints the change of every stage between two result files
+def compare(old_file: str, new_file: str):
+    with open(old_file, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, encoding='utf-8') as f:
+        new = json.load(f)
+    if old['persons'] != new['persons']:
+        print(f"WARNING: the results were measured with different numbers of persons ({old['persons']} and {new['persons']}).")
+
+    print(f"{'stage':<28} {old['info']['commit'] or old['info']['version']:>12} {new['info']['commit'] or new['info']['version']:>12}   change")
+    for name, result in new['stages'].items():
+        if name in old['stages']:
+            before = old['stages'][name]['min_s']
+            print(f"{name:<28} {before:>11.4f}s {result['min_s']:>11.4f}s {(result['min_s'] - before) / before:>+8.1%}")
+        else:
+            print(f"{name:<28} {'-':>12} {result['min_s']:>11.4f}s")
+
+
+def run(n_persons: int, repeat: int = 3, seed: int = 0, data_path: str = None, results_path: str = RESULTS_PATH) -> str:
+    with tempfile.TemporaryDirectory() as temp_path:
+        data_path = data_path or os.path.join(temp_path, 'input')
+        output_path = os.path.join(temp_path, 'output')
+        os.makedirs(output_path)
+
+        start = time.perf_counter()
+        paths = generate(data_path, n_persons, seed)
+        print(f"Generated the synthetic data for {n_persons} persons in {time.perf_counter() - start:.1f} s.\n")
+
+        stages = measure_startup(repeat) | run_stages(paths, output_path, repeat)
+
+    info = version_info()
+    report = {
+        'info': info,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'persons': n_persons,
+        'seed': seed,
+        'repeat': repeat,
+        'stages': stages,
+    }
+    os.makedirs(results_path, exist_ok=True)
+    results_file = os.path.join(results_path, f"{datetime.now().strftime('%Y-%m-%d_%H%M%S')}_{info['commit'] or info['version']}_{n_persons}.json")
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults were saved to {results_file}")
+
+    return results_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times every stage of the notebooks on synthetic data.")
+    parser.add_argument('--persons', type=int, nargs='+', default=[1000], help="number(s) of persons to generate (1000 to 500000)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-path', default=None, help="keep the synthetic data in this directory (default: temporary directory)")
+    parser.add_argument('--results-path', default=RESULTS_PATH)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files instead of running the benchmarks")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        for n_persons in args.persons:
+            run(n_persons, args.repeat, args.seed, args.data_path and os.path.join(args.data_path, str(n_persons)), args.results_path)
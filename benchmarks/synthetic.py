@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import random
+import re
+import polars as pl
+from scripts.fg_reference import FG_ENTITY_PREFIX
+from scripts.wiag_to_factgrid_functions import date_clauses, DATE_VALUE_PATTERN
+
+# Synthetic versions of all inputs of the notebooks, so that the pipeline can be timed without credentials and real exports.
+# The files have the names the notebooks use by default, the SPARQL results are stored as the JSON the query service returns.
+
+LEBENSDATEN_FILE = 'WIAG-Domherren-DB-Lebensdaten.csv'
+AEMTER_FILE = 'WIAG-Domherren-DB-Ämter.csv'
+ROLES_FILE = 'role.csv'
+WIAG_PERSON_IDS_FILE = 'i.csv'
+DPR_PERSONS_FILE = 'dpr_persons.csv'
+DPR_IDS_FILE = 'dpr_ids.csv'
+DPR_WITH_DELETED_FILE = 'dpr_with_deleted.csv'
+SPARQL_FILES = {
+    'institutions': 'sparql_institutions.json',
+    'dioceses': 'sparql_dioceses.json',
+    'inst_roles': 'sparql_inst_roles.json',
+    'p601': 'sparql_p601.json',
+    'p472': 'sparql_p472.json',
+    'p165': 'sparql_p165.json',
+    'crosswalk': 'sparql_crosswalk.json',
+}
+
+# (name, role_group, role_group_fq_id, role_group_en, place the role is bound to, weight)
+ROLES = [
+    ('Domherr', 'Domkleriker Altes Reich', 'Q648226', 'Canon', 'institution', 40),
+    ('Domkanoniker', 'Domkleriker Altes Reich', 'Q648226', 'Canon', 'institution', 10),
+    ('Domvikar', 'Domkleriker Altes Reich', 'Q648226', 'Canon', 'institution', 8),
+    ('Domdekan', 'Domdignitär Altes Reich', 'Q648232', 'Cathedral dignitary', 'institution', 5),
+    ('Dompropst', 'Domdignitär Altes Reich', 'Q648232', 'Cathedral dignitary', 'institution', 5),
+    ('Domscholaster', 'Domdignitär Altes Reich', 'Q648232', 'Cathedral dignitary', 'institution', 3),
+    ('Abt', 'Klosterangehöriger mit Leitungsamt', 'Q648233', 'Head of a monastery', 'institution', 4),
+    ('Bischof', 'Oberstes Leitungsamt Diözese', 'Q648236', 'Head of a diocese', 'diocese', 3),
+    ('Erzbischof', 'Oberstes Leitungsamt Diözese', 'Q648236', 'Head of a diocese', 'diocese', 1),
+    ('Weihbischof', 'Bischöfliches Hilfspersonal', 'Q648235', 'Auxiliary bishop', 'diocese', 2),
+    ('Generalvikar', 'Leitungsamt Diözese', 'Q648234', 'Diocesan administrator', 'diocese', 2),
+    ('Archidiakon', 'Leitungsamt Diözese', 'Q648234', 'Diocesan administrator', 'diocese', 2),
+    ('Kardinal', 'Kardinal', 'Q254893', 'Cardinal', None, 1),
+    ('Kanonikatsbewerber', 'Domkleriker Altes Reich', 'Q648226', 'Canon', 'institution', 4),
+]
+
+CITIES = ['Mainz', 'Trier', 'Köln', 'Würzburg', 'Bamberg', 'Eichstätt', 'Speyer', 'Worms', 'Konstanz', 'Augsburg',
+          'Passau', 'Regensburg', 'Freising', 'Salzburg', 'Brixen', 'Münster', 'Osnabrück', 'Paderborn', 'Hildesheim',
+          'Halberstadt', 'Magdeburg', 'Merseburg', 'Naumburg', 'Meißen', 'Lübeck', 'Schwerin', 'Ratzeburg', 'Bremen']
+INSTITUTION_KINDS = ['Domstift', 'Stift St. Viktor', 'Stift St. Peter', 'Kloster St. Michael', 'Stift Unserer Lieben Frau']
+FIRST_NAMES = ['Johann', 'Heinrich', 'Konrad', 'Friedrich', 'Philipp', 'Georg', 'Wilhelm', 'Otto', 'Dietrich', 'Lothar']
+LAST_NAMES = ['von Dalberg', 'von Schönborn', 'von Greiffenclau', 'von Eltz', 'von Stadion', 'von Walderdorff', 'Faust von Stromberg']
+
+# date formats of the WIAG exports that are handled by date_parsing, weighted by how often they occur
+DATE_FORMATS = [
+    (lambda y: str(y), 50),
+    (lambda y: f"um {y}", 10),
+    (lambda y: f"vor {y}", 6),
+    (lambda y: f"nach {y}", 6),
+    (lambda y: f"kurz vor {y}", 2),
+    (lambda y: f"wohl {y}", 2),
+    (lambda y: f"{y}/{y + 1}", 3),
+    (lambda y: f"{y}?", 2),
+    (lambda y: f"zwischen {y} und {y + 6}", 2),
+    (lambda y: f"{y // 10 * 10}er Jahre", 2),
+    (lambda y: f"Mitte {y // 100 + 1}. Jh.", 1),
+    (lambda y: f"{y // 100 + 1}. Jahrhundert", 1),
+    (lambda y: '?', 1),
+]
+
+FG_SHARE = 0.6 # share of persons (and institutions, dioceses, ...) that are already on FactGrid
+OUTDATED_SHARE = 0.03 # share of entries with an outdated ID in the other system
+EXISTING_OFFICE_SHARE = 0.7 # share of the offices of persons on FactGrid that are already there (P165)
+CHANGED_OFFICE_SHARE = 0.05 # share of those with other dates on FactGrid
+
+
+def choose(rng, weighted):
+    return rng.choices([item for item, _ in weighted], weights=[weight for _, weight in weighted])[0]
+
+
+def fg_item(qid):
+    return {'type': 'uri', 'value': FG_ENTITY_PREFIX + qid}
+
+
+def literal(value):
+    return {'type': 'literal', 'value': value}
+
+
+def write_sparql(path, variables, bindings):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'head': {'vars': variables}, 'results': {'bindings': bindings}}, f)
+
+
+# Writes all synthetic inputs for n_persons persons (with about two offices each) to directory and returns the file paths
+def generate(directory: str, n_persons: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    next_qid = iter(range(100000, 10**9))
+
+    # places
+    n_institutions = max(20, n_persons // 40)
+    institutions = [
+        {'gsn': 1000 + i, 'name': f"{INSTITUTION_KINDS[i % len(INSTITUTION_KINDS)]} {CITIES[i % len(CITIES)]} {i // len(CITIES) or ''}".rstrip(),
+         'fg_id': f"Q{next(next_qid)}" if rng.random() < 0.95 else None}
+        for i in range(n_institutions)
+    ]
+    dioceses = [
+        {'wiag_id': f"WIAG-Dioc-{i:03}", 'name': f"{'Erzbistum' if i % 7 == 0 else 'Bistum'} {city}", 'city': city, 'fg_id': f"Q{next(next_qid)}"}
+        for i, city in enumerate(CITIES)
+    ]
+
+    # persons and offices
+    persons = []
+    offices = []
+    office_places = []
+    for n in range(n_persons):
+        wiag_id = f"WIAG-Pers-CANON-{n:05}-001"
+        birth = rng.randint(1100, 1750)
+        persons.append({
+            'id': wiag_id,
+            'FactGrid_ID': f"Q{next(next_qid)}" if rng.random() < FG_SHARE else None,
+            'displayname': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'biographical_dates': f"{birth}-{birth + rng.randint(25, 80)}",
+            'date_of_birth': str(birth),
+            'date_of_death': str(birth + rng.randint(25, 80)),
+            'GND_ID': str(rng.randint(10**8, 10**9)) if rng.random() < 0.5 else None,
+            'GSN': f"{rng.randint(1, 99):03}-{n:05}-001",
+            'Wikidata_ID': f"Q{rng.randint(10**5, 10**8)}" if rng.random() < 0.3 else None,
+            'Wikipedia': None,
+        })
+        for _ in range(rng.choice([1, 1, 2, 2, 2, 3, 4])):
+            (name, role_group, fq_id, role_group_en, place, _) = choose(rng, [(role, role[5]) for role in ROLES])
+            institution = rng.choice(institutions) if place == 'institution' else None
+            diocese = rng.choice(dioceses) if place is not None else None
+            begin = birth + rng.randint(15, 40)
+            office_places.append((name, place, institution, diocese))
+            offices.append({
+                'id': len(offices) + 1,
+                'person_id': wiag_id,
+                'FactGrid': persons[-1]['FactGrid_ID'],
+                'name': name,
+                'role_group': role_group,
+                'role_group_fq_id': fq_id,
+                'role_group_en': role_group_en,
+                'institution': institution['name'] if institution else None,
+                'institution_id': institution['gsn'] if institution else None,
+                'diocese': diocese['name'] if diocese else None,
+                'diocese_id': diocese['wiag_id'] if diocese and rng.random() < 0.8 else None,
+                'date_begin': choose(rng, DATE_FORMATS)(begin) if rng.random() < 0.9 else None,
+                'date_end': choose(rng, DATE_FORMATS)(begin + rng.randint(1, 30)) if rng.random() < 0.6 else None,
+                'date_sort_key': begin * 1000,
+            })
+
+    paths = {name: os.path.join(directory, filename) for name, filename in [
+        ('lebensdaten', LEBENSDATEN_FILE), ('aemter', AEMTER_FILE), ('role', ROLES_FILE), ('wiag_person_ids', WIAG_PERSON_IDS_FILE),
+        ('dpr_persons', DPR_PERSONS_FILE), ('dpr_ids', DPR_IDS_FILE), ('dpr_with_deleted', DPR_WITH_DELETED_FILE),
+    ]} | {f"sparql_{name}": os.path.join(directory, filename) for name, filename in SPARQL_FILES.items()}
+
+    persons_df = pl.DataFrame(persons, schema={column: pl.String for column in persons[0]})
+    persons_df.write_csv(paths['lebensdaten'], separator=';')
+    pl.DataFrame(offices, infer_schema_length=None).write_csv(paths['aemter'], separator=';')
+
+    # WIAG roles (a few without a FactGrid entry and one with two entries)
+    role_rows = [{'id': i + 1, 'name': role[0], 'factgrid_id': f"Q{next(next_qid)}" if rng.random() < 0.9 else None} for i, role in enumerate(ROLES)]
+    role_rows.append({'id': len(role_rows) + 1, 'name': ROLES[-2][0], 'factgrid_id': f"Q{next(next_qid)}"})
+    pl.DataFrame(role_rows).write_csv(paths['role'], null_value='NULL')
+
+    # DPr: the same persons, a few with an outdated WIAG-ID, FactGrid-ID or GSN, some deleted
+    def outdated(value, replacement):
+        return replacement if rng.random() < OUTDATED_SHARE else value
+
+    dpr_df = persons_df.select(
+        pl.col('id').alias('wiag_id'),
+        pl.int_range(1, pl.len() + 1, dtype=pl.UInt32).alias('id'),
+        pl.col('GSN').alias('gsn'),
+        pl.col('FactGrid_ID').alias('fg_id'),
+    )
+    dpr_rows = [row | {
+        'dpr_wiag_id': outdated(row['wiag_id'], row['wiag_id'].removesuffix('-001') + '-002'),
+        'dpr_fg_id': outdated(row['fg_id'], f"Q{next(next_qid)}"),
+        'is_deleted': 1 if rng.random() < 0.02 else 0,
+    } for row in dpr_df.iter_rows(named=True)]
+    dpr_df = pl.DataFrame(dpr_rows, infer_schema_length=None)
+
+    dpr_df.select(pl.col('id'), pl.col('wiag_id'), pl.col('gsn')).write_csv(paths['wiag_person_ids'], include_header=False)
+    dpr_df.select(pl.col('dpr_wiag_id'), pl.col('id'), pl.col('id').alias('gsn_table_id'), pl.col('gsn')).write_csv(paths['dpr_persons'], include_header=False)
+    dpr_df.select(pl.col('dpr_fg_id'), pl.col('id'), pl.col('gsn')).write_csv(paths['dpr_ids'])
+    dpr_df.select(pl.col('dpr_fg_id'), pl.col('id'), pl.col('gsn'), pl.col('is_deleted')).write_csv(paths['dpr_with_deleted'])
+
+    # FactGrid query results
+    fg_persons = [person for person in persons if person['FactGrid_ID'] is not None]
+    p601_bindings = [
+        {'person': fg_item(person['FactGrid_ID']), 'wiag': literal(outdated(person['id'], person['id'].removesuffix('-001') + '-003'))}
+        for person in fg_persons
+    ]
+    write_sparql(paths['sparql_p601'], ['person', 'wiag'], p601_bindings)
+    p472_bindings = [
+        {'item': fg_item(person['FactGrid_ID']), 'gsn': literal(outdated(person['GSN'], person['GSN'].removesuffix('-001') + '-002'))}
+        for person in fg_persons
+    ]
+    write_sparql(paths['sparql_p472'], ['item', 'gsn'], p472_bindings)
+    write_sparql(paths['sparql_institutions'], ['item', 'gsn', 'label'], [
+        {'item': fg_item(institution['fg_id']), 'gsn': literal(str(institution['gsn'])), 'label': literal(institution['name'])}
+        for institution in institutions if institution['fg_id'] is not None
+    ])
+    diocese_bindings = []
+    for diocese in dioceses:
+        binding = {'item': fg_item(diocese['fg_id']), 'label': literal(diocese['name'])}
+        if rng.random() < 0.7:
+            binding['wiagid'] = literal(diocese['wiag_id'])
+        diocese_bindings.append(binding)
+        diocese_bindings.append(binding | {'label': literal(f"Diocese of {diocese['city']}"), 'alternative': literal(f"BITECA {diocese['city']}")})
+    write_sparql(paths['sparql_dioceses'], ['item', 'wiagid', 'label', 'alternative'], diocese_bindings)
+
+    # institution roles for most role/place combinations, a few of them twice
+    inst_role_bindings = []
+    for (name, _, _, _, place, _) in ROLES:
+        label_name = name.replace('Domkanoniker', 'Domherr')
+        places = [institution['name'] for institution in institutions] if place == 'institution' else [diocese['city'] for diocese in dioceses] if place == 'diocese' else []
+        for place_name in places:
+            if rng.random() < 0.9:
+                label = f"{label_name} {place_name}" if place == 'institution' else f"{label_name} von {place_name}"
+                for _ in range(2 if rng.random() < 0.01 else 1):
+                    inst_role_bindings.append({'item': fg_item(f"Q{next(next_qid)}"), 'label': literal(label)})
+    write_sparql(paths['sparql_inst_roles'], ['item', 'label'], inst_role_bindings)
+
+    # P165 statements of most offices that can be matched to an institution role, with the dates as time qualifiers
+    inst_role_by_label = {}
+    for binding in inst_role_bindings:
+        inst_role_by_label.setdefault(binding['label']['value'], binding['item']['value'].removeprefix(FG_ENTITY_PREFIX))
+    statement_bindings = []
+    for office, (name, place, institution, diocese) in zip(offices, office_places):
+        if office['FactGrid'] is None or place is None or rng.random() >= EXISTING_OFFICE_SHARE:
+            continue
+        label_name = name.replace('Domkanoniker', 'Domherr')
+        label = f"{label_name} {institution['name']}" if place == 'institution' else f"{label_name} von {diocese['city']}"
+        if label not in inst_role_by_label:
+            continue
+        try:
+            clauses = '\t'.join(date_clauses(office['date_begin'], office['date_end']))
+        except Exception:
+            continue
+        binding = {
+            'person': fg_item(office['FactGrid']),
+            'statement': {'type': 'uri', 'value': f"{FG_ENTITY_PREFIX}statement/{office['FactGrid']}-{office['id']}"},
+            'role': fg_item(inst_role_by_label[label]),
+            'wiag': literal(office['person_id']),
+        }
+        shift = 1 if rng.random() < CHANGED_OFFICE_SHARE else 0
+        time_values = re.findall(DATE_VALUE_PATTERN, clauses)
+        statement_bindings.extend(binding | {
+            'property': fg_item(prop), 'time': literal(f"{int(year) + shift:04}-01-01T00:00:00Z"), 'precision': literal(precision),
+        } for (prop, year, precision) in time_values)
+        if not time_values:
+            statement_bindings.append(binding)
+    write_sparql(paths['sparql_p165'], ['person', 'statement', 'role', 'wiag', 'property', 'time', 'precision'], statement_bindings)
+
+    # the persons and dioceses with a WIAG-ID or GSN in one row each (scripts/fg_reference.py PERSON_CROSSWALK_QUERY),
+    # with the role group of every person and its offices above as P165 statements
+    statements = {}
+    for binding in statement_bindings:
+        statements.setdefault(binding['person']['value'], set()).add(binding['statement']['value'])
+    crosswalk_bindings = [
+        {
+            'item': p601['person'], 'wiag_ids': p601['wiag'], 'gsns': p472['gsn'], 'person': literal('true'),
+            'p165_count': literal(str(1 + len(statements.get(p601['person']['value'], ())))),
+        }
+        for (p601, p472) in zip(p601_bindings, p472_bindings)
+    ]
+    crosswalk_bindings.extend(
+        {'item': binding['item'], 'wiag_ids': binding['wiagid'], 'gsns': literal(''), 'p165_count': literal('0')}
+        for binding in diocese_bindings[::2] if 'wiagid' in binding
+    )
+    write_sparql(paths['sparql_crosswalk'], ['item', 'wiag_ids', 'gsns', 'person', 'p165_count'], crosswalk_bindings)
+
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates synthetic WIAG, DPr and FactGrid inputs.")
+    parser.add_argument('directory')
+    parser.add_argument('--persons', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, path in generate(args.directory, args.persons, args.seed).items():
+        print(f"{name}: {path}")
@@ -0,0 +1,6 @@
+-- Candidate indexes for the WIAG queries (get_wiag_person_ids.sql and get_wiag_roles.sql). The index of item_corpus
+-- contains every column the query reads from it, led by the item it ranks the corpora of, and the one of url_external
+-- the columns the queries look up and read. They have not been measured on MariaDB yet: create them in WIAG only after
+-- python -m benchmarks.wiag_queries (see benchmarks/README.md) shows that the plans use them and the query gets faster.
+CREATE INDEX IF NOT EXISTS item_corpus_item_corpus_public ON item_corpus (item_id, corpus_id, id_public);
+CREATE INDEX IF NOT EXISTS url_external_authority_item ON url_external (authority_id, item_id, value);
\ No newline at end of file
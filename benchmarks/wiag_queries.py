@@ -0,0 +1,145 @@
+import os
+import random
+from benchmarks.dpr_queries import QUERIES_DIR, argument_parser, read_statements, run_benchmark, with_other_columns
+
+# Compares queries/get_wiag_person_ids.sql with its previous version on a local MariaDB server, like dpr_queries.py for
+# the DPr queries: the tables item, item_corpus, url_external and item_name_role are filled with synthetic data of the
+# size of WIAG, then both versions are timed and their rows are checked, without and with the candidate indexes of
+# benchmarks/wiag_indexes.sql. Needs PyMySQL (pip install pymysql), e.g.:
+#   python -m benchmarks.wiag_queries --user root --password <password>
+
+QUERY_FILE = 'get_wiag_person_ids.sql'
+INDEXES_FILE = os.path.join('benchmarks', 'wiag_indexes.sql')
+
+# the query before it was rewritten: item_corpus joined with itself once per corpus
+PREVIOUS_QUERY = """SELECT DISTINCT
+  i.id,
+  CASE
+    WHEN t_id.epc IS NOT NULL THEN t_id.epc
+    WHEN t_id.epc IS NULL AND t_id.can IS NOT NULL THEN t_id.can
+    WHEN t_id.epc IS NULL AND t_id.can IS NULL AND t_id.dreg_can IS NOT NULL THEN t_id.dreg_can
+  END AS id_public,
+  uext.value AS gsn
+FROM
+  item AS i
+JOIN
+  url_external AS uext ON uext.item_id = i.id AND uext.authority_id = 200
+JOIN
+  item_name_role AS inr ON inr.item_id_name = i.id
+JOIN
+  (SELECT DISTINCT
+      ic.item_id AS item_id,
+      ic_ii.id_public AS epc,
+      ic_iii.id_public AS can,
+      ic_iv.id_public AS dreg_can
+   FROM
+      item_corpus AS ic
+   LEFT JOIN
+      item_corpus AS ic_ii ON ic_ii.item_id = ic.item_id AND ic_ii.corpus_id = 'epc'
+   LEFT JOIN
+      item_corpus AS ic_iii ON ic_iii.item_id = ic.item_id AND ic_iii.corpus_id = 'can'
+   LEFT JOIN
+      item_corpus AS ic_iv ON ic_iv.item_id = ic.item_id AND ic_iv.corpus_id = 'dreg-can'
+   WHERE
+      ic.corpus_id IN ('epc', 'can', 'dreg-can')
+  ) AS t_id ON t_id.item_id = i.id
+WHERE
+  i.is_online = 1"""
+
+# The columns of the WIAG tables that the query uses and the keys of the foreign keys (other_columns stands in for the
+# other columns of item, see dpr_queries.py)
+SCHEMA = [
+    """CREATE TABLE item (
+  id INT NOT NULL PRIMARY KEY,
+  is_online TINYINT(1) NOT NULL DEFAULT 0,
+  other_columns VARCHAR(1000)
+)""",
+    """CREATE TABLE item_corpus (
+  id INT NOT NULL PRIMARY KEY,
+  item_id INT NOT NULL,
+  corpus_id VARCHAR(31) NOT NULL,
+  id_public VARCHAR(63) NOT NULL,
+  KEY item_corpus_item_id (item_id)
+)""",
+    """CREATE TABLE url_external (
+  id INT NOT NULL PRIMARY KEY,
+  item_id INT NOT NULL,
+  value VARCHAR(255) NOT NULL,
+  authority_id INT NOT NULL,
+  KEY url_external_item_id (item_id)
+)""",
+    """CREATE TABLE item_name_role (
+  id INT NOT NULL PRIMARY KEY,
+  item_id_name INT NOT NULL,
+  item_id_role INT NOT NULL,
+  KEY item_name_role_name (item_id_name),
+  KEY item_name_role_role (item_id_role)
+)""",
+]
+
+CORPORA = ['epc', 'can', 'dreg-can'] # in the order the public ID is taken from
+# the corpora of a person and how often they occur - the persons of other corpora (e.g. priests of Utrecht) are not exported
+CORPUS_SETS = [(['can'], 45), (['can', 'dreg-can'], 20), (['dreg-can'], 10), (['epc'], 8), (['epc', 'can'], 5), (['epc', 'can', 'dreg-can'], 2), (['utp'], 10)]
+ID_PREFIXES = {'epc': 'EPISCGatz', 'can': 'CANON', 'dreg-can': 'CANON-DREG', 'utp': 'UTP'}
+SECOND_ID_SHARE = 0.01 # persons with two public IDs in one corpus, which notebook 1 reports as a conflict
+ROLE_ITEMS_SHARE = 0.5 # items that are roles of persons in other sources (in item_name_role), not persons themselves
+OFFLINE_SHARE = 0.1
+NAME_ROLE_SHARE = 0.8 # persons with roles (item_name_role)
+GSN_AUTHORITY = 200
+OTHER_AUTHORITIES = [42, 1, 5] # FactGrid, GND, Wikidata
+GSN_SHARE = 0.7
+MORE_GSNS_SHARE = 0.03
+
+
+# item, item_corpus, url_external and item_name_role as lists of rows
+def generate(n_persons: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    n_items = int(n_persons / (1 - ROLE_ITEMS_SHARE))
+    role_items = list(range(n_persons + 1, n_items + 1))
+    items = [(item_id, int(rng.random() >= OFFLINE_SHARE)) for item_id in range(1, n_items + 1)]
+    (corpora, urls, name_roles) = ([], [], [])
+    for item_id in range(1, n_persons + 1):
+        for corpus in rng.choices([corpus_set for corpus_set, _ in CORPUS_SETS], weights=[weight for _, weight in CORPUS_SETS])[0]:
+            for number in range(2 if rng.random() < SECOND_ID_SHARE else 1):
+                corpora.append((len(corpora) + 1, item_id, corpus, f"WIAG-Pers-{ID_PREFIXES[corpus]}-{item_id:05d}-{number + 1:03d}"))
+        if rng.random() < GSN_SHARE:
+            for number in range(rng.choice([2, 3]) if rng.random() < MORE_GSNS_SHARE else 1):
+                urls.append((len(urls) + 1, item_id, f"{item_id % 1000:03d}-{item_id:05d}-{number + 1:03d}", GSN_AUTHORITY))
+        for authority in OTHER_AUTHORITIES:
+            if rng.random() < 0.5:
+                urls.append((len(urls) + 1, item_id, f"{authority}-{item_id}", authority))
+        if rng.random() < NAME_ROLE_SHARE:
+            for role_item in rng.sample(role_items, rng.randint(1, 3)):
+                name_roles.append((len(name_roles) + 1, item_id, role_item))
+    # the rows are stored in a different order than the items
+    for rows in (corpora, urls, name_roles):
+        rng.shuffle(rows)
+    return {'item': with_other_columns(items, rng), 'item_corpus': corpora, 'url_external': urls, 'item_name_role': name_roles}
+
+
+# the rows the query should return for the data: every public ID of the first corpus of CORPORA that an online person
+# with roles is in, once for each of its GSNs
+def expected_results(data: dict) -> dict:
+    online = {row[0] for row in data['item'] if row[1]}
+    with_roles = {row[1] for row in data['item_name_role']}
+    public_ids = {}
+    for (_, item_id, corpus, id_public) in data['item_corpus']:
+        if corpus in CORPORA:
+            public_ids.setdefault(item_id, {}).setdefault(corpus, set()).add(id_public)
+    rows = {
+        (item_id, id_public, value)
+        for (_, item_id, value, authority) in data['url_external']
+        if authority == GSN_AUTHORITY and item_id in online and item_id in with_roles and item_id in public_ids
+        for id_public in next(public_ids[item_id][corpus] for corpus in CORPORA if corpus in public_ids[item_id])
+    }
+    return {QUERY_FILE: sorted(rows)}
+
+
+def run(args) -> str:
+    data = generate(args.persons, args.seed)
+    queries = {QUERY_FILE: {'previous': PREVIOUS_QUERY, 'revised': read_statements(os.path.join(QUERIES_DIR, QUERY_FILE))[0]}}
+    return run_benchmark(args, 'wiag_queries', SCHEMA, data, queries, expected_results(data), INDEXES_FILE)
+
+
+if __name__ == '__main__':
+    run(argument_parser("Times get_wiag_person_ids.sql and its previous version on a local MariaDB server with synthetic data.", 60000, 'wiag_benchmark').parse_args())
@@ -1,7 +1,11 @@
-SELECT persons.wiag, persons.id, gsn.id, gsn.nummer 
-FROM items 
-INNER JOIN persons ON persons.item_id = items.id AND persons.deleted=0 AND items.deleted=0 AND items.status = "online" 
-INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted=0 
-WHERE persons.wiag IS NOT NULL AND persons.wiag != '' 
-group by persons.wiag 
-having gsn.id=min(gsn.id)
\ No newline at end of file
+SELECT ranked.wiag, ranked.person_id, ranked.gsn_id, ranked.nummer
+FROM (
+  SELECT persons.wiag, persons.id AS person_id, gsn.id AS gsn_id, gsn.nummer,
+    ROW_NUMBER() OVER (PARTITION BY persons.wiag ORDER BY gsn.id, persons.id) AS position
+  FROM items
+  INNER JOIN persons ON persons.item_id = items.id AND persons.deleted = 0
+  INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted = 0
+  WHERE items.deleted = 0 AND items.status = 'online' AND persons.wiag IS NOT NULL AND persons.wiag != ''
+) AS ranked
+WHERE ranked.position = 1
+ORDER BY ranked.wiag
\ No newline at end of file
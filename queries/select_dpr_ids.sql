@@ -1,4 +1,6 @@
 SELECT persons.factgrid, persons.id, gsn.nummer
 FROM items
-INNER JOIN persons ON persons.item_id = items.id AND persons.deleted=0 AND items.deleted=0 AND items.status = "online" 
-INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted=0
\ No newline at end of file
+INNER JOIN persons ON persons.item_id = items.id AND persons.deleted = 0
+INNER JOIN gsn ON gsn.item_id = items.id AND gsn.deleted = 0
+WHERE items.deleted = 0 AND items.status = 'online'
+ORDER BY persons.id, gsn.id
\ No newline at end of file
@@ -1,4 +1,6 @@
-SELECT persons.factgrid, persons.id, gsn.nummer, gsn.deleted 
-FROM items 
-INNER JOIN persons ON persons.item_id = items.id AND items.status = 'online'
-INNER JOIN gsn ON gsn.item_id = items.id
\ No newline at end of file
+SELECT persons.factgrid, persons.id, gsn.nummer, gsn.deleted
+FROM items
+INNER JOIN persons ON persons.item_id = items.id
+INNER JOIN gsn ON gsn.item_id = items.id
+WHERE items.status = 'online' AND persons.factgrid IS NOT NULL AND persons.factgrid != ''
+ORDER BY persons.id, gsn.id
\ No newline at end of file
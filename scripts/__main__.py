@@ -0,0 +1,37 @@
+import importlib
+import sys
+from scripts.instrumentation import start_trace, print_summary
+
+# Runs the steps of a notebook without Jupyter (the files are written just like by the notebook), e.g.
+#   python -m scripts dpr_recon --input-path <folder> --output-path <folder>
+# The folders default to INPUT_PATH and OUTPUT_PATH (see paths.py), "python -m scripts <command> --help" lists the
+# options of a command. The runtime of the steps is printed at the end and saved in the traces folder.
+
+# command: (module with the main function, description)
+COMMANDS = {
+    'dpr_recon': ('scripts.dpr_recon_functions', "notebook 1: update the WIAG-IDs in DPr"),
+    'fg_wiag_ids': ('scripts.fg_wiag_ids_functions', "notebook 2: update the WIAG-IDs on FactGrid and the FactGrid-IDs in WIAG"),
+    'batch': ('scripts.batch', "notebooks 3 and 4: create the persons and offices of several Domstifte on FactGrid"),
+    'fg_to_dpr': ('scripts.fg_to_dpr_functions', "notebook 5: add the FactGrid-IDs in DPr"),
+    'dpr_to_fg': ('scripts.dpr_to_fg_functions', "notebook 6: update the GSNs on FactGrid"),
+    'identity_graph': ('scripts.identity_graph', "find the persons whose IDs in DPr, WIAG and FactGrid contradict each other"),
+}
+
+
+def print_usage():
+    print("usage: python -m scripts <command> [options]\n\ncommands:")
+    for command, (_, description) in COMMANDS.items():
+        print(f"  {command:<16}{description}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print_usage()
+        sys.exit(0 if len(sys.argv) > 1 and sys.argv[1] in ['-h', '--help'] else 2)
+
+    command = sys.argv[1]
+    sys.argv[0] = f"python -m scripts {command}" # shown in the usage of the command
+    module = importlib.import_module(COMMANDS[command][0])
+    start_trace(command)
+    module.main(sys.argv[2:])
+    print_summary()
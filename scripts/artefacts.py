@@ -0,0 +1,105 @@
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+import polars as pl
+
+# Frames handed from one step to the next (e.g. the exports read by notebook 3 and again by notebook 4) are stored as
+# uncompressed Arrow IPC files in the .cache directory of the input folder. Reading them again memory-maps the file
+# instead of parsing it, which takes almost no time even for large tables. Next to every file a JSON entry records
+# where the frame came from (the step, the source files with their content hash, the time and the shape); one entry
+# per artefact, so steps running in parallel (batch mode) don't overwrite each other's entries.
+
+CACHE_DIR_NAME = '.cache'
+ARTEFACT_DIR_NAME = 'artefacts'
+
+
+def artefact_dir(directory: str) -> str:
+    return os.path.join(directory, CACHE_DIR_NAME, ARTEFACT_DIR_NAME)
+
+
+def entry_path(directory: str, name: str) -> str:
+    return os.path.join(artefact_dir(directory), f"{name}.json")
+
+
+def load_entry(directory: str, name: str) -> dict:
+    path = entry_path(directory, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 'sources' maps the files (or other artefacts) the frame was made from to their content hash
+def save_artefact(directory: str, name: str, df: pl.DataFrame, step: str, sources: dict = None) -> dict:
+    os.makedirs(artefact_dir(directory), exist_ok=True)
+    created = datetime.now().isoformat(timespec='seconds')
+    # every version gets its own file, because on Windows a file cannot be replaced while it is memory-mapped
+    version = hashlib.sha256(json.dumps([sources, created, df.height]).encode()).hexdigest()[:16]
+    filename = f"{name}.{version}.arrow"
+    # the oldest Arrow format (plain strings instead of string views) is read faster and by any Arrow library
+    df.write_ipc(os.path.join(artefact_dir(directory), filename), compression='uncompressed', compat_level=pl.CompatLevel.oldest())
+
+    entry = {
+        'name': name,
+        'file': filename,
+        'step': step,
+        'sources': sources or {},
+        'created': created,
+        'rows': df.height,
+        'columns': df.width,
+        'schema': {column: str(dtype) for column, dtype in df.schema.items()},
+    }
+    with open(entry_path(directory, name), 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False, indent=2)
+
+    for path in glob.glob(os.path.join(glob.escape(artefact_dir(directory)), f"{glob.escape(name)}.*.arrow")):
+        if os.path.basename(path) != filename:
+            try:
+                os.remove(path)
+            except OSError: # still memory-mapped - removed the next time
+                pass
+    return entry
+
+
+# Returns the artefact memory-mapped, or None if there is none or it was made from other sources than 'sources'
+# (if given) or is older than 'max_age' (if given).
+def load_artefact(directory: str, name: str, sources: dict = None, max_age=None):
+    entry = load_entry(directory, name)
+    if entry is None or (sources is not None and entry['sources'] != sources):
+        return None
+    if max_age is not None and datetime.now() - datetime.fromisoformat(entry['created']) > max_age:
+        return None
+    path = os.path.join(artefact_dir(directory), entry['file'])
+    if not os.path.exists(path):
+        return None
+    return pl.read_ipc(path) # uncompressed IPC files are memory-mapped by polars
+
+
+# the index of the stored artefacts with their provenance
+def list_artefacts(directory: str) -> pl.DataFrame:
+    entries = [load_entry(directory, os.path.basename(path)[:-len('.json')]) for path in sorted(glob.glob(os.path.join(glob.escape(artefact_dir(directory)), '*.json')))]
+    return pl.DataFrame([
+        {
+            'name': entry['name'],
+            'step': entry['step'],
+            'created': entry['created'],
+            'rows': entry['rows'],
+            'columns': entry['columns'],
+            'sources': ', '.join(f"{source} ({digest[:12]})" for source, digest in entry['sources'].items()),
+        }
+        for entry in entries
+    ], schema={'name': pl.String, 'step': pl.String, 'created': pl.String, 'rows': pl.Int64, 'columns': pl.Int64, 'sources': pl.String})
+
+
+# pandas copy of an artefact for the notebooks that (still) work with pandas - without needing pyarrow
+def to_pandas(df: pl.DataFrame):
+    import pandas as pd
+
+    return pd.DataFrame(df.to_dict(as_series=False))
+
+
+# and the other way round (missing values become nulls)
+def from_pandas(df) -> pl.DataFrame:
+    return pl.DataFrame({column: df[column].astype(object).where(df[column].notna(), None).tolist() for column in df.columns})
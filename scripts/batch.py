@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import polars as pl
+from scripts.ingest import read_export
+from scripts.fg_import_persons_functions import prepare_persons, write_persons_v1, RELEVANT_ROLE_GROUP_FQ_IDS
+from scripts.fg_reference import load_fg_reference, load_person_crosswalk, fetch_office_statements
+from scripts.wiag_to_factgrid_functions import (
+    resolve_dioceses, match_inst_roles, office_plan, collect_offices, add_date_clauses, remove_existing_offices, write_offices_v1
+)
+from scripts.label_index import with_candidates
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+
+LEBENSDATEN_FILE = 'WIAG-Domherren-DB-Lebensdaten-{}.csv'
+AEMTER_FILE = 'WIAG-Domherren-DB-Ämter-{}.csv'
+AEMTER_FILE_PATTERN = re.compile(r'WIAG-Domherren-DB-Ämter-(.+)\.csv')
+ROLES_FILE = 'role.csv'
+
+# FactGrid reference data, the person crosswalk and the WIAG roles, loaded once in the main process and handed to every worker process once
+reference = {}
+
+
+def init_worker(shared: dict):
+    reference.update(shared)
+
+
+# all Domstifte for which an Ämter export (named like in the notebooks) is in input_path
+def find_domstifte(input_path: str) -> list:
+    return sorted(match.group(1) for entry in os.listdir(input_path) if (match := AEMTER_FILE_PATTERN.fullmatch(entry)))
+
+
+def load_reference(input_path: str) -> dict:
+    fg_reference = load_fg_reference(input_path)
+    institution_df = fg_reference.institution_df
+
+    # institutions with more than one entry on FactGrid need to be fixed manually (see notebook 4) and are ignored
+    duplicate_fg_entries = institution_df.group_by('fg_gsn_id').len().filter(pl.col('len') > 1)
+    if not duplicate_fg_entries.is_empty():
+        print(f"{duplicate_fg_entries.height} GSNs are linked to by more than one institution on FactGrid and are ignored.")
+    institution_df = institution_df.filter(pl.col('fg_gsn_id').is_in(duplicate_fg_entries.get_column('fg_gsn_id').implode()).not_())
+
+    return {
+        'fg_reference': fg_reference,
+        'institution_df': institution_df,
+        'roles_df': read_export(os.path.join(input_path, ROLES_FILE), 'role'),
+    }
+
+
+# the same steps as in notebook 4 (without the translations) - returns the offices ready for the upload and the reports of missing entries
+def process_offices(offices_df):
+    fg_reference = reference['fg_reference']
+    frames = collect_offices(office_plan(
+        offices_df, reference['institution_df'], reference['roles_df'],
+        resolve_dioceses(offices_df, fg_reference), match_inst_roles(offices_df, reference['roles_df'], fg_reference),
+    ))
+
+    reports = {
+        'missing-institutions': with_candidates(frames['missing_institutions'].filter(pl.col('institution_id').is_not_null()).select('institution', 'institution_id').unique(), 'institution', fg_reference.institution_index),
+        'missing-dioceses': with_candidates(frames['missing_dioceses'].select('diocese', 'diocese_id').unique(), 'diocese', fg_reference.diocese_index),
+        'missing-roles': frames['missing_roles'].select('name', 'role_id', 'role_group_fq_id').unique().drop_nulls(),
+        'missing-inst-roles': with_candidates(frames['missing_inst_roles'].drop_nulls().unique().with_columns(label = pl.col('role') + ' ' + pl.col('institution')), 'label', fg_reference.inst_role_index),
+        'duplicate-inst-roles': frames['duplicate_inst_roles'].with_columns(pl.col('fg_inst_role_ids').list.join(' ')),
+    }
+    return (frames['offices'], reports)
+
+
+def write_outputs(output_path: str, suffix: str, today_string: str, persons_df, person_offices_df, offices_df, reports: dict):
+    write_persons_v1(persons_df, person_offices_df, os.path.join(output_path, f"create_persons_FG_{today_string}-{suffix}.v1"))
+    write_offices_v1(offices_df, os.path.join(output_path, f"quickstatements-offices_{today_string}-{suffix}.v1"))
+    for name, report_df in reports.items():
+        report_df.write_csv(os.path.join(output_path, f"{name}_{today_string}-{suffix}.csv"))
+
+
+# with skip_existing the offices that FactGrid already has are left out (see notebook 4)
+def process_domstift(domstift: str, input_path: str, output_path: str, today_string: str, skip_existing: bool = True) -> dict:
+    timings = {}
+
+    start = time.perf_counter()
+    persons_all_df = read_export(os.path.join(input_path, LEBENSDATEN_FILE.format(domstift)), 'lebensdaten')
+    offices_df = read_export(os.path.join(input_path, AEMTER_FILE.format(domstift)), 'aemter')
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    persons_df = prepare_persons(persons_all_df, offices_df)
+    person_offices_df = offices_df.filter(pl.col('role_group_fq_id').is_in(RELEVANT_ROLE_GROUP_FQ_IDS)).select('person_id', 'role_group_fq_id')
+    timings['persons'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    (final_offices_df, reports) = process_offices(offices_df)
+    final_offices_df = add_date_clauses(final_offices_df)
+    timings['offices'] = time.perf_counter() - start
+
+    skipped = 0
+    if skip_existing:
+        start = time.perf_counter()
+        statements_df = fetch_office_statements(final_offices_df.get_column('FactGrid').unique(), reference['crosswalk_df'])
+        (final_offices_df, skipped) = remove_existing_offices(final_offices_df, statements_df)
+        timings['existing'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_outputs(output_path, domstift, today_string, persons_df, person_offices_df, final_offices_df, reports)
+    timings['write'] = time.perf_counter() - start
+
+    return {
+        'domstift': domstift,
+        'timings': timings,
+        'persons': persons_df,
+        'person_offices': person_offices_df,
+        'offices': final_offices_df,
+        'skipped': skipped,
+        'reports': reports,
+    }
+
+
+# The new persons of all Domstifte. A person of several Domstifte is described with their offices in all of the exports,
+# not only with the ones of the Domstift a worker processed.
+def merge_persons(domstifte: list, input_path: str):
+    persons_all_df = pl.concat([read_export(os.path.join(input_path, LEBENSDATEN_FILE.format(domstift)), 'lebensdaten') for domstift in domstifte]).unique('id', keep='first', maintain_order=True)
+    offices_df = pl.concat([read_export(os.path.join(input_path, AEMTER_FILE.format(domstift)), 'aemter') for domstift in domstifte]).unique('id', keep='first', maintain_order=True)
+    return prepare_persons(persons_all_df, offices_df)
+
+
+def print_timings(results: list):
+    summary = pl.DataFrame([
+        {'domstift': result['domstift'], 'new persons': result['persons'].height, 'offices': result['offices'].height, 'skipped': result['skipped']}
+        | {f"{stage} [s]": round(seconds, 2) for stage, seconds in result['timings'].items()}
+        | {'total [s]': round(sum(result['timings'].values()), 2)}
+        for result in results
+    ])
+    with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True):
+        print(summary)
+
+
+# Processes the persons (notebook 3) and offices (notebook 4) of each Domstift in a separate process. For every Domstift
+# the files of both notebooks are written with the name of the Domstift as a suffix, then the merged files (suffix 'merged')
+# with every person and office only once (persons and offices are contained in the exports of all their Domstifte). The
+# descriptions of the merged persons are built from their offices in all Domstifte.
+def run_batch(domstifte, input_path: str = INPUT_PATH, output_path: str = OUTPUT_PATH, max_workers: int = None, skip_existing: bool = True) -> list:
+    if domstifte == 'all' or domstifte == ['all']:
+        domstifte = find_domstifte(input_path)
+    print(f"Processing {len(domstifte)} Domstifte: {', '.join(domstifte)}")
+
+    today_string = datetime.now().strftime('%Y-%m-%d')
+    shared = load_reference(input_path)
+    if skip_existing:
+        # the persons without any P165 statement on FactGrid are not asked for their office statements
+        shared['crosswalk_df'] = load_person_crosswalk(input_path, step='batch')
+
+    # 'spawn' (the default on Windows) also on other systems, forking a process that already uses the polars thread pool can deadlock
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=init_worker, initargs=(shared,)) as pool:
+        futures = [pool.submit(process_domstift, domstift, input_path, output_path, today_string, skip_existing) for domstift in domstifte]
+        results = [future.result() for future in futures]
+
+    persons_df = merge_persons(domstifte, input_path)
+    person_offices_df = pl.concat([result['person_offices'] for result in results]).unique(maintain_order=True)
+    offices_df = pl.concat([result['offices'] for result in results], how='diagonal').unique('id', keep='first', maintain_order=True)
+    reports = {name: pl.concat([result['reports'][name] for result in results]).unique(maintain_order=True) for name in results[0]['reports']} if results else {}
+    write_outputs(output_path, 'merged', today_string, persons_df, person_offices_df, offices_df, reports)
+
+    print_timings(results)
+    print(f"Merged: {persons_df.height} new persons and {offices_df.height} offices ({sum(result['skipped'] for result in results)} offices already on FactGrid were skipped).")
+
+    return results
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Generates the person (notebook 3) and office (notebook 4) files for several Domstifte at once.")
+    parser.add_argument('domstifte', nargs='+', help="names of the Domstifte as used in the export file names, or 'all'")
+    parser.add_argument('--input-path', default=INPUT_PATH)
+    parser.add_argument('--output-path', default=OUTPUT_PATH)
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--all-offices', action='store_true', help="also write the offices that FactGrid already has")
+    args = parser.parse_args(argv)
+
+    run_batch(args.domstifte, args.input_path, args.output_path, args.workers, not args.all_offices)
+
+
+if __name__ == '__main__':
+    main()
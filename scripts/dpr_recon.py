@@ -39,38 +39,37 @@
 ### 2. Import the files
 #Please move the downloaded files to the `input_path` directory defined below or change the `input_path` to where the files are located.
 #%%
-import csv # first loading necessary libraries
-import os
-import pandas as pd
-import os
+#the steps of this notebook are defined in scripts/dpr_recon_functions.py (python -m scripts dpr_recon runs them without Jupyter)
+from datetime import datetime
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+from scripts.dpr_recon_functions import KNOWN_PROBLEMATIC_GSNS, load_exports, problematic_entries, outdated_wiag_ids, write_outdated_entries, write_update_sql
 #change this to where the csv file is located (e.g. C:\Users\<your_username_here>\Downloads\) or move the csv file to this directory
-input_path = r"C:\Users\Public\sync_notebooks\input_files"
+input_path = INPUT_PATH # the folder set in the .env file, see scripts/paths.py
 wiag_file = 'i.csv' # change this in case you renamed the file
 dpr_file = 'persons.csv' # change this in case you renamed the file
-ic_df = pd.read_csv(os.path.join(input_path, wiag_file), names=["id", "wiag_id", "gsn"])
-dpr_df = pd.read_csv(os.path.join(input_path, dpr_file), names=["wiag_id", "id", "gsn_table_id", "gsn"])
+(ic_df, dpr_df) = load_exports(input_path, wiag_file, dpr_file)
 #%% [markdown]
 ### 3. Check for problematic entries
 #Any listed entries **need to be fixed manually** before once again exporting the updated data from WIAG and DPr
 # 
 #First a list of known problematic entries (by GSN) in DPr is created. These entries are linked to more than one entry in WIAG and it is unclear whether the different entries reference the same person or not, so they should simply be ignored for the rest of the script.
 #%%
-gsns_of_known_problematic_wiag_entries = ['046-02872-001', '007-00413-001']
+gsns_of_known_problematic_wiag_entries = KNOWN_PROBLEMATIC_GSNS # ['046-02872-001', '007-00413-001']
+checks = problematic_entries(ic_df, dpr_df, gsns_of_known_problematic_wiag_entries)
 #%% [markdown]
 #### Check data from WIAG
 #%%
-ic_df[ic_df['gsn'].isna()] # checking for entries with an empty Germania Sacra Number field
+checks['wiag_missing_gsn'] # checking for entries with an empty Germania Sacra Number field
 #%% [markdown]
 #checking for entries that reference the same GSN
 #%%
-_duplicates = ic_df[ic_df.duplicated(subset = ['gsn'], keep = False)]
-_duplicates[~_duplicates['gsn'].isin(gsns_of_known_problematic_wiag_entries)].sort_values(by=['gsn']) # ignoring known entries
+checks['wiag_same_gsn'] # ignoring known entries
 #%% [markdown]
 #### Check data from DPr
 #%%
-dpr_df[dpr_df['gsn'].isna()] # checking for entries with an empty Germania Sacra Number field
+checks['dpr_missing_gsn'] # checking for entries with an empty Germania Sacra Number field
 #%%
-ic_df[ic_df.duplicated(subset = ['wiag_id'], keep = False)].sort_values(by = ['wiag_id']) # checking for entries with the same WIAG-ID
+checks['wiag_same_wiag_id'] # checking for entries with the same WIAG-ID
 #%% [markdown]
 ### 4. Check for entries with (probably) outdated WIAG-IDs in DPr
 #
@@ -78,44 +77,24 @@ ic_df[ic_df.duplicated(subset = ['wiag_id'], keep = False)].sort_values(by = ['w
 # 
 #Should the output be empty, there is nothing to be updated and you can proceed with the third notebook. Otherwise, proceed below.
 #%%
-#Join the dataframes from WIAG and DPr
-joined_df = ic_df.merge(dpr_df, on='gsn', suffixes=('_wiag', '_dpr'))
-#Check for linked entries that don't have the same WIAG ID
-unequal_df = joined_df[joined_df['wiag_id_wiag'] != joined_df['wiag_id_dpr']]
-#remove known entries that should be ignored (defined at the start of step 3)
-unequal_df = unequal_df[~unequal_df['gsn'].isin(gsns_of_known_problematic_wiag_entries)]
+#Join the dataframes from WIAG and DPr and check for linked entries that don't have the same WIAG ID
+#known entries that should be ignored (defined at the start of step 3) are removed
+unequal_df = outdated_wiag_ids(ic_df, dpr_df, gsns_of_known_problematic_wiag_entries)
 unequal_df # print entries that will be updated
 #%% [markdown]
 #Saving the list of entries to be updated as a csv-file for easier checking of proposed updates.
 #Change the `output_path` to where you want the csv-file to be output.
 #%%
-from datetime import datetime
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
+output_path = OUTPUT_PATH # the folder set in the .env file, see scripts/paths.py
 today_string = datetime.now().strftime('%Y-%m-%d')
-unequal_df.to_csv( 
-    os.path.join(
-        output_path,
-        f'dpr_entries_to_be_updated_{today_string}.csv'
-    ),
-    index=False
-)
+write_outdated_entries(unequal_df, output_path, today_string)
 #%% [markdown]
 ### 5. Updating Digitales Personenregister
 #### Generating the SQL-file
 #Using the same `output_path` as above.
 #
 #%%
-query = "LOCK TABLES persons WRITE;\n"
-for row in unequal_df.itertuples():
-    query += f"""
-    UPDATE persons
-    SET wiag = '{row.wiag_id_wiag}'
-    WHERE id = {row.id_dpr}; -- id: {row.gsn}
-"""
-query += "\nUNLOCK TABLES;"
-today_string = datetime.now().strftime('%Y-%m-%d')
-with open(os.path.join(output_path, f'update_dpr_{today_string}.sql'), 'w') as file:
-    file.write(query)
+write_update_sql(unequal_df, output_path, today_string)
 #%% [markdown]
 #### Upload the file
 #Once the file has been generated (name is `update_dpr_something.sql`), **check the file** (do the updates make sense?) and then please open [phpMyAdmin DPr](https://personendatenbank.germania-sacra.de/phpmyadmin/) and run the SQL file there. First you need to select the database (gso) and then either:
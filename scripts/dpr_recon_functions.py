@@ -0,0 +1,95 @@
+import argparse
+import os
+from datetime import datetime
+from scripts.ingest import read_export_pandas
+from scripts.id_codec import merge_ids
+from scripts.instrumentation import instrumented
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+
+# The steps of notebook 1 (dpr_recon): the WIAG-IDs that DPr has for a GSN are compared with the ones WIAG has, and the
+# outdated ones are updated in DPr with an SQL file.
+#   python -m scripts dpr_recon --input-path <folder> --output-path <folder>
+
+WIAG_FILE = 'i.csv' # export of queries/get_wiag_person_ids.sql
+DPR_FILE = 'persons.csv' # export of queries/get_dpr_data.sql
+# DPr-entries (by GSN) that are linked to more than one entry in WIAG - it is unclear whether the different entries
+# reference the same person or not, so they are ignored
+KNOWN_PROBLEMATIC_GSNS = ['046-02872-001', '007-00413-001']
+
+
+def load_exports(input_path: str, wiag_file: str = WIAG_FILE, dpr_file: str = DPR_FILE) -> tuple:
+    ic_df = read_export_pandas(os.path.join(input_path, wiag_file), 'wiag_person_ids')
+    dpr_df = read_export_pandas(os.path.join(input_path, dpr_file), 'dpr_persons')
+    return (ic_df, dpr_df)
+
+
+# the entries that need to be fixed manually before exporting the data again (step 3)
+def problematic_entries(ic_df, dpr_df, ignored_gsns: list = KNOWN_PROBLEMATIC_GSNS) -> dict:
+    duplicates = ic_df[ic_df.duplicated(subset = ['gsn'], keep = False)]
+    return {
+        'wiag_missing_gsn': ic_df[ic_df['gsn'].isna()],
+        'wiag_same_gsn': duplicates[~duplicates['gsn'].isin(ignored_gsns)].sort_values(by = ['gsn']),
+        'dpr_missing_gsn': dpr_df[dpr_df['gsn'].isna()],
+        'wiag_same_wiag_id': ic_df[ic_df.duplicated(subset = ['wiag_id'], keep = False)].sort_values(by = ['wiag_id']),
+    }
+
+
+# the DPr-entries linked to a WIAG-entry (by GSN) that have a different WIAG-ID (step 4)
+@instrumented()
+def outdated_wiag_ids(ic_df, dpr_df, ignored_gsns: list = KNOWN_PROBLEMATIC_GSNS):
+    joined_df = merge_ids(ic_df, dpr_df, 'gsn', on = 'gsn', suffixes = ('_wiag', '_dpr'))
+    unequal_df = joined_df[joined_df['wiag_id_wiag'] != joined_df['wiag_id_dpr']]
+    return unequal_df[~unequal_df['gsn'].isin(ignored_gsns)]
+
+
+def write_outdated_entries(unequal_df, output_path: str, today_string: str) -> str:
+    path = os.path.join(output_path, f'dpr_entries_to_be_updated_{today_string}.csv')
+    unequal_df.to_csv(path, index = False)
+    return path
+
+
+# the SQL file that sets the WIAG-IDs of the outdated entries in DPr (step 5)
+def write_update_sql(unequal_df, output_path: str, today_string: str) -> str:
+    query = "LOCK TABLES persons WRITE;\n"
+    for row in unequal_df.itertuples():
+        query += f"""
+    UPDATE persons
+    SET wiag = '{row.wiag_id_wiag}'
+    WHERE id = {row.id_dpr}; -- id: {row.gsn}
+"""
+    query += "\nUNLOCK TABLES;"
+
+    path = os.path.join(output_path, f'update_dpr_{today_string}.sql')
+    with open(path, 'w') as file:
+        file.write(query)
+    return path
+
+
+# All steps of the notebook without Jupyter: prints the number of problematic entries and writes the files of steps 4
+# and 5. Returns the problematic and the outdated entries.
+def run_dpr_recon(input_path: str = INPUT_PATH, output_path: str = OUTPUT_PATH, wiag_file: str = WIAG_FILE, dpr_file: str = DPR_FILE) -> dict:
+    (ic_df, dpr_df) = load_exports(input_path, wiag_file, dpr_file)
+    checks = problematic_entries(ic_df, dpr_df)
+    for name, df in checks.items():
+        print(f"{name}: {len(df)} entries")
+
+    unequal_df = outdated_wiag_ids(ic_df, dpr_df)
+    today_string = datetime.now().strftime('%Y-%m-%d')
+    write_outdated_entries(unequal_df, output_path, today_string)
+    print(f"{len(unequal_df)} entries in DPr have an outdated WIAG-ID, written to {write_update_sql(unequal_df, output_path, today_string)}")
+    return checks | {'outdated': unequal_df}
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description = "Notebook 1: generates the SQL file that updates the outdated WIAG-IDs in DPr.")
+    parser.add_argument('--input-path', default = INPUT_PATH)
+    parser.add_argument('--output-path', default = OUTPUT_PATH)
+    parser.add_argument('--wiag-file', default = WIAG_FILE, help = "WIAG export of queries/get_wiag_person_ids.sql")
+    parser.add_argument('--dpr-file', default = DPR_FILE, help = "DPr export of queries/get_dpr_data.sql")
+    args = parser.parse_args(argv)
+
+    run_dpr_recon(args.input_path, args.output_path, args.wiag_file, args.dpr_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,85 +19,53 @@
 #
 #In case you renamed the file (e.g. to include the date on which it was created) you also need to **change the `filename`** below.
 #%%
-import requests
-import csv
-import os
-import pandas as pd
-import json
-import re
-import time
+#the steps of this notebook are defined in scripts/dpr_to_fg_functions.py (python -m scripts dpr_to_fg runs them without Jupyter)
 from datetime import datetime, timedelta
-import math
-import traceback
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+from scripts.dpr_to_fg_functions import load_dpr_persons, compare_gsns, write_updates
 
-input_path = r"C:\Users\Public\sync_notebooks\input_files"
+input_path = INPUT_PATH # the folder set in the .env file, see scripts/paths.py
 filename = 'persons.csv'
 #%%
-pr_df = pd.read_csv(os.path.join(input_path, filename), header = 0, names=["fg_id", "id", "gsn", 'is_deleted'])
+pr_df = load_dpr_persons(input_path, filename)
 #%% [markdown]
 ### 3. Import data from FactGrid
 #Data is downloaded and and cleaned for further processing automatically.
+#
+#Every download is stored in the `.cache` folder of the `input_path` directory. If you ran notebook 2 or 5 shortly before and **did not upload anything to FactGrid since then**, you can set `reuse_download` below to use its download instead of downloading everything again.
 #%%
-url = 'https://database.factgrid.de/sparql'
-query = (
-"""SELECT ?item ?gsn WHERE {
-  ?item wdt:P472 ?gsn.
-}""")
+from scripts.fg_reference import load_fg_gsn_items
+from scripts.artefacts import to_pandas
 
-r = requests.get(url, params={'query': query}, headers={"Accept": "application/json"})
-data = r.json()
-factgrid_df = pd.json_normalize(data['results']['bindings'])
+reuse_download = None # e.g. timedelta(hours = 1) to use the data downloaded by notebook 2 or 5 in the last hour (see above)
+factgrid_df = to_pandas(load_fg_gsn_items(input_path, step = 'dpr_to_fg', max_age = reuse_download))
 
 len(factgrid_df)
-#%%
-#extract out q id
-def extract_qid(df, column):
-    df[column] = df[column].map(lambda x: x.strip('https://database.factgrid.de/entity/'))
-
-#drop irrelevant columns
-def drop_type_columns(df):
-    df.drop(columns=[column for column in df.columns if column.endswith('type')], inplace=True)
-    df.drop(columns=[column for column in df.columns if column.endswith('xml:lang')], inplace=True)
-
-#%%
-drop_type_columns(factgrid_df)
-extract_qid(factgrid_df, 'item.value')
-factgrid_df.columns = ['FactGrid_ID', 'gsn']
 #%% [markdown]
 ### 4. Compare data from DPr and FG
 #Joining the data and showing a sample to give an idea of what the data looks like.
 #%%
-joined_df = pr_df.merge(factgrid_df, left_on='fg_id', right_on='FactGrid_ID', suffixes=('_dpr', '_fg'))
-joined_df
+frames = compare_gsns(pr_df, factgrid_df)
+frames['joined']
 #%% [markdown]
 #Only considering entries which were not deleted (in DPr) and where the FactGrid-entry points to a different DPr-entry. It's important that before running this notebook, the in the notebook before (step 7) the 
 #have a different GSN in 
 #%%
-unequal_df = joined_df[(joined_df['is_deleted'] == 0) & (joined_df['gsn_dpr'] != joined_df['gsn_fg'])]
-unequal_df
+frames['unequal']
 #%%
-export_csv = unequal_df[['fg_id', 'gsn_dpr', 'gsn_fg']]
-export_csv = export_csv.rename(columns={'fg_id': 'qid', 'gsn_dpr': 'P472', 'gsn_fg': '-P472'})
+export_csv = frames['updates'] # the columns of QuickStatements
 export_csv
 #%% [markdown]
 ### 5. Update FactGrid
 #### Generate QuickStatements to update FG
 #Please **change the `output_path`** to where you want the CSV-file to be saved to.
 #%%
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
+output_path = OUTPUT_PATH # the folder set in the .env file, see scripts/paths.py
 #%%
 today_string = datetime.now().strftime('%Y-%m-%d')
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
 
-export_csv["-P472"] = export_csv["-P472"].apply(lambda x: f'"{x}"')
-export_csv["P472"] = export_csv["P472"].apply(lambda x: f'"{x}"')
-export_csv.to_csv(
-    os.path.join(
-        output_path,
-        f'factgrid_dpr_id_update_{today_string}.csv'
-    ),
-    index=False
-)
+# the GSNs are written in quotation marks
+write_updates(export_csv, output_path, today_string)
 #%% [markdown]
 #### Upload the file
 #Once the file has been generated, please open [QuickStatements](https://database.factgrid.de/quickstatements/#/batch) and **run the CSV-commands**. More details to perform this can be found [here](https://github.com/WIAG-ADW-GOE/sync_notebooks/blob/main/docs/Run_factgrid_csv.md).
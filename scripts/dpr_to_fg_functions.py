@@ -0,0 +1,65 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+from scripts.artefacts import from_pandas, to_pandas
+from scripts.fg_reference import load_fg_gsn_items
+from scripts.quickstatements import STRING, write_csv
+from scripts.ingest import read_export_pandas
+from scripts.id_codec import merge_ids
+from scripts.instrumentation import instrumented
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+
+# The steps of notebook 6 (dpr_to_fg): the GSNs of the persons on FactGrid are compared with the ones of the DPr-entries
+# they link to, and the differing ones are updated on FactGrid with a QuickStatements CSV file.
+#   python -m scripts dpr_to_fg --input-path <folder> --output-path <folder>
+
+DPR_FILE = 'persons.csv' # export of queries/select_dpr_with_deleted.sql
+
+
+def load_dpr_persons(input_path: str, filename: str = DPR_FILE):
+    return read_export_pandas(os.path.join(input_path, filename), 'dpr_with_deleted')
+
+
+# DPr (pr_df) joined with the persons on FactGrid (factgrid_df: FactGrid_ID, gsn) by FactGrid-ID: 'unequal' are the
+# entries not deleted in DPr whose GSN differs on FactGrid, 'updates' the QuickStatements for them (step 4)
+@instrumented()
+def compare_gsns(pr_df, factgrid_df) -> dict:
+    joined_df = merge_ids(pr_df, factgrid_df, 'qid', left_on = 'fg_id', right_on = 'FactGrid_ID', suffixes = ('_dpr', '_fg'))
+    unequal_df = joined_df[(joined_df['is_deleted'] == 0) & (joined_df['gsn_dpr'] != joined_df['gsn_fg'])]
+    updates_df = unequal_df[['fg_id', 'gsn_dpr', 'gsn_fg']].rename(columns = {'fg_id': 'qid', 'gsn_dpr': 'P472', 'gsn_fg': '-P472'})
+    return {'joined': joined_df, 'unequal': unequal_df, 'updates': updates_df}
+
+
+# the QuickStatements CSV file (step 5) - the GSNs are written in quotation marks
+def write_updates(updates_df, output_path: str, today_string: str) -> str:
+    path = os.path.join(output_path, f'factgrid_dpr_id_update_{today_string}.csv')
+    write_csv(from_pandas(updates_df), path, {'P472': STRING, '-P472': STRING})
+    return path
+
+
+# All steps of the notebook without Jupyter. With reuse_download the persons downloaded by notebook 2 or 5 (if not
+# older) are used. Returns the frames of compare_gsns.
+def run_dpr_to_fg(input_path: str = INPUT_PATH, output_path: str = OUTPUT_PATH, filename: str = DPR_FILE, reuse_download = None) -> dict:
+    pr_df = load_dpr_persons(input_path, filename)
+    factgrid_df = to_pandas(load_fg_gsn_items(input_path, step = 'dpr_to_fg', max_age = reuse_download))
+
+    frames = compare_gsns(pr_df, factgrid_df)
+    path = write_updates(frames['updates'], output_path, datetime.now().strftime('%Y-%m-%d'))
+    print(f"{len(frames['updates'])} GSNs are updated on FactGrid, written to {path}")
+    return frames
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description = "Notebook 6: generates the QuickStatements that update the GSNs on FactGrid.")
+    parser.add_argument('--input-path', default = INPUT_PATH)
+    parser.add_argument('--output-path', default = OUTPUT_PATH)
+    parser.add_argument('--dpr-file', default = DPR_FILE, help = "DPr export of queries/select_dpr_with_deleted.sql")
+    parser.add_argument('--reuse-download', type = float, metavar = 'HOURS', help = "use the persons downloaded from FactGrid in the last HOURS hours")
+    args = parser.parse_args(argv)
+
+    reuse_download = timedelta(hours = args.reuse_download) if args.reuse_download is not None else None
+    run_dpr_to_fg(args.input_path, args.output_path, args.dpr_file, reuse_download)
+
+
+if __name__ == '__main__':
+    main()
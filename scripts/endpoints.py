@@ -0,0 +1,11 @@
+import os
+from dotenv import load_dotenv
+
+# The services the notebooks talk to. They can be replaced (e.g. by the local stand-ins in standins/) by setting the
+# environment variables or adding them to the .env file in the project directory.
+load_dotenv()
+
+WIAG_BASE_URL = os.environ.get('WIAG_BASE_URL', 'https://wiag-vocab.adw-goe.de').rstrip('/')
+FG_SPARQL_URL = os.environ.get('FG_SPARQL_URL', 'https://database.factgrid.de/sparql')
+FG_API_URL = os.environ.get('FG_API_URL', 'https://database.factgrid.de/w/api.php')
+LLM_BASE_URL = os.environ.get('LLM_BASE_URL', 'https://chat-ai.academiccloud.de/v1')
@@ -0,0 +1,155 @@
+import polars as pl
+from scripts.instrumentation import instrumented
+from scripts.quickstatements import ITEM, STRING, TEXT, v1_create_blocks, write_v1
+
+N_ROLE_4_DESCRIPTION = 2 # only up to two offices are added to the description
+
+# ranking of the most important role groups to be added to the description
+ROLE_GROUP_RANK_MAP = {
+    "Q648236" : 0, # Leiter (Erz-)diözese (Altes Reich)
+    "Q648232" : 1, # Domdignitär Altes Reich
+    "Q648226" : 2, # Domkleriker Altes Reich
+    "Q648233" : 3, # Klosterangehöriger mit Leitungsamt
+}
+
+# since 2023-12-19 and for now, all groups are relevant
+RELEVANT_ROLE_GROUP_FQ_IDS = [
+    "Q254893",
+    "Q385344",
+    "Q648226",
+    "Q648227",
+    "Q648228",
+    "Q648229",
+    "Q648230",
+    "Q648232",
+    "Q648233",
+    "Q648234",
+    "Q648235",
+    "Q648236",
+    "Q648239",
+]
+
+# the labels and statements of a new person in the order they are written (strings and texts are put in quotation marks)
+PERSON_COLUMNS = {
+    'Lde': TEXT, 'Len': TEXT, 'Lfr': TEXT, 'Les': TEXT, 'Dde': TEXT, 'Den': TEXT,
+    'P2': ITEM, 'P131': ITEM, 'P154': ITEM, 'P601': STRING, 'P76': STRING, 'P472': STRING,
+    'Swikidatawiki': TEXT, 'Sdewiki': TEXT,
+}
+
+
+# persons that are not yet in FG
+def select_new_persons(df_person_all):
+    return df_person_all.filter(pl.col("FactGrid_ID").is_null()).rename({'id':'person_id'})
+
+
+# defines how to piece together the description of an office
+def describe_office(role_row):
+    inst_or_dioc = role_row.get('institution') if role_row.get('institution') is not None else role_row.get('diocese')
+
+    date_begin = role_row.get('date_begin')
+    date_end = role_row.get('date_end')
+
+    date_info = ""
+    if date_begin is not None and date_end is not None:
+        date_info = f"{date_begin}-{date_end}"
+    elif date_begin is not None:
+        date_info = str(date_begin)
+    elif date_end is not None:
+        date_info = f"bis {date_end}"
+
+    description = role_row.get('name', '')
+    if inst_or_dioc is not None:
+        description += f" {inst_or_dioc}"
+    if date_info:
+        description += f" {date_info}"
+
+    return description
+
+
+# For each person the two most important offices are chosen, first by ranking by role group and then choosing the most recent office.
+# Returns the German descriptions (summary_roles) and the English title of the role group with the highest rank (best_role_group_en).
+@instrumented()
+def build_descriptions(df_offices):
+    grp_descriptions = []
+    grp_descriptions_en = []
+
+    for pid, grp in df_offices.with_columns(
+            pl.col('role_group_fq_id').replace_strict(ROLE_GROUP_RANK_MAP, default=len(ROLE_GROUP_RANK_MAP)).alias('rank')
+        ).group_by('person_id'):
+
+        df_sorted = grp.sort(['rank', 'date_sort_key'], descending=[False, True])
+
+        # generating German descriptions
+        description_list = []
+        for row in df_sorted.iter_rows(named=True):
+            desc = describe_office(row)
+            if desc not in description_list:
+                description_list.append(desc)
+
+        # choosing the two descriptions with the highest rank
+        descriptions = ", ".join(description_list[:N_ROLE_4_DESCRIPTION])
+        grp_descriptions.append({"person_id": pid[0], "summary_roles": descriptions})
+
+        # getting the English title of the group with highest rank to use as the description
+        if df_sorted.height > 0:
+            grp_descriptions_en.append({"person_id": pid[0], "best_role_group_en": df_sorted.item(0, 'role_group_en')})
+        else:
+            grp_descriptions_en.append({"person_id": pid[0], "best_role_group_en": "missing"})
+
+    grp_descriptions_df = pl.DataFrame(grp_descriptions, schema={"person_id": pl.String, "summary_roles": pl.String})
+    grp_descriptions_en_df = pl.DataFrame(grp_descriptions_en, schema={"person_id": pl.String, "best_role_group_en": pl.String})
+
+    return (grp_descriptions_df, grp_descriptions_en_df)
+
+
+# The German description contains the biographical dates and the summary of the offices, the English one the
+# biographical dates and the role group with the highest rank.
+def add_descriptions(df_person):
+    return df_person.with_columns(
+        description_de = pl.concat_str([pl.col('biographical_dates'), pl.col('summary_roles')], separator=', '),
+        description_en = pl.concat_str([pl.col('biographical_dates'), pl.col('best_role_group_en')], separator=', ')
+    )
+
+
+# renames the columns according to the conventions of FactGrid
+def rename_to_factgrid(df_person):
+    return df_person.rename({
+        'displayname': 'Lde',
+        'description_de': 'Dde',
+        'description_en': 'Den',
+        'date_of_birth': 'P77',
+        'date_of_death': 'P38',
+        'GND_ID': 'P76',
+        'GSN': 'P472',
+        'Wikidata_ID': 'Swikidatawiki',
+        'Wikipedia': 'Sdewiki'
+    }).with_columns(P601=pl.col("person_id")) # this rename is done separately to have the unmodified id later
+
+
+# copies the German label for the other languages and adds data that is the same for all persons: human, part of Germania Sacra research data, male
+def add_constant_statements(df_person):
+    return df_person.with_columns(
+        Len = pl.col('Lde'),
+        Lfr = pl.col('Lde'),
+        Les = pl.col('Lde'),
+        P2 = pl.lit("Q7"),
+        P131 = pl.lit("Q153178"),
+        P154 = pl.lit("Q18")
+    )
+
+
+def prepare_persons(df_person_all, df_offices):
+    df_person_in = select_new_persons(df_person_all)
+    (grp_descriptions_df, grp_descriptions_en_df) = build_descriptions(df_offices)
+    df_person = df_person_in.join(grp_descriptions_df, on="person_id").join(grp_descriptions_en_df, on="person_id")
+    return add_constant_statements(rename_to_factgrid(add_descriptions(df_person)))
+
+
+# writes a CREATE block for every person - the role groups (P165) are taken from df_offices
+@instrumented()
+def write_persons_v1(df_person, df_offices, output_path_file):
+    role_groups_df = df_offices.group_by('person_id').agg(
+        pl.col('role_group_fq_id').drop_nulls().unique(maintain_order=True).alias('role_groups')
+    )
+    df_person = df_person.join(role_groups_df, on='person_id', how='left', maintain_order='left')
+    write_v1(df_person, output_path_file, lambda chunk: v1_create_blocks(chunk, PERSON_COLUMNS, {'role_groups': 'P165'}))
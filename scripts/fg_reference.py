@@ -0,0 +1,414 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import cached_property
+from datetime import datetime, timedelta, timezone
+import polars as pl
+from scripts.endpoints import FG_SPARQL_URL
+from scripts.artefacts import CACHE_DIR_NAME, load_artefact, save_artefact
+from scripts.instrumentation import instrumented, count_http_call
+from scripts.json_decoding import decode_bindings
+from scripts.label_index import build_label_index
+
+FG_ENTITY_PREFIX = 'https://database.factgrid.de/entity/'
+
+# Every item with a WIAG-ID (P601) or a GSN (P472) in one row: its WIAG-IDs and GSNs, whether it is a person (P2 Q7)
+# and how many P165 statements (role groups and offices) it has. Notebooks 2, 4, 5 and 6 each use a part of it, so it
+# is stored as an artefact and can be reused by the next notebook.
+PERSON_CROSSWALK_ARTEFACT = 'fg_person_crosswalk'
+PERSON_CROSSWALK_MEMBERS = '{ ?item wdt:P601 []. } UNION { ?item wdt:P472 []. }'
+PERSON_CROSSWALK_QUERY = f"""SELECT ?item (GROUP_CONCAT(DISTINCT ?wiag; separator="|") AS ?wiag_ids) (GROUP_CONCAT(DISTINCT ?gsn; separator="|") AS ?gsns)
+  (SAMPLE(?human) AS ?person) (COUNT(DISTINCT ?statement) AS ?p165_count) WHERE {{
+  {PERSON_CROSSWALK_MEMBERS}
+  OPTIONAL {{ ?item wdt:P601 ?wiag. }}
+  OPTIONAL {{ ?item wdt:P472 ?gsn. }}
+  OPTIONAL {{ ?item wdt:P2 wd:Q7. BIND(true AS ?human) }}
+  OPTIONAL {{ ?item p:P165 ?statement. }}
+}} GROUP BY ?item"""
+PERSON_CROSSWALK_VARIABLES = ['item', 'wiag_ids', 'gsns', 'person', 'p165_count']
+
+# the P165 statements of the persons with their WIAG-ID reference (S601) and time qualifiers, one row per statement,
+# reference and time qualifier
+OFFICE_STATEMENTS_QUERY = """SELECT ?person ?statement ?role ?wiag ?property ?time ?precision WHERE {{
+  VALUES ?person {{ {persons} }}
+  ?person p:P165 ?statement.
+  ?statement ps:P165 ?role.
+  OPTIONAL {{ ?statement prov:wasDerivedFrom/pr:P601 ?wiag. }}
+  OPTIONAL {{
+    ?statement ?qualifier ?value.
+    ?property wikibase:qualifierValue ?qualifier.
+    ?value wikibase:timeValue ?time;
+      wikibase:timePrecision ?precision.
+  }}
+}}"""
+# the variables of OFFICE_STATEMENTS_QUERY and their columns
+OFFICE_STATEMENTS_COLUMNS = {'person': 'FactGrid', 'statement': 'statement', 'role': 'fg_inst_role_id', 'wiag': 'person_id', 'property': 'property', 'time': 'time', 'precision': 'precision'}
+OFFICE_STATEMENTS_BATCH_SIZE = 200 # persons per query
+OFFICE_STATEMENTS_WORKERS = 4 # queries sent at the same time
+
+# Large results (all items with a WIAG-ID or a GSN) are downloaded in shards, so no single query runs into the timeout
+# of the query service: the items are asked for first with only the pattern that selects them, then the details of
+# every shard of items with the items in a VALUES clause, so each query only reads the triples of its own items. A
+# shard that fails is sent again as two halves.
+SHARD_SIZE = 2000 # items per shard
+SHARD_WORKERS = 4 # shards downloaded at the same time
+SHARD_TRIES = 4
+SHARD_BACKOFF = 2 # seconds before the first retry, doubled with every try
+SHARD_TIMEOUT = 120 # seconds
+MAX_GET_QUERY_LENGTH = 4000 # longer queries (e.g. the VALUES clause of a shard) are sent as POST, a URL is limited
+
+REFERENCE_DIR_NAME = 'fg_reference'
+REFERENCE_META_FILE = 'fg_reference.json'
+REFERENCE_VERSION = 2 # stored tables of an older version (with other columns) are downloaded again
+REFERENCE_TTL = timedelta(hours=1) # stored data younger than this is used without asking FactGrid
+FULL_REFRESH_AGE = timedelta(days=30) # after this the tables are downloaded completely again instead of only the changes
+QUERY_SERVICE_LAG = timedelta(days=1) # edits reach the query service with a delay, so the changes are requested with this overlap
+MAX_NEW_MEMBERS = 500 # if more items than this became part of a table without being modified themselves, the table is downloaded completely
+
+# 'members' selects the items of a table, 'details' adds the data of each item and 'columns' maps the query variables
+# to the columns of the table (the first one is always the item)
+REFERENCE_TABLES = {
+    # items with a Klosterdatenbank-ID
+    'institutions': {
+        'members': '?item wdt:P471 ?gsn.',
+        'details': """OPTIONAL {?item rdfs:label ?label.
+    FILTER(LANG(?label) = "de")}""",
+        'columns': {'item': 'fg_institution_id', 'gsn': 'fg_gsn_id', 'label': 'fg_institution_label'},
+        'schema': {'fg_institution_id': pl.String, 'fg_gsn_id': pl.UInt32, 'fg_institution_label': pl.String},
+    },
+    # items that are an instance or subclass of a diocese
+    'dioceses': {
+        'members': '?item wdt:P2/wdt:P3* wd:Q164535.',
+        'details': """?item rdfs:label ?label.
+    OPTIONAL {?item skos:altLabel ?alternative. }
+    OPTIONAL {?item wdt:P601 ?wiagid.}
+    FILTER(LANG(?label) in ("en", "de"))""",
+        'columns': {'item': 'fg_diocese_id', 'label': 'dioc_label', 'alternative': 'dioc_alt', 'wiagid': 'dioc_wiag_id'},
+        'schema': {'fg_diocese_id': pl.String, 'dioc_label': pl.String, 'dioc_alt': pl.String, 'dioc_wiag_id': pl.String},
+    },
+    # any item that is a "Career statement that captures a sequence of incumbents"
+    'inst_roles': {
+        'members': '?item wdt:P2 wd:Q257052.',
+        'details': """?item rdfs:label ?label.
+    FILTER(LANG(?label) in ("de"))""",
+        'columns': {'item': 'fg_inst_role_id', 'label': 'inst_role'},
+        'schema': {'fg_inst_role_id': pl.String, 'inst_role': pl.String},
+    },
+}
+
+
+# lookup of the first value for every key - rows with an empty key are ignored
+def first_values(df, key_column, value_column) -> dict:
+    return dict(df.select(key_column, value_column).drop_nulls(key_column).unique(key_column, keep='first', maintain_order=True).iter_rows())
+
+
+# The FactGrid reference tables together with hash lookups of the columns that the offices are matched by
+@dataclass
+class FgReference:
+    institution_df: pl.DataFrame
+    diocese_df: pl.DataFrame
+    inst_roles_df: pl.DataFrame
+    refreshed: datetime
+    institution_by_gsn: dict = field(init=False, repr=False)
+    diocese_by_wiag_id: dict = field(init=False, repr=False)
+    diocese_by_label: dict = field(init=False, repr=False)
+    diocese_by_alt: dict = field(init=False, repr=False)
+    inst_roles_by_label: dict = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.institution_by_gsn = first_values(self.institution_df, 'fg_gsn_id', 'fg_institution_id')
+        self.diocese_by_wiag_id = first_values(self.diocese_df, 'dioc_wiag_id', 'fg_diocese_id')
+        self.diocese_by_label = first_values(self.diocese_df, 'dioc_label', 'fg_diocese_id')
+        self.diocese_by_alt = first_values(self.diocese_df, 'dioc_alt', 'fg_diocese_id')
+        self.inst_roles_by_label = dict(self.inst_roles_df.group_by('inst_role', maintain_order=True).agg('fg_inst_role_id').iter_rows())
+
+    # The diocese is found by first searching for the WIAG-ID. Only if no entry was found, the search continues with
+    # the diocese's name, first in the diocese label and lastly in the diocese alt label.
+    def find_diocese(self, wiag_id, name):
+        fg_id = self.diocese_by_wiag_id.get(wiag_id) if wiag_id is not None else None
+        if fg_id is None and name is not None:
+            fg_id = self.diocese_by_label.get(name, self.diocese_by_alt.get(name))
+        return fg_id
+
+    # trigram indexes of the labels for suggesting candidates for names that were not found (built when first used)
+    @cached_property
+    def diocese_index(self) -> dict:
+        return build_label_index(self.diocese_df, 'fg_diocese_id', ['dioc_label', 'dioc_alt'])
+
+    @cached_property
+    def institution_index(self) -> dict:
+        return build_label_index(self.institution_df, 'fg_institution_id', ['fg_institution_label'])
+
+    @cached_property
+    def inst_role_index(self) -> dict:
+        return build_label_index(self.inst_roles_df, 'fg_inst_role_id', ['inst_role'])
+
+    # the place names in the labels of the dioceses and institutions, which the glossary passes through untranslated
+    @cached_property
+    def place_names(self) -> set:
+        from scripts.glossary import place_names
+
+        return place_names(self.diocese_df.get_column('dioc_label'), self.institution_df.get_column('fg_institution_label'))
+
+
+# The results of query as one list per variable in 'variables' (see scripts/json_decoding.py), other variables are
+# skipped
+def sparql_select(query: str, variables: list, timeout: float = None, delay: float = 0) -> dict:
+    import requests # only imported when something is downloaded
+
+    time.sleep(delay)
+    count_http_call()
+    if len(query) > MAX_GET_QUERY_LENGTH:
+        r = requests.post(FG_SPARQL_URL, data={'query': query}, headers={"Accept": "application/json"}, timeout=timeout)
+    else:
+        r = requests.get(FG_SPARQL_URL, params={'query': query}, headers={"Accept": "application/json"}, timeout=timeout)
+    r.raise_for_status()
+    return decode_bindings(r.content, variables)
+
+
+# seconds to wait before a try (none before the first one)
+def backoff(tries: int) -> float:
+    return SHARD_BACKOFF * 2 ** (tries - 2) if tries > 1 else 0
+
+
+def sparql_select_retried(query: str, variables: list) -> dict:
+    import requests
+
+    for tries in range(1, SHARD_TRIES + 1):
+        try:
+            return sparql_select(query, variables, SHARD_TIMEOUT, backoff(tries))
+        except requests.RequestException as e:
+            if tries == SHARD_TRIES:
+                raise
+            print(f"The query failed ({str(e).split(' for url')[0]}), trying again.")
+
+
+# query with ?variable bound to the items of the shard (QIDs), in a VALUES clause at the start of the WHERE clause
+def shard_query(query: str, variable: str, shard: list) -> str:
+    start = query.index('{', query.index('WHERE')) + 1
+    return f"{query[:start]}\n  VALUES ?{variable} {{ {' '.join('wd:' + qid for qid in shard)} }}{query[start:]}"
+
+
+# The results of query (a SELECT query whose ?variable is an item) in shards of shard_size items, downloaded at the
+# same time. The items are the ones matching 'members' (the pattern of query that selects the items, without its
+# OPTIONAL parts), which are asked for first. A shard that fails is retried (split in two halves, in case it timed out)
+# until SHARD_TRIES; the results (one list per variable in 'variables') are returned in the order of the QIDs. Without
+# shard_size the query is sent as it is.
+@instrumented()
+def sparql_select_sharded(query: str, variable: str, members: str, variables: list, shard_size: int = SHARD_SIZE) -> dict:
+    import requests
+
+    if shard_size is None:
+        return sparql_select(query, variables)
+    items = sparql_select_retried(f"SELECT DISTINCT ?{variable} WHERE {{\n  {members}\n}}", [variable])[variable]
+    qids = sorted((item_id(uri) for uri in items if uri.startswith(FG_ENTITY_PREFIX + 'Q')), key=lambda qid: int(qid[1:]))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as pool:
+        def submit(shard, tries):
+            return (pool.submit(sparql_select, shard_query(query, variable, qids[shard[0]:shard[1]]), variables, SHARD_TIMEOUT, backoff(tries)), (shard, tries))
+
+        # a shard is the range of positions of its items in qids
+        pending = dict(submit((start, min(start + shard_size, len(qids))), 1) for start in range(0, len(qids), shard_size))
+        while pending:
+            (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (shard, tries) = pending.pop(future)
+                try:
+                    results[shard] = future.result()
+                except requests.RequestException as e:
+                    if tries == SHARD_TRIES:
+                        raise
+                    print(f"{qids[shard[0]]} to {qids[shard[1] - 1]} failed ({str(e).split(' for url')[0]}), trying again.")
+                    middle = (shard[0] + shard[1]) // 2
+                    halves = [(shard[0], middle), (middle, shard[1])] if shard[1] - shard[0] > 1 else [shard]
+                    pending.update(submit(half, tries + 1) for half in halves)
+    return {name: [value for shard in sorted(results) for value in results[shard][name]] for name in variables}
+
+
+# the members of the table with the time they were last modified
+def members_query(table: str) -> str:
+    return f"SELECT DISTINCT ?item ?modified WHERE {{\n    {REFERENCE_TABLES[table]['members']}\n    OPTIONAL {{ ?item schema:dateModified ?modified. }}\n}}"
+
+
+def details_query(table: str, condition: str = '') -> str:
+    spec = REFERENCE_TABLES[table]
+    variables = ' '.join('?' + variable for variable in spec['columns'])
+    return f"SELECT DISTINCT {variables} WHERE {{\n    {spec['members']}\n    {spec['details']}\n    {condition}\n}}"
+
+
+def item_id(uri: str) -> str:
+    return uri.removeprefix(FG_ENTITY_PREFIX)
+
+
+# the table from the results of details_query (one list per variable)
+def to_frame(table: str, values: dict) -> pl.DataFrame:
+    spec = REFERENCE_TABLES[table]
+    df = pl.DataFrame({column: values[variable] for variable, column in spec['columns'].items()}, schema={column: pl.String for column in spec['columns'].values()})
+    id_column = next(iter(spec['schema']))
+    return df.with_columns(pl.col(id_column).str.strip_prefix(FG_ENTITY_PREFIX)).cast(spec['schema'])
+
+
+def fetch_table(table: str) -> pl.DataFrame:
+    return to_frame(table, sparql_select(details_query(table), list(REFERENCE_TABLES[table]['columns'])))
+
+
+# Only the items that were modified since 'since' (or became part of the table since the last refresh) are downloaded
+# again. The stored rows of all modified items are dropped, also of those that no longer match details_query (e.g.
+# because they lost their label). Items that are no longer part of the table are removed.
+def refresh_table(table: str, stored_df: pl.DataFrame, since: datetime) -> pl.DataFrame:
+    id_column = next(iter(REFERENCE_TABLES[table]['schema']))
+    members = sparql_select(members_query(table), ['item', 'modified'])
+    member_ids = {item_id(uri) for uri in members['item']}
+    modified_ids = {item_id(uri) for uri, modified in zip(members['item'], members['modified']) if modified is not None and datetime.fromisoformat(modified) >= since}
+    new_member_ids = member_ids.difference(stored_df.get_column(id_column))
+    if len(new_member_ids) > MAX_NEW_MEMBERS:
+        return fetch_table(table)
+
+    condition = f'?modified >= "{since.strftime("%Y-%m-%dT%H:%M:%SZ")}"^^xsd:dateTime'
+    if new_member_ids:
+        condition += f" || ?item IN ({', '.join('wd:' + id for id in sorted(new_member_ids))})"
+    changed_df = to_frame(table, sparql_select(details_query(table, f"?item schema:dateModified ?modified.\n    FILTER({condition})"), list(REFERENCE_TABLES[table]['columns'])))
+
+    kept_df = stored_df.filter(
+        pl.col(id_column).is_in(list(member_ids)) &
+        pl.col(id_column).is_in(list(modified_ids.union(changed_df.get_column(id_column)))).not_()
+    )
+    return pl.concat([kept_df, changed_df])
+
+
+def load_meta(reference_dir: str) -> dict:
+    path = os.path.join(reference_dir, REFERENCE_META_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Returns the institutions, dioceses and institution roles from FactGrid. The tables are stored in the .cache directory
+# of 'directory' and reused for 'ttl'. After that only the changes are downloaded (every FULL_REFRESH_AGE or with
+# full_refresh=True the complete tables). The queries for the three tables are sent at the same time.
+@instrumented()
+def load_fg_reference(directory: str, ttl: timedelta = REFERENCE_TTL, full_refresh: bool = False) -> FgReference:
+    reference_dir = os.path.join(directory, CACHE_DIR_NAME, REFERENCE_DIR_NAME)
+    table_files = {table: os.path.join(reference_dir, f"{table}.parquet") for table in REFERENCE_TABLES}
+    meta = load_meta(reference_dir)
+    stored = meta.get('version') == REFERENCE_VERSION and all(os.path.exists(path) for path in table_files.values())
+    now = datetime.now(timezone.utc)
+
+    if stored and not full_refresh and now - datetime.fromisoformat(meta['refreshed']) < ttl:
+        mode = 'stored'
+        tables = {table: pl.read_parquet(path) for table, path in table_files.items()}
+    else:
+        if not stored or full_refresh or now - datetime.fromisoformat(meta['full_refresh']) > FULL_REFRESH_AGE:
+            mode = 'full'
+            meta['full_refresh'] = now.isoformat(timespec='seconds')
+        else:
+            mode = 'incremental'
+            since = datetime.fromisoformat(meta['refreshed']) - QUERY_SERVICE_LAG
+
+        with ThreadPoolExecutor(max_workers=len(REFERENCE_TABLES)) as pool:
+            if mode == 'full':
+                futures = {table: pool.submit(fetch_table, table) for table in REFERENCE_TABLES}
+            else:
+                futures = {table: pool.submit(refresh_table, table, pl.read_parquet(table_files[table]), since) for table in REFERENCE_TABLES}
+            tables = {table: future.result() for table, future in futures.items()}
+
+        os.makedirs(reference_dir, exist_ok=True)
+        for table, df in tables.items():
+            df.write_parquet(table_files[table])
+        meta['refreshed'] = now.isoformat(timespec='seconds')
+        meta['version'] = REFERENCE_VERSION
+        with open(os.path.join(reference_dir, REFERENCE_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    #clean the diocese alts by removing BITECA and BETA entries
+    diocese_df = tables['dioceses'].with_columns(pl.col('dioc_alt').str.replace('^(BITECA|BETA).*', ''))
+
+    print(f"{tables['institutions'].height} institutions, {diocese_df.height} dioceses and {tables['inst_roles'].height} institution roles were loaded from FactGrid ({mode}, as of {meta['refreshed']}).")
+
+    return FgReference(tables['institutions'], diocese_df, tables['inst_roles'], datetime.fromisoformat(meta['refreshed']))
+
+
+# the crosswalk from the results of PERSON_CROSSWALK_QUERY (one list per variable)
+def to_crosswalk_frame(values: dict) -> pl.DataFrame:
+    df = pl.DataFrame({
+        'FactGrid_ID': values['item'],
+        'wiag_ids': values['wiag_ids'],
+        'gsns': values['gsns'],
+        'is_person': values['person'],
+        'p165_count': values['p165_count'],
+    }, schema={column: pl.String for column in ['FactGrid_ID', 'wiag_ids', 'gsns', 'is_person', 'p165_count']})
+    # GROUP_CONCAT gives an empty string for items without values
+    return df.with_columns(
+        pl.col('FactGrid_ID').str.strip_prefix(FG_ENTITY_PREFIX),
+        *(
+            pl.when(pl.col(column).fill_null('') != '').then(pl.col(column).str.split('|')).otherwise(pl.lit([], dtype=pl.List(pl.String))).alias(column)
+            for column in ['wiag_ids', 'gsns']
+        ),
+        pl.col('is_person').is_not_null(),
+        pl.col('p165_count').cast(pl.UInt32).fill_null(0),
+    )
+
+
+# The crosswalk (see PERSON_CROSSWALK_QUERY). Every download is stored as an artefact of 'step'; with max_age a stored
+# download younger than that is used instead (only if nothing was uploaded to FactGrid since then).
+@instrumented()
+def load_person_crosswalk(directory: str, step: str, max_age: timedelta = None, shard_size: int = SHARD_SIZE) -> pl.DataFrame:
+    if max_age is not None:
+        df = load_artefact(directory, PERSON_CROSSWALK_ARTEFACT, max_age=max_age)
+        if df is not None:
+            print(f"The {df.height} items with a WIAG-ID or GSN downloaded within the last {max_age} are used.")
+            return df
+
+    df = to_crosswalk_frame(sparql_select_sharded(PERSON_CROSSWALK_QUERY, 'item', PERSON_CROSSWALK_MEMBERS, PERSON_CROSSWALK_VARIABLES, shard_size))
+    save_artefact(directory, PERSON_CROSSWALK_ARTEFACT, df, step, sources={FG_SPARQL_URL: hashlib.sha256(PERSON_CROSSWALK_QUERY.encode()).hexdigest()})
+    return df
+
+
+# the persons with a WIAG-ID (P601) as in notebook 2, one row per WIAG-ID
+def fg_wiag_ids(crosswalk_df: pl.DataFrame) -> pl.DataFrame:
+    return crosswalk_df.filter('is_person').select('FactGrid_ID', pl.col('wiag_ids').alias('wiag_id')).explode('wiag_id', empty_as_null=False)
+
+
+# the items with a GSN (P472) as in notebooks 5 and 6, one row per GSN
+def fg_gsn_items(crosswalk_df: pl.DataFrame) -> pl.DataFrame:
+    return crosswalk_df.select('FactGrid_ID', pl.col('gsns').alias('gsn')).explode('gsn', empty_as_null=False)
+
+
+def load_fg_wiag_ids(directory: str, step: str, max_age: timedelta = None) -> pl.DataFrame:
+    return fg_wiag_ids(load_person_crosswalk(directory, step, max_age))
+
+
+def load_fg_gsn_items(directory: str, step: str, max_age: timedelta = None) -> pl.DataFrame:
+    return fg_gsn_items(load_person_crosswalk(directory, step, max_age))
+
+
+# the statements from the results of OFFICE_STATEMENTS_QUERY (one list per variable)
+def to_statements_frame(values: dict) -> pl.DataFrame:
+    df = pl.DataFrame(
+        {column: values[variable] for variable, column in OFFICE_STATEMENTS_COLUMNS.items()},
+        schema={column: pl.String for column in OFFICE_STATEMENTS_COLUMNS.values()}
+    )
+    return df.with_columns(pl.col('FactGrid', 'fg_inst_role_id', 'property').str.strip_prefix(FG_ENTITY_PREFIX))
+
+
+# The office statements (P165) that the persons already have on FactGrid, see OFFICE_STATEMENTS_QUERY. The persons are
+# asked for in batches, several at the same time. Persons without any P165 statement in crosswalk_df (if given, it has
+# to be downloaded after the last upload) are left out.
+@instrumented()
+def fetch_office_statements(person_ids, crosswalk_df: pl.DataFrame = None) -> pl.DataFrame:
+    person_ids = {person_id for person_id in person_ids if person_id is not None}
+    if crosswalk_df is not None:
+        person_ids = person_ids.difference(crosswalk_df.filter(pl.col('p165_count') == 0).get_column('FactGrid_ID'))
+    person_ids = sorted(person_ids)
+    queries = [
+        OFFICE_STATEMENTS_QUERY.format(persons=' '.join('wd:' + person_id for person_id in person_ids[start:start + OFFICE_STATEMENTS_BATCH_SIZE]))
+        for start in range(0, len(person_ids), OFFICE_STATEMENTS_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=OFFICE_STATEMENTS_WORKERS) as pool:
+        results = list(pool.map(lambda query: sparql_select_retried(query, list(OFFICE_STATEMENTS_COLUMNS)), queries))
+    return to_statements_frame({variable: [value for result in results for value in result[variable]] for variable in OFFICE_STATEMENTS_COLUMNS})
@@ -21,101 +21,69 @@
 #
 #In case you renamed the file (e.g. to include the date on which it was created) you also need to **change the `filename`** below.
 #%%
-import requests
-import csv
-import os
-import pandas as pd
-import json
-import re
-import time
+#the steps of this notebook are defined in scripts/fg_to_dpr_functions.py (python -m scripts fg_to_dpr runs them without Jupyter)
 from datetime import datetime, timedelta
-import math
-import traceback
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+from scripts.fg_to_dpr_functions import load_dpr_ids, compare_fg_ids, item_link, write_update_sql
 
-input_path = r"C:\Users\Public\sync_notebooks\input_files"
+input_path = INPUT_PATH # the folder set in the .env file, see scripts/paths.py
 filename = 'persons.csv'
 #%%
-pr_df = pd.read_csv(os.path.join(input_path, filename), header = 0, names=["fg_id", "id", "gsn"])
+pr_df = load_dpr_ids(input_path, filename)
 #%% [markdown]
 ### 3. Import data from FactGrid
 #Data is downloaded and and cleaned for further processing automatically.
+#
+#Every download is stored in the `.cache` folder of the `input_path` directory. If you ran notebook 2 shortly before and **did not upload anything to FactGrid since then**, you can set `reuse_download` below to use its download instead of downloading everything again.
 #%%
-url = 'https://database.factgrid.de/sparql'
-query = (
-"""SELECT ?item ?gsn WHERE {
-  ?item wdt:P472 ?gsn.
-}""")
+from scripts.fg_reference import load_fg_gsn_items
+from scripts.artefacts import to_pandas
 
-r = requests.get(url, params={'query': query}, headers={"Accept": "application/json"})
-data = r.json()
-factgrid_df = pd.json_normalize(data['results']['bindings'])
+reuse_download = None # e.g. timedelta(hours = 1) to use the data downloaded by notebook 2 in the last hour (see above)
+factgrid_df = to_pandas(load_fg_gsn_items(input_path, step = 'fg_to_dpr', max_age = reuse_download))
 
 len(factgrid_df)
-#%%
-#extract out q id
-def extract_qid(df, column):
-    df[column] = df[column].map(lambda x: x.strip('https://database.factgrid.de/entity/'))
-
-#drop irrelevant columns
-def drop_type_columns(df):
-    df.drop(columns=[column for column in df.columns if column.endswith('type')], inplace=True)
-    df.drop(columns=[column for column in df.columns if column.endswith('xml:lang')], inplace=True)
-#%%
-drop_type_columns(factgrid_df)
-extract_qid(factgrid_df, 'item.value')
-factgrid_df.columns = ['FactGrid_ID', 'gsn']
 #%% [markdown]
 ### 4. Compare data from DPr and FG
 #First the data is joined. Then two checks will be performed. These two cases need to be **handled manually** and will **not be updated automatically**. Generally it's a good idea to take care of these cases right away, but if that's not possible, you can also first let the notebook finish and later take care of the other cases.
 #Joining the data and showing a sample to give an idea of what the data looks like.
 #%%
-joined_df = factgrid_df.merge(pr_df, how='outer', on='gsn', suffixes=('_wiag', '_pd'), indicator=True)
-joined_df
+frames = compare_fg_ids(factgrid_df, pr_df)
+frames['joined']
 #%% [markdown]
 #### Entries only in FG
 #The output of the cell below shows entries in FG which point to entries that were not found in DPr. These entries need to be **fixed manually**.
 #%%
-joined_df[joined_df['_merge'] == 'left_only']
+frames['only_in_fg']
 #%% [markdown]
 #From now on only entries that were found both in DPr and FG and don't point to each other are considered, because these are the cases that need to be updated.
 #%%
-unequal_df = joined_df[(joined_df['_merge'] == 'both') & (joined_df['FactGrid_ID'] != joined_df['fg_id'])]
-unequal_df
+frames['unequal']
 #%% [markdown]
 #### Finding possible duplicates
 #Should any entries be shown, these need to be **fixed manually**. For this, the cell one further down will generate links to speed up the process.
 #%%
-possible_dup = unequal_df[unequal_df['fg_id'].notna()]
+possible_dup = frames['possible_duplicates']
 possible_dup
 #%% [markdown]
 #generating links to check on FactGrid
 #%%
-linkify = lambda x : 'https://database.factgrid.de/wiki/Item:' + x 
 for _, row in possible_dup.iterrows(): # if DPr-entry points to a FactGrid-entry, but a different FG-entry points to DPr-entry
-    print(linkify (row['FactGrid_ID']), linkify (row['fg_id']))
+    print(item_link(row['FactGrid_ID']), item_link(row['fg_id']))
 #%% [markdown]
 #once again ignoring the special cases and continuing on with the rest
 #%%
-to_be_updated_df = unequal_df[unequal_df['fg_id'].isna()]
+to_be_updated_df = frames['to_be_updated']
 #%% [markdown]
 ### 5. Update DPr
 #### Generate SQL to update DPr
 #Please **change the `output_path`** to where you want the SQL-file to be saved to.
 #%%
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
+output_path = OUTPUT_PATH # the folder set in the .env file, see scripts/paths.py
 #%%
 today_string = datetime.now().strftime('%Y-%m-%d')
 
-query = "LOCK TABLES persons WRITE;\n"
-for _, row in to_be_updated_df.iterrows():
-    query += f"""
-    UPDATE persons
-    SET factgrid = '{row['FactGrid_ID']}'
-    WHERE id = {row['id']}; -- id: {row['gsn']}
-"""
-query += "\nUNLOCK TABLES;"
-with open(os.path.join(output_path, f'update_pr_fg_ids_{today_string}.sql'), 'w') as file:
-    file.write(query)
+write_update_sql(to_be_updated_df, output_path, today_string)
 
 #%% [markdown]
 #### Upload the file
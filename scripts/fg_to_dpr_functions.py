@@ -0,0 +1,89 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+from scripts.artefacts import to_pandas
+from scripts.fg_reference import load_fg_gsn_items
+from scripts.ingest import read_export_pandas
+from scripts.id_codec import merge_ids
+from scripts.instrumentation import instrumented
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+
+# The steps of notebook 5 (fg_to_dpr): the FactGrid-IDs that DPr has are compared with the persons on FactGrid that
+# link to a DPr-entry (by GSN), and the missing or outdated ones are set in DPr with an SQL file.
+#   python -m scripts fg_to_dpr --input-path <folder> --output-path <folder>
+
+DPR_FILE = 'persons.csv' # export of queries/select_dpr_ids.sql
+
+
+def load_dpr_ids(input_path: str, filename: str = DPR_FILE):
+    return read_export_pandas(os.path.join(input_path, filename), 'dpr_ids')
+
+
+# The persons on FactGrid (factgrid_df: FactGrid_ID, gsn) joined with DPr (pr_df) by GSN, and the cases of step 4:
+# 'only_in_fg' and 'possible_duplicates' need to be fixed manually, 'to_be_updated' are set in DPr.
+@instrumented()
+def compare_fg_ids(factgrid_df, pr_df) -> dict:
+    joined_df = merge_ids(factgrid_df, pr_df, 'gsn', how = 'outer', on = 'gsn', suffixes = ('_wiag', '_pd'), indicator = True)
+    unequal_df = joined_df[(joined_df['_merge'] == 'both') & (joined_df['FactGrid_ID'] != joined_df['fg_id'])]
+    return {
+        'joined': joined_df,
+        'only_in_fg': joined_df[joined_df['_merge'] == 'left_only'],
+        'unequal': unequal_df,
+        # the DPr-entry points to a FactGrid-entry, but a different FG-entry points to the DPr-entry
+        'possible_duplicates': unequal_df[unequal_df['fg_id'].notna()],
+        'to_be_updated': unequal_df[unequal_df['fg_id'].isna()],
+    }
+
+
+def item_link(qid: str) -> str:
+    return 'https://database.factgrid.de/wiki/Item:' + qid
+
+
+# the SQL file that sets the FactGrid-IDs in DPr (step 5)
+def write_update_sql(to_be_updated_df, output_path: str, today_string: str) -> str:
+    query = "LOCK TABLES persons WRITE;\n"
+    for _, row in to_be_updated_df.iterrows():
+        query += f"""
+    UPDATE persons
+    SET factgrid = '{row['FactGrid_ID']}'
+    WHERE id = {row['id']}; -- id: {row['gsn']}
+"""
+    query += "\nUNLOCK TABLES;"
+
+    path = os.path.join(output_path, f'update_pr_fg_ids_{today_string}.sql')
+    with open(path, 'w') as file:
+        file.write(query)
+    return path
+
+
+# All steps of the notebook without Jupyter: prints the cases that need to be fixed manually and writes the SQL file.
+# With reuse_download the persons downloaded by notebook 2 (if not older) are used. Returns the frames of compare_fg_ids.
+def run_fg_to_dpr(input_path: str = INPUT_PATH, output_path: str = OUTPUT_PATH, filename: str = DPR_FILE, reuse_download = None) -> dict:
+    pr_df = load_dpr_ids(input_path, filename)
+    factgrid_df = to_pandas(load_fg_gsn_items(input_path, step = 'fg_to_dpr', max_age = reuse_download))
+
+    frames = compare_fg_ids(factgrid_df, pr_df)
+    print(f"{len(frames['only_in_fg'])} entries on FactGrid point to entries that are not in DPr.")
+    print(f"{len(frames['possible_duplicates'])} possible duplicates:")
+    for _, row in frames['possible_duplicates'].iterrows():
+        print(item_link(row['FactGrid_ID']), item_link(row['fg_id']))
+
+    path = write_update_sql(frames['to_be_updated'], output_path, datetime.now().strftime('%Y-%m-%d'))
+    print(f"{len(frames['to_be_updated'])} FactGrid-IDs are set in DPr, written to {path}")
+    return frames
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description = "Notebook 5: generates the SQL file that sets the FactGrid-IDs in DPr.")
+    parser.add_argument('--input-path', default = INPUT_PATH)
+    parser.add_argument('--output-path', default = OUTPUT_PATH)
+    parser.add_argument('--dpr-file', default = DPR_FILE, help = "DPr export of queries/select_dpr_ids.sql")
+    parser.add_argument('--reuse-download', type = float, metavar = 'HOURS', help = "use the persons downloaded from FactGrid in the last HOURS hours")
+    args = parser.parse_args(argv)
+
+    reuse_download = timedelta(hours = args.reuse_download) if args.reuse_download is not None else None
+    run_fg_to_dpr(args.input_path, args.output_path, args.dpr_file, reuse_download)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@
 #3. Identify discrepancies: The code compares the local IDs with the online IDs to find any differences or mismatches.
 #4. Find entries to update in FactGrid: Check for FG-entries that have outdated WIAG-IDs, which need to be updated (and for which it can be done automatically)
 #5. Update FactGrid: A file listing the discrepancies is generated, formatted in a way that can be used to automatically update the IDs in the FactGrid database. This needs to be uploaded manually.
-#6. Retrieve updated online data: The data from FactGrid is redownloaded, now that changes were made.
+#6. Retrieve updated online data: The entries changed on FactGrid are read again, now that changes were made.
 #7. Rerunning checks: To make sure that no mistakes have been introduced by updating FactGrid, the checks from before are run again.
 #8. Find entries to update in WIAG: Check for WIAG-entries that do not link to an FG-entry, but an FG-entry links to them and add the respective FG-ID to them
 #9. Update WIAG: WIAG-entries that do not yet link to a FactGrid-entry, but to which an FG-entry links, are updated to link back
@@ -28,52 +28,37 @@
 #Lastly, if you renamed the file, change `input_file` to the actual name.
 
 #%%
-import requests
-import csv
+#the steps of this notebook are defined in scripts/fg_wiag_ids_functions.py (python -m scripts fg_wiag_ids runs them without Jupyter)
 import os
-import pandas as pd
-import json
+from datetime import datetime
+from scripts.instrumentation import start_trace, print_summary
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+from scripts.fg_wiag_ids_functions import load_wiag_persons, fg_wiag_ids_pandas, problematic_entries, id_conflicts
+
+start_trace('fg_wiag_ids')
 
 #change input_path if your file is located somewhere else, e.g. to "C:\Users\schwart2\Downloads""
-input_path = r"C:\Users\Public\sync_notebooks\input_files"
+input_path = INPUT_PATH # the folder set in the .env file, see scripts/paths.py
 #change input_file if you renamed the file
 input_file = f"WIAG-Domherren-DB-Lebensdaten.csv"
 
 input_path_file = os.path.join(input_path, input_file)
-wiag_persons_df = pd.read_csv(input_path_file, sep=';')
-wiag_persons_df = wiag_persons_df[['FactGrid_ID', 'id']] # selecting columns
+wiag_persons_df = load_wiag_persons(input_path_file) # the columns wiag_fg_id and wiag_id
 print(str(len(wiag_persons_df)) + " entries were imported.")
 
-wiag_persons_df.columns = ['wiag_fg_id', 'wiag_id'] # renaming the columns
-
 #%% [markdown]
 ### 2. Import Factgrid data
-#This downloads and imports the data from FactGrid automatically.
+#This downloads and imports the data from FactGrid automatically. The persons are requested in parts (by their FactGrid-ID), several at the same time; parts that fail are requested again on their own.
+#
+#The download also contains the GSNs and the number of office statements of every person. It is stored in the `.cache` folder of `input_path`, so the notebooks 4, 5 and 6 can reuse it.
 
 #%%
-fg_url = 'https://database.factgrid.de/sparql'
-fg_query = """
-SELECT ?person ?wiag WHERE {
-  ?person wdt:P601 ?wiag.
-  ?person wdt:P2 wd:Q7.
-}
-"""
-
-r = requests.get(fg_url, params={'query': fg_query}, headers={"Accept": "application/json"})
-data = r.json()
-fg_wiag_ids_df = pd.json_normalize(data['results']['bindings'])
-
-print(str(len(fg_wiag_ids_df)) + " entries were imported.")
-
-#drop irrelevant columns
-fg_wiag_ids_df.drop(columns=[column for column in fg_wiag_ids_df.columns if column.endswith('type')], inplace=True)
-fg_wiag_ids_df.drop(columns=[column for column in fg_wiag_ids_df.columns if column.endswith('xml:lang')], inplace=True)
+from scripts.fg_reference import load_fg_wiag_ids
 
-#extract q ID
-fg_wiag_ids_df['person.value'] = fg_wiag_ids_df['person.value'].map(lambda x: x.strip('https://database.factgrid.de/entity/'))
+#the persons with a WIAG-ID (P601), downloaded in shards of items - the columns fg_id and fg_wiag_id
+fg_wiag_ids_df = fg_wiag_ids_pandas(load_fg_wiag_ids(input_path, step = 'fg_wiag_ids'))
 
-#set column names
-fg_wiag_ids_df.columns = ['fg_id', 'fg_wiag_id']
+print(str(len(fg_wiag_ids_df)) + " entries were imported.")
 
 #%% [markdown]
 ### 3. Check for problematic entries
@@ -81,42 +66,50 @@ fg_wiag_ids_df.columns = ['fg_id', 'fg_wiag_id']
 #
 #This checks whether any FactGrid-entries link to multiple WIAG-IDs and lists them.
 #%%
-fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_id'], keep = False)].sort_values(by = 'fg_id')
+checks = problematic_entries(wiag_persons_df, fg_wiag_ids_df)
+checks['fg_multiple_wiag_ids']
 #%% [markdown]
 #This checks whether any WIAG-entries link to multiple FactGrid-IDs and lists them.
 #%%
-wiag_persons_df[wiag_persons_df.duplicated(subset = ['wiag_id'], keep = False)].sort_values(by = 'wiag_id')
+checks['wiag_multiple_fg_ids']
 #%% [markdown]
 #This checks whether any FactGrid-entries link to the same WIAG-ID.
 #%%
-fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_wiag_id'], keep = False)].sort_values(by = ['fg_wiag_id'])
+checks['fg_same_wiag_id']
 #%% [markdown]
 #For the listed IDs, a WIAG-entry links to a FactGrid-entry, which does not yet link to any WIAG-entry
 #%%
 #merge dataframes (outer join on WIAG-ID)
-outer_df = fg_wiag_ids_df.merge(wiag_persons_df, how='outer' , left_on = 'fg_wiag_id', right_on = 'wiag_id')
-fg_missing_wiag_id = outer_df[~outer_df['wiag_fg_id'].isna() & outer_df['fg_id'].isna()]
+checks['fg_missing_wiag_id']
+#%% [markdown]
+#This lists every person whose WIAG- and FactGrid-entries link to more than one ID of a kind, whatever the shape of the conflict (the checks above each find one shape). The IDs that link to each other are grouped, outdated WIAG-IDs that are already known to redirect count as the current ID. To check the links of DPr and the GSNs as well, run `python -m scripts.identity_graph --input-path <input_path>` (see `scripts/README.md`).
+
+#%%
+from scripts.wiag_redirects import load_redirects
+
+id_conflicts(wiag_persons_df, fg_wiag_ids_df, load_redirects(input_path))
 
-fg_missing_wiag_id[['wiag_id', 'wiag_fg_id']]
 #%% [markdown]
 ### 4. Find entries to update
 #This section finds entries to update by first checking all WIAG-IDs linked to from FG-entries (section A) and then (section B) checking FG-IDs that WIAG-entries link to.
 #### a) Check all WIAG-IDs that FactGrid-entries link to
 #This section finds entries to update by checking WIAG-IDs that are referenced in FactGrid.
-#Please note, that the code cell below can take **up to 10 minutes.** Should the cell fail, try running it again (likely cause is a timeout).
+#Only the WIAG-IDs that are not in the export (and were not found to redirect to an ID of the export in an earlier run) are requested from WIAG, the others are checked with the FactGrid-IDs of the export. The redirects WIAG answers with are stored in the `.cache` folder of `input_path`. If many IDs need to be requested, the code cell below can take **up to 10 minutes.** Should the cell fail, try running it again (likely cause is a timeout).
 
 #%%
-from scripts.fg_wiag_ids_functions import check_fg
+from scripts.fg_wiag_ids_functions import check_fg_wiag_ids
+from scripts.wiag_redirects import load_redirects, save_redirects
 
-#creates a list with the WIAG-ID and FactGrid-ID paired for each entry 
-entries_to_be_checked = list(zip(list(fg_wiag_ids_df['fg_wiag_id']), list(fg_wiag_ids_df['fg_id'])))
+#the redirects found in earlier runs
+redirects = load_redirects(input_path)
 
 #description of the outputs of the check_fg function:
 #entries_to_be_updated: FactGrid-IDs which point to an outdated WIAG-ID (WIAG redirected to a newer one) and for which the new WIAG entry does not point to the FactGrid-ID
 #wiag_different_fgID: WIAG-IDs that link to a different FG-ID from the one that points to them
 #wiag_missing_fgID: WIAG-IDs to which a FactGrid-entry points, but which point to no FactGrid-ID
 
-entries_to_be_updated, wiag_different_fgID, wiag_missing_fgID = await check_fg(entries_to_be_checked)
+entries_to_be_updated, wiag_different_fgID, wiag_missing_fgID = await check_fg_wiag_ids(fg_wiag_ids_df, wiag_persons_df, redirects)
+save_redirects(input_path, redirects)
 
 #%% [markdown]
 #If the cell below lists any entries, these entries **needs to be fixed manually**. After fixing entries, you need to **start again** from step 1!
@@ -128,7 +121,7 @@ wiag_different_fgID
 #The following entries point to outdated WIAG-IDs and will be updated automatically. You should **check a sample** of the output and also make sure that the amount of entries isn't absurdly high.
 #Should there be no output, that means that no entries to be updated were found.
 #%%
-pd.DataFrame(entries_to_be_updated, columns = ["fg_id", "fg_wiag_id", "new_wiag_id"])
+entries_to_be_updated # qid: fg_id, -P601: fg_wiag_id, P601: new_wiag_id
 
 #%% [markdown]
 #### b) Check FactGrid-IDs that WIAG-entries point to
@@ -136,12 +129,10 @@ pd.DataFrame(entries_to_be_updated, columns = ["fg_id", "fg_wiag_id", "new_wiag_
 #The output **needs to be checked fully** (if there is any). The expected solution (which will be carried out automatically) is to update the FactGrid-entry with the listed WIAG-ID, however it's a good idea to check whether this makes sense for all entries.
 
 #%%
-#merge dataframes (inner join on FactGrid-ID)
-merged_df = fg_wiag_ids_df.merge(wiag_persons_df, left_on='fg_id', right_on = 'wiag_fg_id')
+from scripts.fg_wiag_ids_functions import fg_differing_wiag_ids
 
-#check for entries where the WIAG-ID in FactGrid is different from the one in WIAG
-fg_diff_wiag_id = merged_df[merged_df['fg_wiag_id'] != merged_df['wiag_id']]
-fg_diff_wiag_id = fg_diff_wiag_id[['fg_id', 'fg_wiag_id', 'wiag_id']] # selecting columns - no need to show the same FG-ID twice
+#merge dataframes (inner join on FactGrid-ID) and check for entries where the WIAG-ID in FactGrid is different from the one in WIAG
+fg_diff_wiag_id = fg_differing_wiag_ids(fg_wiag_ids_df, wiag_persons_df)
 
 fg_diff_wiag_id
 #%% [markdown]
@@ -149,13 +140,10 @@ fg_diff_wiag_id
 #If no entries are listed by the cell below, you can skip all the way to step 8 (no updates need to be done -> no data needs to be redownloaded -> no checks need to run again). You should have checked both lists of updates before this step, if not, check the list now.
 #The `qid` is the FactGrid-ID for which an update should be performed. The `-P601` column shows the WIAG-ID which will be removed from the FactGrid-entry. The `P601` column shows the WIAG-ID which will be added to the entry.
 #%%
-#List the entries in a format that FactGrid understands. (used for updating FactGrid automatically)
-fg_qs_csv = fg_diff_wiag_id
-fg_qs_csv.columns = ['qid', '-P601', 'P601']
-#fg_qs_csv = fg_qs_csv.set_index('qid')
+from scripts.fg_wiag_ids_functions import factgrid_updates
 
-#add the updates from the first half of step 4
-final_fg_qs_csv = pd.concat([fg_qs_csv, entries_to_be_updated])# , ignore_index=True) TODO necessary?
+#List the entries in a format that FactGrid understands (used for updating FactGrid automatically), together with the updates from the first half of step 4
+final_fg_qs_csv = factgrid_updates(fg_diff_wiag_id, entries_to_be_updated)
 final_fg_qs_csv # list some entries
 #%% [markdown]
 #### Generate update-file
@@ -163,20 +151,13 @@ final_fg_qs_csv # list some entries
 #
 #You can change `output_path` below to where you want the generated file to be saved to.
 #%%
-output_path = r"C:\Users\Public\sync_notebooks\output_files" # change this to save the file to somewhere else
+from scripts.fg_wiag_ids_functions import write_factgrid_updates
+
+output_path = OUTPUT_PATH # change this to save the file to somewhere else (the folder set in the .env file, see scripts/paths.py)
 
-from datetime import datetime
 today_string = datetime.now().strftime('%Y-%m-%d') # create a timestamp for the name of the output file
 
-final_fg_qs_csv["-P601"] = final_fg_qs_csv["-P601"].apply(lambda x: f'"{x}"') # putting quotes around the value
-final_fg_qs_csv["P601"] = final_fg_qs_csv["P601"].apply(lambda x: f'"{x}"') # putting quotes around the value
-final_fg_qs_csv.to_csv( # generate csv file
-    os.path.join(
-        output_path,
-        f'factgrid_wiag_id_update_{today_string}.csv'
-    ),
-    index=False
-)
+update_file = write_factgrid_updates(final_fg_qs_csv, output_path, today_string) # step 6 checks the upload of this file
 
 #%% [markdown]
 #### Upload the file
@@ -185,93 +166,74 @@ final_fg_qs_csv.to_csv( # generate csv file
 #
 #%% [markdown]
 ### 6. Retrieve updated online data
-#Now that FactGrid has been updated, the data has to be redownloaded. Consequently this is almost the same code as in step 2 (the url and query variables from above are also reused)
+#Now that FactGrid has been updated, only the entries changed by the generated file are read again from FactGrid (50 at a time, directly from the entries, so the changes are seen right after the upload). The download of step 2 is updated with them, and notebooks 4, 5 and 6 can reuse it as long as nothing else is uploaded to FactGrid.
+#
+#The cell lists the changes of the file that are not on FactGrid. Should any be listed, check whether the upload finished without errors. To download everything again instead, run `fg_wiag_ids_df = fg_wiag_ids_pandas(load_fg_wiag_ids(input_path, step = 'fg_wiag_ids'))` as in step 2.
 #%%
-r = requests.get(fg_url, params={'query': fg_query}, headers={"Accept": "application/json"})
-data = r.json()
-fg_wiag_ids_df = pd.json_normalize(data['results']['bindings'])
-
-print(str(len(fg_wiag_ids_df)) + " entries were imported.")
+from scripts.verify_upload import verify_upload
+from scripts.artefacts import to_pandas
 
-#drop irrelevant columns
-fg_wiag_ids_df.drop(columns=[column for column in fg_wiag_ids_df.columns if column.endswith('type')], inplace=True)
-fg_wiag_ids_df.drop(columns=[column for column in fg_wiag_ids_df.columns if column.endswith('xml:lang')], inplace=True)
+#reads the entries changed by update_file (step 5) and updates the download of step 2 with them
+fg_wiag_ids_df, missing_changes = verify_upload(input_path, update_file, step = 'fg_wiag_ids')
+fg_wiag_ids_df = fg_wiag_ids_pandas(fg_wiag_ids_df)
 
-#extract q ID
-fg_wiag_ids_df['person.value'] = fg_wiag_ids_df['person.value'].map(lambda x: x.strip('https://database.factgrid.de/entity/'))
+print(str(len(fg_wiag_ids_df)) + " entries were imported.")
 
-#set column names
-fg_wiag_ids_df.columns = ['fg_id', 'fg_wiag_id']
+to_pandas(missing_changes) # the changes that are not on FactGrid
 
 #%% [markdown]
 ### 7. Rerunning checks
 #To make sure that no mistakes have been introduced by updating FactGrid, the checks from before are run again.
 #This checks whether any FactGrid-entries link to multiple WIAG-IDs and lists them.
 #%%
-fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_id'], keep = False)].sort_values(by = 'fg_id')
+checks = problematic_entries(wiag_persons_df, fg_wiag_ids_df) # reusing WIAG-dataframe from step 1
+checks['fg_multiple_wiag_ids']
 #%% [markdown]
 #This checks whether any FactGrid-entries link to the same WIAG-ID.
 #%%
-fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_wiag_id'], keep = False)].sort_values(by = 'fg_wiag_id') 
+checks['fg_same_wiag_id']
 #%% [markdown]
 #For the listed IDs, a WIAG-entry links to a FactGrid-entry, which does not yet link to any WIAG-entry
 #%%
-#merge dataframes (outer join on WIAG-ID) - reusing WIAG-dataframe from step 1
-outer_df = fg_wiag_ids_df.merge(wiag_persons_df, how='outer' , left_on = 'fg_wiag_id', right_on='wiag_id')
-outer_df = outer_df[~outer_df['wiag_fg_id'].isna() & outer_df['fg_id'].isna()]
-
-outer_df[['wiag_id', 'wiag_fg_id']]
+checks['fg_missing_wiag_id']
 #%% [markdown]
 ### 8. Find entries to update in WIAG
 #For the following list, the FactGrid-entry is linking to the WIAG-entry, but the WIAG-entry links to no the FG-entry. These entries will be updated automatically to link back. You should **check a sample** and make sure the number of updates is not absurdly high (greater than 500).
 #Should no entries be listed, this means that no update needs to be performed. In this case you should skip the rest of the notebook and go straight to [notebook 3](fg_import_persons.ipynb) (fg_import_persons).
 
 #%%
-#merge dataframes - reusing WIAG-dataframe from step 1
-new_merged_df = fg_wiag_ids_df.merge(wiag_persons_df, left_on = 'fg_wiag_id', right_on='wiag_id')
-new_merged_df = new_merged_df[~new_merged_df['wiag_id'].str.startswith('WIAG-Pers-EPISCGatz')] # don't update bishops
+from scripts.fg_wiag_ids_functions import wiag_updates
 
-#find WIAG-entries which do not link to an FG-ID, but an FG-entry links to the WIAG-ID => update WIAG-entries with FG-ID
-to_be_updated_df = new_merged_df[new_merged_df['wiag_fg_id'].isna() & ~new_merged_df['fg_id'].isna()]
-to_be_updated_df = to_be_updated_df[['fg_id', 'wiag_id']]
+#find WIAG-entries which do not link to an FG-ID, but an FG-entry links to the WIAG-ID => update WIAG-entries with FG-ID (bishops are not updated)
+to_be_updated_df = wiag_updates(fg_wiag_ids_df, wiag_persons_df) # reusing WIAG-dataframe from step 1
 to_be_updated_df
 #%% [markdown]
 #Exporting the list to a CSV-file, so the entirety of proposed updates can be checked easily. Change the `output path` if you want the file to be saved to somewhere else.
 
 #%%
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
+output_path = OUTPUT_PATH # the folder set in the .env file, see scripts/paths.py
 
 #%%
-from datetime import datetime
+from scripts.fg_wiag_ids_functions import write_wiag_updates
 
 today_string = datetime.now().strftime('%Y-%m-%d')
 
-to_be_updated_df.to_csv( # generate csv file
-    os.path.join(
-        output_path,
-        f'wiag_ids_to_be_updated_{today_string}.csv'
-    ),
-    index=False
-)
+write_wiag_updates(to_be_updated_df, output_path, today_string)
 #%% [markdown]
 ### 9. Update WIAG
 #### Generate SQL file
 #From the list above an SQL-file will be generated, which then needs to be uploaded. The same `output path` as above will be used.
 #%%
-from datetime import datetime
+from scripts.fg_wiag_ids_functions import write_wiag_sql
 
-query = "LOCK TABLES url_external WRITE, item_corpus WRITE;\n"
-for row in to_be_updated_df.itertuples():
-    query += f"""
-INSERT INTO url_external (item_id, value, authority_id)
-SELECT item_id, '{row.fg_id}', 42 FROM item_corpus
-WHERE id_public = "{row.wiag_id}";
-"""
-query += "\nUNLOCK TABLES;"
+write_wiag_sql(to_be_updated_df, output_path, today_string)
 
-today_string = datetime.now().strftime('%Y-%m-%d')
-with open(os.path.join(output_path, f'insert-uext-can_{today_string}.sql'), 'w') as file:
-    file.write(query)
+#%% [markdown]
+#### Runtime of the steps
+#The table below shows for the measured steps how long they took (wall and CPU time), how many requests were sent and how much memory was used. The details are saved in the `traces` folder.
+
+#%%
+print_summary()
 #%% [markdown]
 #### Upload file
 #Now that the file has been generated, you need to upload the file to the WIAG database. As always go to [phpMyAdmin (WIAG)](https://vwebfile.gwdg.de/phpmyadmin/), then first select the database (wiagvokabulare) and then either go to the `Import` tab and choose the file to run or paste the contents of the SQL-file into the textfield (more details here [Run_SQL_Query_and_Export_CSV.md](https://github.com/WIAG-ADW-GOE/sync_notebooks/blob/main/docs/Run_SQL_Query_and_Export_CSV.md)).
@@ -1,60 +1,103 @@
-from tqdm import tqdm
+import argparse
 import aiohttp
 import asyncio
 import time
 import ssl
 import copy
-import pandas as pd
+import os
 import traceback
+from scripts.endpoints import WIAG_BASE_URL
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
+from scripts.instrumentation import instrumented, count_http_call
+from scripts.json_decoding import decode_wiag_person
+from scripts.wiag_redirects import add_current, add_redirect, resolve
 
 BATCH_SIZE = 3000
-missed = [] # entries for whom content could not be retrieved because of some error
-entries_to_be_updated = [] # FactGrid-IDs which point to an outdated WIAG-ID (WIAG redirected to a newer one) and for which the new WIAG entry does not point to the FactGrid-ID
-wiag_different_fgID = [] # WIAG-IDs that link to a different FG-ID from the one that points to them
-wiag_missing_fgID = [] # WIAG-IDs to whom a FactGrid-entry points, but which point to no FactGrid-ID
 
-async def get(fg_wiag_id, fg_id, session):
-    global missed
-    
-    wiag_id = None
-    try:
-        async with session.get(url=f'https://wiag-vocab.adw-goe.de/id/{fg_wiag_id}?format=Json') as response:
-            data = await response.json()
-            wiag_id = data['persons'][0]['wiagId']
-            wiag_redirected = wiag_id != fg_wiag_id
 
-            wiag_qid = data['persons'][0]['identifier']['Factgrid'].split('/')[-1]
-            if wiag_qid != fg_id:
-                wiag_different_fgID.append([fg_wiag_id, wiag_redirected, fg_id, wiag_qid])
-            # elif wiag_redirected:
-                # seems to be true only for entries with two entries in FactGrid, which link to two different WIAG-IDs, which are merged in WIAG (3 in total in 2025-03)
-    except KeyError as e:
-        assert(wiag_id != None)# if the entry is found, there must be a WIAG-ID and if not, it would most likely raise a ContentTypeError when the server responds "Kein Eintrag für ID {fg_wiag_id} vorhanden."
+# The results of one check_fg run:
+# missed: entries for whom content could not be retrieved because of some error (in the current attempt)
+# entries_to_be_updated: FactGrid-IDs which point to an outdated WIAG-ID (WIAG redirected to a newer one) and for which the new WIAG entry does not point to the FactGrid-ID
+# wiag_different_fgID: WIAG-IDs that link to a different FG-ID from the one that points to them
+# wiag_missing_fgID: WIAG-IDs to whom a FactGrid-entry points, but which point to no FactGrid-ID
+def new_results() -> dict:
+    return {'missed': [], 'entries_to_be_updated': [], 'wiag_different_fgID': [], 'wiag_missing_fgID': []}
 
+
+# checks an entry once its current WIAG-ID (wiag_id) and the FactGrid-ID that one links to (wiag_qid, None if none) are known
+def check_entry(results, fg_wiag_id, fg_id, wiag_id, wiag_qid):
+    wiag_redirected = wiag_id != fg_wiag_id
+    if wiag_qid is None:
         if wiag_redirected: # updating FG entries when WIAG redirected to a newer entry and the new entry does not yet link to the FG entry (the WIAG-ID in FactGrid is outdated)
-            entries_to_be_updated.append({
+            results['entries_to_be_updated'].append({
                 "qid": fg_id,
                 "-P601": fg_wiag_id,
                 "P601": wiag_id,
             })
         else:
-            wiag_missing_fgID.append([fg_wiag_id, fg_id])
+            results['wiag_missing_fgID'].append([fg_wiag_id, fg_id])
+    elif wiag_qid != fg_id:
+        results['wiag_different_fgID'].append([fg_wiag_id, wiag_redirected, fg_id, wiag_qid])
+    # elif wiag_redirected:
+        # seems to be true only for entries with two entries in FactGrid, which link to two different WIAG-IDs, which are merged in WIAG (3 in total in 2025-03)
+
+
+# Checks the entries whose WIAG-ID can be resolved with the known redirects and whose current WIAG-ID is in the export
+# (wiag_fg_ids: WIAG-ID -> FactGrid-ID of the export) without asking WIAG. Returns the entries that still need to be requested.
+def check_known(results, entries_to_be_checked: list, redirects: dict, wiag_fg_ids: dict) -> list:
+    add_current(redirects, wiag_fg_ids)
+    unknown = []
+    for (fg_wiag_id, fg_id), wiag_id in zip(entries_to_be_checked, resolve(redirects, [entry[0] for entry in entries_to_be_checked])):
+        if wiag_id is None or wiag_id not in wiag_fg_ids:
+            unknown.append((fg_wiag_id, fg_id))
+        else:
+            check_entry(results, fg_wiag_id, fg_id, wiag_id, wiag_fg_ids[wiag_id])
+    return unknown
+
+
+async def get(results, fg_wiag_id, fg_id, session, redirects = None):
+    wiag_id = None
+    count_http_call()
+    try:
+        async with session.get(url=f'{WIAG_BASE_URL}/id/{fg_wiag_id}?format=Json') as response:
+            # if no entry is found, the server responds "Kein Eintrag für ID {fg_wiag_id} vorhanden." (raising a ContentTypeError)
+            (wiag_id, wiag_url) = await response.json(loads=decode_wiag_person)
+            wiag_redirected = wiag_id != fg_wiag_id
+            if redirects is not None: # remembered, so the ID doesn't have to be requested again
+                if wiag_redirected:
+                    add_redirect(redirects, fg_wiag_id, wiag_id)
+                else:
+                    add_current(redirects, [wiag_id])
+
+            check_entry(results, fg_wiag_id, fg_id, wiag_id, wiag_url.split('/')[-1] if wiag_url else None)
     except aiohttp.client_exceptions.ContentTypeError as e:
-        missed.append([fg_wiag_id, fg_id])
+        results['missed'].append([fg_wiag_id, fg_id])
         if "503 Service Temporarily Unavailable" not in str(response) and "500 Internal Server Error" not in str(response):
             # 503 service error sometimes happens and is expected. 500 internal error is less common and but also happens on a regular basis.
             print(f"Unexpected ContentTypeError:\n{response}") # unexpected other errors are printed to output
+    except aiohttp.ClientError as e:
+        results['missed'].append([fg_wiag_id, fg_id]) # dropped connections (e.g. SSL errors) are simply retried
     except Exception as e:
-        print(f"There was an unexpected error retrieving info for WIAG-ID {fg_wiag_id}. The Exception message:\n{e.message}")
+        print(f"There was an unexpected error retrieving info for WIAG-ID {fg_wiag_id}. The Exception message:\n{e}")
         print(f"And traceback:\n {traceback.format_exc()}")
         
-# main executes the get function for the list of entries in batches
-async def check_fg(entries_to_be_checked: list) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
-    global missed
+# main executes the get function for the list of entries in batches. With redirects (see scripts/wiag_redirects.py)
+# and wiag_fg_ids (WIAG-ID -> FactGrid-ID from the export) only the entries that can't be checked with them are requested
+# from WIAG, and the redirects found are added.
+@instrumented()
+async def check_fg(entries_to_be_checked: list, redirects: dict = None, wiag_fg_ids: dict = None):
+    import pandas as pd # only needed for the results, so importing this module stays fast
+
+    results = new_results()
     counter = 0
 
+    if redirects is not None and wiag_fg_ids is not None:
+        number_of_entries = len(entries_to_be_checked)
+        entries_to_be_checked = check_known(results, entries_to_be_checked, redirects, wiag_fg_ids)
+        print(f"{number_of_entries - len(entries_to_be_checked)} entries were checked with the export and the known redirects, {len(entries_to_be_checked)} are requested from WIAG.")
+
     while entries_to_be_checked:
-        missed = [] # resettting missed before each attempt
+        results['missed'] = [] # resettting missed before each attempt
         counter += 1
         print(f"Starting attempt #{counter}")
 
@@ -66,33 +109,204 @@ async def check_fg(entries_to_be_checked: list) -> (pd.DataFrame, pd.DataFrame,
             for i in range(0, number_of_entries_to_be_checked, BATCH_SIZE):
                 try:
                     # defining the batch and unpacking entry into WIAG-ID and FactGrid-ID
-                    _entries_to_be_checked_batch = (get(*entry, session) for entry in entries_to_be_checked[i : i + BATCH_SIZE])
+                    _entries_to_be_checked_batch = (get(results, *entry, session, redirects) for entry in entries_to_be_checked[i : i + BATCH_SIZE])
                     await asyncio.gather(*_entries_to_be_checked_batch) # concurrent execution of the get function for the batch
                     if(i + BATCH_SIZE <= number_of_entries_to_be_checked):
-                        print(f"{i + BATCH_SIZE}/{number_of_entries_to_be_checked} checked. Missed count: {len(missed)}")
+                        print(f"{i + BATCH_SIZE}/{number_of_entries_to_be_checked} checked. Missed count: {len(results['missed'])}")
                     else:
-                        print(f"{number_of_entries_to_be_checked}/{number_of_entries_to_be_checked} checked. Missed count: {len(missed)}")
+                        print(f"{number_of_entries_to_be_checked}/{number_of_entries_to_be_checked} checked. Missed count: {len(results['missed'])}")
                     time.sleep(1)
                 except ssl.SSLError as e:
                     i = i - 1
                     print(f"Retrying last batch")
-        if(len(missed) > 0):
-            print(f"Finalized all. Couldn't get data for {len(missed)} entries")
+        if(len(results['missed']) > 0):
+            print(f"Finalized all. Couldn't get data for {len(results['missed'])} entries")
         else:
             print(f"Finalized all. Finished fetching data for all entries.")
         
-        entries_to_be_checked = missed
+        entries_to_be_checked = results['missed']
     
-    entries_update = pd.DataFrame(entries_to_be_updated, columns=["qid", "-P601","P601"])
-    different_fgID = pd.DataFrame(wiag_different_fgID, columns = ["fg_wiag_id", "wiag_redirected", "fg_id", "wiag_fg_id"])
-    missing_fgID = pd.DataFrame(wiag_missing_fgID, columns=["fg_wiag_id", "fg_id"])
+    entries_update = pd.DataFrame(results['entries_to_be_updated'], columns=["qid", "-P601","P601"])
+    different_fgID = pd.DataFrame(results['wiag_different_fgID'], columns = ["fg_wiag_id", "wiag_redirected", "fg_id", "wiag_fg_id"])
+    missing_fgID = pd.DataFrame(results['wiag_missing_fgID'], columns=["fg_wiag_id", "fg_id"])
 
     return entries_update, different_fgID, missing_fgID
 
 
+# The other steps of the notebook. Like in check_fg, pandas and the helpers are only imported where they are used, so
+# importing this module stays fast.
+
+# The WIAG export (CSV Personendaten) with the columns wiag_fg_id and wiag_id (step 1)
+def load_wiag_persons(path: str):
+    from scripts.ingest import read_export_pandas
+
+    wiag_persons_df = read_export_pandas(path, 'lebensdaten')[['FactGrid_ID', 'id']]
+    wiag_persons_df.columns = ['wiag_fg_id', 'wiag_id']
+    return wiag_persons_df
+
+
+# the persons with a WIAG-ID on FactGrid (see load_fg_wiag_ids in scripts/fg_reference.py) with the columns fg_id and fg_wiag_id
+def fg_wiag_ids_pandas(fg_wiag_ids_df):
+    from scripts.artefacts import to_pandas
+
+    fg_wiag_ids_df = to_pandas(fg_wiag_ids_df)
+    fg_wiag_ids_df.columns = ['fg_id', 'fg_wiag_id']
+    return fg_wiag_ids_df
+
+
+# The entries that need to be fixed manually (step 3, and step 7 after the upload): FactGrid-entries that link to
+# multiple WIAG-IDs or to the same WIAG-ID, WIAG-entries that link to multiple FactGrid-IDs and WIAG-entries that link
+# to a FactGrid-entry that does not link to any WIAG-entry.
+def problematic_entries(wiag_persons_df, fg_wiag_ids_df) -> dict:
+    from scripts.id_codec import merge_ids
+
+    outer_df = merge_ids(fg_wiag_ids_df, wiag_persons_df, 'wiag', how = 'outer', left_on = 'fg_wiag_id', right_on = 'wiag_id')
+    return {
+        'fg_multiple_wiag_ids': fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_id'], keep = False)].sort_values(by = 'fg_id'),
+        'wiag_multiple_fg_ids': wiag_persons_df[wiag_persons_df.duplicated(subset = ['wiag_id'], keep = False)].sort_values(by = 'wiag_id'),
+        'fg_same_wiag_id': fg_wiag_ids_df[fg_wiag_ids_df.duplicated(subset = ['fg_wiag_id'], keep = False)].sort_values(by = 'fg_wiag_id'),
+        'fg_missing_wiag_id': outer_df[~outer_df['wiag_fg_id'].isna() & outer_df['fg_id'].isna()][['wiag_id', 'wiag_fg_id']],
+    }
+
+
+# every person whose WIAG- and FactGrid-entries link to more than one ID of a kind (see scripts/identity_graph.py)
+def id_conflicts(wiag_persons_df, fg_wiag_ids_df, redirects: dict):
+    import polars as pl
+    from scripts.artefacts import from_pandas
+    from scripts.identity_graph import links, find_conflicts
+
+    links_df = pl.concat([
+        links(from_pandas(wiag_persons_df), ('wiag', 'wiag_id'), ('fg', 'wiag_fg_id'), 'WIAG'),
+        links(from_pandas(fg_wiag_ids_df), ('fg', 'fg_id'), ('wiag', 'fg_wiag_id'), 'FactGrid'),
+    ])
+    return find_conflicts(links_df, redirects)
+
+
+# Checks all WIAG-IDs that FactGrid-entries link to (step 4a, see check_fg). Only the ones that can't be checked with
+# the export and the known redirects are requested from WIAG; the redirects found are added to 'redirects'.
+async def check_fg_wiag_ids(fg_wiag_ids_df, wiag_persons_df, redirects: dict) -> tuple:
+    import pandas as pd
+
+    entries_to_be_checked = list(zip(list(fg_wiag_ids_df['fg_wiag_id']), list(fg_wiag_ids_df['fg_id'])))
+    wiag_fg_ids = {wiag_id: fg_id if pd.notna(fg_id) else None for wiag_id, fg_id in zip(wiag_persons_df['wiag_id'], wiag_persons_df['wiag_fg_id'])}
+    return await check_fg(entries_to_be_checked, redirects, wiag_fg_ids)
+
+
+# the FactGrid-entries that a WIAG-entry links to, but which link to a different WIAG-ID (step 4b)
+def fg_differing_wiag_ids(fg_wiag_ids_df, wiag_persons_df):
+    from scripts.id_codec import merge_ids
+
+    merged_df = merge_ids(fg_wiag_ids_df, wiag_persons_df, 'qid', left_on = 'fg_id', right_on = 'wiag_fg_id')
+    return merged_df[merged_df['fg_wiag_id'] != merged_df['wiag_id']][['fg_id', 'fg_wiag_id', 'wiag_id']]
+
+
+# The updates of step 4 in the format of QuickStatements (step 5): qid, the WIAG-ID to remove (-P601) and the one to add (P601)
+def factgrid_updates(fg_diff_wiag_id, entries_to_be_updated):
+    import pandas as pd
+
+    fg_qs_csv = fg_diff_wiag_id.copy()
+    fg_qs_csv.columns = ['qid', '-P601', 'P601']
+    return pd.concat([fg_qs_csv, entries_to_be_updated])
+
+
+# the QuickStatements CSV file for FactGrid - the WIAG-IDs are put in quotes
+def write_factgrid_updates(final_fg_qs_csv, output_path: str, today_string: str) -> str:
+    from scripts.artefacts import from_pandas
+    from scripts.quickstatements import STRING, write_csv
+
+    path = os.path.join(output_path, f'factgrid_wiag_id_update_{today_string}.csv')
+    write_csv(from_pandas(final_fg_qs_csv), path, {'-P601': STRING, 'P601': STRING})
+    return path
+
+
+# The WIAG-entries that don't link to a FactGrid-entry, although one links to them (step 8) - the bishops are not updated
+def wiag_updates(fg_wiag_ids_df, wiag_persons_df):
+    from scripts.id_codec import merge_ids
+
+    merged_df = merge_ids(fg_wiag_ids_df, wiag_persons_df, 'wiag', left_on = 'fg_wiag_id', right_on = 'wiag_id')
+    merged_df = merged_df[~merged_df['wiag_id'].str.startswith('WIAG-Pers-EPISCGatz')]
+    return merged_df[merged_df['wiag_fg_id'].isna() & ~merged_df['fg_id'].isna()][['fg_id', 'wiag_id']]
+
+
+def write_wiag_updates(to_be_updated_df, output_path: str, today_string: str) -> str:
+    path = os.path.join(output_path, f'wiag_ids_to_be_updated_{today_string}.csv')
+    to_be_updated_df.to_csv(path, index = False)
+    return path
+
+
+# the SQL file that adds the FactGrid-IDs to the WIAG-entries (step 9)
+def write_wiag_sql(to_be_updated_df, output_path: str, today_string: str) -> str:
+    query = "LOCK TABLES url_external WRITE, item_corpus WRITE;\n"
+    for row in to_be_updated_df.itertuples():
+        query += f"""
+INSERT INTO url_external (item_id, value, authority_id)
+SELECT item_id, '{row.fg_id}', 42 FROM item_corpus
+WHERE id_public = "{row.wiag_id}";
+"""
+    query += "\nUNLOCK TABLES;"
+
+    path = os.path.join(output_path, f'insert-uext-can_{today_string}.sql')
+    with open(path, 'w') as file:
+        file.write(query)
+    return path
+
+
+def print_counts(frames: dict):
+    for name, df in frames.items():
+        print(f"{name}: {len(df)} entries")
+
+
+# The steps of the notebook without Jupyter. Without uploaded_file steps 1 to 5 are run and the QuickStatements file for
+# FactGrid is written; if there is nothing to update on FactGrid, steps 8 and 9 follow right away. After the file was
+# uploaded, run again with uploaded_file (the QuickStatements file) to check the upload and run steps 6 to 9.
+async def run_fg_wiag_ids(input_path: str = INPUT_PATH, output_path: str = OUTPUT_PATH, input_file: str = 'WIAG-Domherren-DB-Lebensdaten.csv', uploaded_file: str = None) -> dict:
+    from datetime import datetime
+    from scripts.fg_reference import load_fg_wiag_ids
+    from scripts.verify_upload import verify_upload
+    from scripts.wiag_redirects import load_redirects, save_redirects
+
+    today_string = datetime.now().strftime('%Y-%m-%d')
+    wiag_persons_df = load_wiag_persons(os.path.join(input_path, input_file))
+    frames = {}
+
+    if uploaded_file is None:
+        fg_wiag_ids_df = fg_wiag_ids_pandas(load_fg_wiag_ids(input_path, step = 'fg_wiag_ids'))
+        print_counts(problematic_entries(wiag_persons_df, fg_wiag_ids_df))
+        redirects = load_redirects(input_path)
+        print(f"{id_conflicts(wiag_persons_df, fg_wiag_ids_df, redirects).height} persons with conflicting IDs")
+
+        (entries_to_be_updated, wiag_different_fgID, _) = await check_fg_wiag_ids(fg_wiag_ids_df, wiag_persons_df, redirects)
+        save_redirects(input_path, redirects)
+        print(f"wiag_different_fgID: {len(wiag_different_fgID)} entries need to be fixed manually")
+
+        frames['factgrid_updates'] = factgrid_updates(fg_differing_wiag_ids(fg_wiag_ids_df, wiag_persons_df), entries_to_be_updated)
+        if len(frames['factgrid_updates']) > 0:
+            path = write_factgrid_updates(frames['factgrid_updates'], output_path, today_string)
+            print(f"{len(frames['factgrid_updates'])} entries are updated on FactGrid. Upload {path} and run again with it.")
+            return frames
+    else:
+        (fg_wiag_ids_df, missing_changes) = verify_upload(input_path, uploaded_file, step = 'fg_wiag_ids')
+        fg_wiag_ids_df = fg_wiag_ids_pandas(fg_wiag_ids_df)
+        frames['missing_changes'] = missing_changes
+        checks = problematic_entries(wiag_persons_df, fg_wiag_ids_df)
+        print_counts({name: checks[name] for name in ['fg_multiple_wiag_ids', 'fg_same_wiag_id', 'fg_missing_wiag_id']})
 
+    frames['wiag_updates'] = wiag_updates(fg_wiag_ids_df, wiag_persons_df)
+    write_wiag_updates(frames['wiag_updates'], output_path, today_string)
+    print(f"{len(frames['wiag_updates'])} WIAG-entries are updated, written to {write_wiag_sql(frames['wiag_updates'], output_path, today_string)}")
+    return frames
 
 
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description = "Notebook 2: generates the updates of the WIAG-IDs on FactGrid and of the FactGrid-IDs in WIAG.")
+    parser.add_argument('--input-path', default = INPUT_PATH)
+    parser.add_argument('--output-path', default = OUTPUT_PATH)
+    parser.add_argument('--input-file', default = 'WIAG-Domherren-DB-Lebensdaten.csv', help = "WIAG export (CSV Personendaten)")
+    parser.add_argument('--uploaded', metavar = 'FILE', help = "the QuickStatements file of the first run, after it was uploaded to FactGrid")
+    args = parser.parse_args(argv)
 
+    asyncio.run(run_fg_wiag_ids(args.input_path, args.output_path, args.input_file, args.uploaded))
 
 
+if __name__ == '__main__':
+    main()
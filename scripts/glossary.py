@@ -0,0 +1,163 @@
+import re
+
+# Most role and institution role labels are formulaic: a role ("Domherr", "Propst und Archidiakon") and, for the
+# institution roles, the institution ("Domstift Bamberg", "Stift St. Stephan, Mainz"). These are translated with the
+# glossary below: the role terms are looked up, the kind of institution is translated and the rest is passed through
+# as a place name if all of its words are known places (see place_names). Everything the glossary does not fully cover
+# is left to the LLM (see translate_with_glossary in scripts/translate.py).
+
+ROLE_TERMS = {
+    'Abt': 'Abbot',
+    'Äbtissin': 'Abbess',
+    'Administrator': 'Administrator',
+    'Archidiakon': 'Archdeacon',
+    'Archipresbyter': 'Archpriest',
+    'Bischof': 'Bishop',
+    'Chorherr': 'Canon',
+    'Dechant': 'Dean',
+    'Dekan': 'Dean',
+    'Domdechant': 'Cathedral dean',
+    'Domdekan': 'Cathedral dean',
+    'Domherr': 'Canon',
+    'Domizellar': 'Domicellar',
+    'Domkanoniker': 'Canon',
+    'Domkapitular': 'Cathedral capitular',
+    'Dompropst': 'Cathedral provost',
+    'Domvikar': 'Cathedral vicar',
+    'Elekt': 'Bishop-elect',
+    'Erzbischof': 'Archbishop',
+    'Erzpriester': 'Archpriest',
+    'Generalvikar': 'Vicar general',
+    'Kämmerer': 'Chamberlain',
+    'Kanoniker': 'Canon',
+    'Kanonisse': 'Canoness',
+    'Kantor': 'Cantor',
+    'Kapitular': 'Capitular',
+    'Kaplan': 'Chaplain',
+    'Kardinal': 'Cardinal',
+    'Kellerar': 'Cellarer',
+    'Kellner': 'Cellarer',
+    'Koadjutor': 'Coadjutor',
+    'Kustos': 'Custos',
+    'Mönch': 'Monk',
+    'Offizial': 'Official',
+    'Pfarrer': 'Parish priest',
+    'Prior': 'Prior',
+    'Priorin': 'Prioress',
+    'Propst': 'Provost',
+    'Pröpstin': 'Provost',
+    'Scholaster': 'Scholaster',
+    'Senior': 'Senior',
+    'Subdiakon': 'Subdeacon',
+    'Subprior': 'Subprior',
+    'Thesaurar': 'Treasurer',
+    'Vikar': 'Vicar',
+    'Weihbischof': 'Auxiliary bishop',
+}
+# "Dom..." roles that are not in ROLE_TERMS are the cathedral's (e.g. Domkantor: Cathedral cantor)
+CATHEDRAL_PREFIX = ('Dom', 'Cathedral')
+
+# the kind of institution the label of an institution starts with
+INSTITUTION_TERMS = {
+    'Abtei': 'abbey',
+    'Benediktinerabtei': 'Benedictine abbey',
+    'Benediktinerkloster': 'Benedictine monastery',
+    'Chorherrenstift': 'house of canons regular',
+    'Damenstift': 'house of canonesses',
+    'Dom': 'cathedral',
+    'Domkapitel': 'cathedral chapter',
+    'Domstift': 'cathedral chapter',
+    'Kanonissenstift': 'house of canonesses',
+    'Kloster': 'monastery',
+    'Kollegiatstift': 'collegiate church',
+    'Pfarrei': 'parish',
+    'Priorat': 'priory',
+    'Propstei': 'provostry',
+    'Stift': 'collegiate church',
+    'Zisterzienserabtei': 'Cistercian abbey',
+    'Zisterzienserkloster': 'Cistercian monastery',
+}
+
+# Place names are passed through, but only words known to be places: every German noun is capitalized, so an unknown
+# word (e.g. "Hochstift", "Kartause") may just as well need a translation. Words that would be German in the
+# translation are never taken as place names.
+SAINT_PREFIXES = {'St.': 'St.', 'Sankt': 'St.'}
+PLACE_PARTICLES = {'am', 'an', 'bei', 'der', 'im', 'in', 'ob', 'vor'} # as in "Frankfurt am Main"
+GERMAN_WORDS = {'Alte', 'Alten', 'Altes', 'Frau', 'Frauen', 'Heilig', 'Heilige', 'Heiligen', 'Heiliges', 'Lieben', 'Neue', 'Neuen', 'Neues', 'Unserer'}
+GERMAN_SUFFIXES = ('kirche', 'kloster', 'stift', 'kapelle', 'kapitel', 'münster', 'spital', 'abtei', 'propstei')
+# the diocese labels on FactGrid start with one of these, the rest is the place ("Bistum Bamberg", "Diocese of Bamberg")
+DIOCESE_PREFIXES = ('Erzbistum ', 'Bistum ', 'Archdiocese of ', 'Diocese of ')
+ROLE_SEPARATOR = re.compile(r'\s+und\s+')
+
+
+def translate_role(role: str):
+    if role in ROLE_TERMS:
+        return ROLE_TERMS[role]
+    (german, english) = CATHEDRAL_PREFIX
+    rest = role.removeprefix(german).capitalize()
+    if role.startswith(german) and rest in ROLE_TERMS:
+        return f"{english} {ROLE_TERMS[rest].lower()}"
+    return None
+
+
+# "Propst und Archidiakon": every part has to be in the glossary
+def translate_roles(roles: str):
+    parts = [translate_role(part) for part in ROLE_SEPARATOR.split(roles.strip())]
+    if None in parts:
+        return None
+    return ' and '.join([parts[0]] + [part[0].lower() + part[1:] for part in parts[1:]])
+
+
+def could_be_place(word: str) -> bool:
+    return (
+        word[:1].isupper() and word not in SAINT_PREFIXES and word not in GERMAN_WORDS and word not in INSTITUTION_TERMS
+        and word not in ROLE_TERMS and not word.lower().endswith(GERMAN_SUFFIXES)
+    )
+
+
+# The words of the place names in the labels of the dioceses ("Bistum Bamberg") and of the institutions that start with
+# a kind of institution of INSTITUTION_TERMS ("Stift St. Stephan, Mainz": St. Stephan and Mainz) - the places the
+# glossary passes through.
+def place_names(diocese_labels, institution_labels) -> set:
+    places = [label.removeprefix(prefix) for label in diocese_labels if label for prefix in DIOCESE_PREFIXES if label.startswith(prefix)]
+    places += [label.partition(' ')[2] for label in institution_labels if label and label.partition(' ')[0] in INSTITUTION_TERMS]
+    return {word for place in places for word in (word.strip(',()') for word in place.split()) if could_be_place(word)}
+
+
+def is_place_word(word: str, places: set) -> bool:
+    word = word.strip(',()')
+    return word in PLACE_PARTICLES or word in SAINT_PREFIXES or word in places
+
+
+# the place part of an institution label as it is written in English, or None if it is not only known place names
+def translate_place(place: str, places: set):
+    words = place.split()
+    if not words or not all(is_place_word(word, places) for word in words) or words[0] in PLACE_PARTICLES:
+        return None
+    return ' '.join(SAINT_PREFIXES.get(word, word) for word in words)
+
+
+# "Domstift Bamberg" -> "the cathedral chapter of Bamberg", "Stift St. Stephan" -> "the collegiate church of St. Stephan"
+def translate_institution(institution: str, places: set):
+    (first, _, rest) = institution.strip().partition(' ')
+    term = INSTITUTION_TERMS.get(first)
+    place = translate_place(rest if term is not None else institution, places)
+    if place is None:
+        return None
+    if term is None:
+        return place
+    return f"the {term} of {place}"
+
+
+# The English label for a role (and the institution of an institution role), or None if the glossary does not cover it.
+# 'places' are the known place names (see place_names); without them no institution is covered.
+def glossary_translation(role: str, institution: str = None, places: set = frozenset()):
+    if role is None:
+        return None
+    english_role = translate_roles(role)
+    if english_role is None or institution is None:
+        return english_role
+    english_institution = translate_institution(institution, places)
+    if english_institution is None:
+        return None
+    return f"{english_role} of {english_institution}"
@@ -0,0 +1,110 @@
+import polars as pl
+
+# WIAG-IDs (WIAG-Pers-CANON-12345-001), GSNs (046-02872-001) and FactGrid-IDs (Q123) packed into one UInt64 each, so
+# the joins of the notebooks compare integers instead of long strings. The three parts of a WIAG-ID or GSN are packed
+# as first * 2^40 + middle * 2^10 + last; formatting a key gives back exactly the identifier it was made from.
+# Identifiers that do not have the usual form, or whose parts do not fit into their bits, have no key (null).
+#
+# Encoding takes about as long as one hash pass over the strings, so it pays off for joins (which hash and compare both
+# sides), not for a single duplicated() or startswith() over a column.
+
+WIAG_CORPORA = ['CANON', 'EPISCGatz'] # the code of a corpus is its position + 1, so new ones are only appended
+WIAG_PATTERN = r'^WIAG-Pers-([A-Za-z]+)-(\d{5})-(\d{3})$'
+GSN_PATTERN = r'^(\d{3})-(\d{5})-(\d{3})$'
+QID_PATTERN = r'^Q([1-9]\d{0,17})$'
+LOW_FACTOR = 2 ** 10 # the last part (3 digits)
+HIGH_FACTOR = 2 ** 40 # the first part, above the middle part (5 digits)
+MAX_FIRST = 2 ** 24 # the bits of a UInt64 above HIGH_FACTOR
+
+
+# the parts are cut out at their fixed positions (much faster than extracting the groups of the pattern), so the key
+# is only taken where the identifier matches the pattern. A part too large for its bits would make the key of another
+# identifier, so then there is no key either (the patterns do not allow such parts, this keeps it so if they change).
+def packed(valid: pl.Expr, first: pl.Expr, middle: pl.Expr, last: pl.Expr) -> pl.Expr:
+    (first, middle, last) = (part.cast(pl.UInt64, strict=False) for part in (first, middle, last))
+    fits = (first < MAX_FIRST) & (middle < HIGH_FACTOR // LOW_FACTOR) & (last < LOW_FACTOR)
+    return pl.when(valid & fits).then(first * HIGH_FACTOR + middle * LOW_FACTOR + last)
+
+
+def high(key: pl.Expr) -> pl.Expr:
+    return key // HIGH_FACTOR
+
+
+def middle_digits(key: pl.Expr, width: int) -> pl.Expr:
+    return (key % HIGH_FACTOR // LOW_FACTOR).cast(pl.String).str.zfill(width)
+
+
+def low_digits(key: pl.Expr, width: int) -> pl.Expr:
+    return (key % LOW_FACTOR).cast(pl.String).str.zfill(width)
+
+
+def encode_wiag_id(wiag_id: pl.Expr) -> pl.Expr:
+    corpus = wiag_id.str.slice(10).str.head(-10).replace_strict(WIAG_CORPORA, range(1, len(WIAG_CORPORA) + 1), default=None, return_dtype=pl.UInt64)
+    return packed(wiag_id.str.contains(WIAG_PATTERN), corpus, wiag_id.str.slice(-9, 5), wiag_id.str.slice(-3))
+
+
+def decode_wiag_id(key: pl.Expr) -> pl.Expr:
+    corpus = high(key).replace_strict(range(1, len(WIAG_CORPORA) + 1), WIAG_CORPORA, default=None, return_dtype=pl.String)
+    return pl.format('WIAG-Pers-{}-{}-{}', corpus, middle_digits(key, 5), low_digits(key, 3))
+
+
+def encode_gsn(gsn: pl.Expr) -> pl.Expr:
+    return packed(gsn.str.contains(GSN_PATTERN), gsn.str.slice(0, 3), gsn.str.slice(4, 5), gsn.str.slice(-3))
+
+
+def decode_gsn(key: pl.Expr) -> pl.Expr:
+    return pl.format('{}-{}-{}', high(key).cast(pl.String).str.zfill(3), middle_digits(key, 5), low_digits(key, 3))
+
+
+def encode_qid(qid: pl.Expr) -> pl.Expr:
+    return pl.when(qid.str.contains(QID_PATTERN)).then(qid.str.slice(1).cast(pl.UInt64, strict=False))
+
+
+def decode_qid(key: pl.Expr) -> pl.Expr:
+    return pl.lit('Q') + key.cast(pl.String)
+
+
+CODECS = {
+    'wiag': (encode_wiag_id, decode_wiag_id),
+    'gsn': (encode_gsn, decode_gsn),
+    'qid': (encode_qid, decode_qid),
+}
+
+
+# For the notebooks that work with pandas: the keys of the identifiers in 'series' (with the same index), or the
+# identifiers themselves if any of them has no key - so comparing the result is always the same as comparing the
+# identifiers.
+def id_keys(series, kind: str):
+    import pandas as pd
+
+    values = pl.Series(series.name, series.to_numpy(dtype=object, na_value=None).tolist(), dtype=pl.String, strict=False)
+    keys = pl.select(CODECS[kind][0](pl.lit(values))).to_series()
+    if keys.null_count() != series.isna().sum():
+        return series
+    keys = pd.arrays.IntegerArray(keys.fill_null(0).to_numpy(), keys.is_null().to_numpy())
+    return pd.Series(keys, index=series.index, name=series.name)
+
+
+# the keys of two series that are compared with each other - integers only if all identifiers of both have a key
+def id_key_pair(left, right, kind: str) -> tuple:
+    (left_keys, right_keys) = (id_keys(left, kind), id_keys(right, kind))
+    if left_keys is left or right_keys is right:
+        return (left.astype(object), right.astype(object))
+    return (left_keys, right_keys)
+
+
+# Like left.merge(right, on=on) or left.merge(right, left_on=left_on, right_on=right_on), but the identifiers are
+# compared as keys. The result has the same columns as the pandas merge.
+def merge_ids(left, right, kind: str, on: str = None, left_on: str = None, right_on: str = None, **kwargs):
+    (left_on, right_on) = (left_on or on, right_on or on)
+    (left_keys, right_keys) = id_key_pair(left[left_on], right[right_on], kind)
+    left = left.assign(_key=left_keys)
+    right = right.assign(_key=right_keys)
+    if on is None:
+        return left.merge(right, on='_key', **kwargs).drop(columns='_key')
+
+    merged = left.merge(right.rename(columns={on: '_right_id'}), on='_key', **kwargs)
+    # rows only in right (outer and right merges) have the identifier only in the column of right
+    merged[on] = merged[on].where(merged[on].notna(), merged['_right_id'])
+    return merged.drop(columns=['_key', '_right_id'])
+
@@ -0,0 +1,156 @@
+import argparse
+import os
+import polars as pl
+from scripts.ingest import read_export
+
+# Identity graph of the persons in all systems: the nodes are the IDs (DPr-ID, GSN, WIAG-ID and FactGrid-ID), the edges
+# are the links between them that each system has. A person should be one connected component with at most one ID of
+# each kind, so every component with more is a conflict (a duplicate, a wrong or an outdated link), whatever its shape.
+#   python -m scripts.identity_graph --input-path <folder> --dpr-persons persons.csv --dpr-ids persons_fg.csv
+
+NODE_KINDS = ['dpr', 'gsn', 'wiag', 'fg']
+LINK_SCHEMA = {'kind_a': pl.String, 'id_a': pl.String, 'kind_b': pl.String, 'id_b': pl.String, 'source': pl.String}
+
+# the links in each export: (source, [((kind, column), (kind, column)), ...])
+EXPORT_LINKS = {
+    'lebensdaten': ('WIAG', [(('wiag', 'id'), ('fg', 'FactGrid_ID')), (('wiag', 'id'), ('gsn', 'GSN'))]),
+    'wiag_person_ids': ('WIAG', [(('wiag', 'wiag_id'), ('gsn', 'gsn'))]),
+    'dpr_persons': ('DPr', [(('dpr', 'id'), ('wiag', 'wiag_id')), (('dpr', 'id'), ('gsn', 'gsn'))]),
+    'dpr_ids': ('DPr', [(('dpr', 'id'), ('fg', 'fg_id')), (('dpr', 'id'), ('gsn', 'gsn'))]),
+    'fg_wiag_ids': ('FactGrid', [(('fg', 'FactGrid_ID'), ('wiag', 'wiag_id'))]),
+    'fg_gsn_items': ('FactGrid', [(('fg', 'FactGrid_ID'), ('gsn', 'gsn'))]),
+}
+
+DEFAULT_FILES = {'lebensdaten': 'WIAG-Domherren-DB-Lebensdaten.csv', 'wiag_person_ids': 'i.csv'}
+
+
+# the links between the IDs in columns a and b (both (kind, column)) of df, as asserted by 'source'
+def links(df: pl.DataFrame, a: tuple, b: tuple, source: str) -> pl.DataFrame:
+    return df.select(
+        pl.lit(a[0]).alias('kind_a'), pl.col(a[1]).cast(pl.String).alias('id_a'),
+        pl.lit(b[0]).alias('kind_b'), pl.col(b[1]).cast(pl.String).alias('id_b'),
+        pl.lit(source).alias('source'),
+    ).drop_nulls().filter((pl.col('id_a') != '') & (pl.col('id_b') != '')).unique()
+
+
+# the links of all frames given (named like in EXPORT_LINKS)
+def collect_links(frames: dict) -> pl.DataFrame:
+    return pl.concat([
+        links(df, a, b, EXPORT_LINKS[name][0]) for name, df in frames.items() for (a, b) in EXPORT_LINKS[name][1]
+    ] or [pl.DataFrame(schema=LINK_SCHEMA)]).unique(maintain_order=True)
+
+
+# outdated WIAG-IDs are replaced by the current ones (see scripts/wiag_redirects.py), so they don't count as conflicts
+def resolve_wiag_links(links_df: pl.DataFrame, redirects: dict) -> pl.DataFrame:
+    from scripts.wiag_redirects import find
+
+    wiag_ids = pl.concat([
+        links_df.filter(pl.col('kind_a') == 'wiag').get_column('id_a'), links_df.filter(pl.col('kind_b') == 'wiag').get_column('id_b'),
+    ]).unique()
+    current_df = pl.DataFrame({'wiag_id': wiag_ids, 'current_id': [find(redirects, wiag_id) for wiag_id in wiag_ids]}, schema={'wiag_id': pl.String, 'current_id': pl.String})
+    for side in ['a', 'b']:
+        links_df = links_df.join(current_df, how='left', left_on=f"id_{side}", right_on='wiag_id', maintain_order='left').with_columns(
+            pl.when(pl.col(f"kind_{side}") == 'wiag').then(pl.col('current_id')).otherwise(pl.col(f"id_{side}")).alias(f"id_{side}")
+        ).drop('current_id')
+    return links_df.unique(maintain_order=True)
+
+
+# The component of every node ("kind:id"). The nodes are numbered and joined with union-find (union by size, path
+# halving), which takes almost linear time in the number of links.
+def connected_components(links_df: pl.DataFrame) -> pl.DataFrame:
+    edges_df = links_df.select(
+        pl.concat_str('kind_a', pl.lit(':'), 'id_a').alias('a'), pl.concat_str('kind_b', pl.lit(':'), 'id_b').alias('b'),
+    )
+    nodes = pl.concat([edges_df.get_column('a'), edges_df.get_column('b')]).unique(maintain_order=True).rename('node')
+    nodes_df = nodes.to_frame().with_row_index('index')
+    edges_df = edges_df.join(nodes_df, left_on='a', right_on='node').join(nodes_df, left_on='b', right_on='node', suffix='_b')
+
+    parent = list(range(len(nodes)))
+    size = [1] * len(nodes)
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (a, b) in zip(edges_df.get_column('index').to_list(), edges_df.get_column('index_b').to_list()):
+        (a, b) = (root(a), root(b))
+        if a != b:
+            if size[a] < size[b]:
+                (a, b) = (b, a)
+            parent[b] = a
+            size[a] += size[b]
+
+    return nodes_df.select('node').with_columns(
+        pl.Series('component', [root(i) for i in range(len(nodes))], dtype=pl.UInt32),
+        pl.col('node').str.splitn(':', 2).struct.rename_fields(['kind', 'id']).struct.unnest(),
+    )
+
+
+# One row per component with more than one ID of a kind: the IDs and all links of the component with the system that has them
+def find_conflicts(links_df: pl.DataFrame, redirects: dict = None) -> pl.DataFrame:
+    if redirects is not None:
+        links_df = resolve_wiag_links(links_df, redirects)
+    components_df = connected_components(links_df)
+
+    conflicts_df = components_df.group_by('component').agg(
+        *[(pl.col('kind') == kind).sum().alias(kind) for kind in NODE_KINDS],
+        pl.col('node').sort().str.join(' ').alias('ids'),
+    ).filter(pl.any_horizontal(pl.col(kind) > 1 for kind in NODE_KINDS))
+
+    component_links_df = links_df.join(
+        components_df.select(pl.col('node').alias('a'), 'component'), left_on=pl.concat_str('kind_a', pl.lit(':'), 'id_a'), right_on='a',
+    ).group_by('component').agg(
+        pl.format('{}:{} -{}- {}:{}', 'kind_a', 'id_a', 'source', 'kind_b', 'id_b').sort().str.join('; ').alias('links'),
+    )
+
+    return conflicts_df.join(component_links_df, on='component', how='left').with_columns(
+        pl.concat_str([pl.when(pl.col(kind) > 1).then(pl.format(f"{{}} {kind}", pl.col(kind))) for kind in NODE_KINDS], separator=', ', ignore_nulls=True).alias('conflict'),
+        pl.sum_horizontal(NODE_KINDS).alias('size'),
+    ).select('conflict', 'size', *NODE_KINDS, 'ids', 'links').sort(['size', 'ids'], descending=[True, False])
+
+
+def read_frames(input_path: str, files: dict) -> dict:
+    frames = {}
+    for kind, filename in files.items():
+        path = os.path.join(input_path, filename)
+        if os.path.exists(path):
+            frames[kind] = read_export(path, kind)
+        else:
+            print(f"{path} does not exist, the links of {kind} are left out.")
+    return frames
+
+
+def main(argv: list = None):
+    from scripts.fg_reference import load_person_crosswalk, fg_wiag_ids, fg_gsn_items
+    from scripts.wiag_redirects import load_redirects
+
+    parser = argparse.ArgumentParser(description="Finds the persons whose IDs in DPr, WIAG and FactGrid contradict each other.")
+    parser.add_argument('--input-path', required=True)
+    parser.add_argument('--lebensdaten', default=DEFAULT_FILES['lebensdaten'], help="WIAG export (CSV Personendaten)")
+    parser.add_argument('--wiag-ids', default=DEFAULT_FILES['wiag_person_ids'], help="WIAG export of queries/get_wiag_person_ids.sql")
+    parser.add_argument('--dpr-persons', help="DPr export of queries/get_dpr_data.sql")
+    parser.add_argument('--dpr-ids', help="DPr export of queries/select_dpr_ids.sql")
+    parser.add_argument('--no-factgrid', action='store_true', help="leave out the links on FactGrid (nothing is downloaded)")
+    parser.add_argument('--output', help="CSV file for the conflicts")
+    args = parser.parse_args(argv)
+
+    files = {'lebensdaten': args.lebensdaten, 'wiag_person_ids': args.wiag_ids, 'dpr_persons': args.dpr_persons, 'dpr_ids': args.dpr_ids}
+    frames = read_frames(args.input_path, {kind: filename for kind, filename in files.items() if filename})
+    if not args.no_factgrid:
+        crosswalk_df = load_person_crosswalk(args.input_path, step='identity_graph')
+        frames['fg_wiag_ids'] = fg_wiag_ids(crosswalk_df)
+        frames['fg_gsn_items'] = fg_gsn_items(crosswalk_df)
+
+    links_df = collect_links(frames)
+    conflicts_df = find_conflicts(links_df, load_redirects(args.input_path))
+    print(f"{links_df.height} links between the IDs, {conflicts_df.height} persons with conflicting IDs.")
+    with pl.Config(tbl_rows=20, fmt_str_lengths=100):
+        print(conflicts_df.drop('links'))
+    if args.output:
+        conflicts_df.write_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
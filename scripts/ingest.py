@@ -0,0 +1,219 @@
+import csv
+import hashlib
+import os
+import re
+import polars as pl
+from scripts.artefacts import CACHE_DIR_NAME, load_artefact, save_artefact
+
+# declared schemas of the exports read by the notebooks
+# 'columns' lists every column the notebooks use together with its type. For files without a header row
+# (or with a header that is replaced by our own names) 'names' defines the column names in the order of the file.
+EXPORT_SCHEMAS = {
+    # WIAG website: Export->Personendaten
+    'lebensdaten': {
+        'separator': ';',
+        'null_values': None,
+        'header': True,
+        'names': None,
+        'columns': {
+            'id': pl.String,
+            'FactGrid_ID': pl.String,
+            'displayname': pl.String,
+            'biographical_dates': pl.String,
+            'date_of_birth': pl.String,
+            'date_of_death': pl.String,
+            'GND_ID': pl.String,
+            'GSN': pl.String,
+            'Wikidata_ID': pl.String,
+            'Wikipedia': pl.String,
+        },
+    },
+    # WIAG website: Export->Amtsdaten
+    'aemter': {
+        'separator': ';',
+        'null_values': None,
+        'header': True,
+        'names': None,
+        'columns': {
+            'id': pl.UInt32,
+            'person_id': pl.String,
+            'FactGrid': pl.String,
+            'name': pl.String,
+            'role_group': pl.Categorical,
+            'role_group_fq_id': pl.String,
+            'role_group_en': pl.String,
+            'institution': pl.String,
+            'institution_id': pl.UInt32,
+            'diocese': pl.String,
+            'diocese_id': pl.String,
+            'date_begin': pl.String,
+            'date_end': pl.String,
+            'date_sort_key': pl.Int64,
+        },
+    },
+    # WIAG phpMyAdmin: queries/get_wiag_roles.sql
+    'role': {
+        'separator': ',',
+        'null_values': 'NULL',
+        'header': True,
+        'names': None,
+        'columns': {
+            'id': pl.UInt32,
+            'name': pl.String,
+            'factgrid_id': pl.String,
+        },
+    },
+    # WIAG phpMyAdmin: queries/get_wiag_person_ids.sql
+    'wiag_person_ids': {
+        'separator': ',',
+        'null_values': None,
+        'header': False,
+        'names': ['id', 'wiag_id', 'gsn'],
+        'columns': {
+            'id': pl.UInt32,
+            'wiag_id': pl.String,
+            'gsn': pl.String,
+        },
+    },
+    # DPr phpMyAdmin: queries/get_dpr_data.sql
+    'dpr_persons': {
+        'separator': ',',
+        'null_values': None,
+        'header': False,
+        'names': ['wiag_id', 'id', 'gsn_table_id', 'gsn'],
+        'columns': {
+            'wiag_id': pl.String,
+            'id': pl.UInt32,
+            'gsn_table_id': pl.UInt32,
+            'gsn': pl.String,
+        },
+    },
+    # DPr phpMyAdmin: queries/select_dpr_ids.sql
+    'dpr_ids': {
+        'separator': ',',
+        'null_values': None,
+        'header': True,
+        'names': ['fg_id', 'id', 'gsn'],
+        'columns': {
+            'fg_id': pl.String,
+            'id': pl.UInt32,
+            'gsn': pl.String,
+        },
+    },
+    # DPr phpMyAdmin: queries/select_dpr_with_deleted.sql
+    'dpr_with_deleted': {
+        'separator': ',',
+        'null_values': None,
+        'header': True,
+        'names': ['fg_id', 'id', 'gsn', 'is_deleted'],
+        'columns': {
+            'fg_id': pl.String,
+            'id': pl.UInt32,
+            'gsn': pl.String,
+            'is_deleted': pl.UInt8,
+        },
+    },
+}
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# used for reading the same files with pandas in the notebooks that (still) work with pandas
+PANDAS_DTYPES = {
+    pl.String: str,
+    pl.UInt8: 'UInt8',
+    pl.UInt32: 'UInt32',
+    pl.Int64: 'Int64',
+    pl.Categorical: 'category',
+}
+
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_header(path: str, separator: str) -> list:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f, delimiter=separator), [])
+
+
+# builds the full schema of the file from the header and the declared columns - fails if the file does not match the declaration
+def file_schema(path: str, kind: str) -> dict:
+    spec = EXPORT_SCHEMAS[kind]
+    header = read_header(path, spec['separator'])
+
+    if spec['names'] is not None:
+        if len(header) != len(spec['names']):
+            raise ValueError(f"{os.path.basename(path)}: expected {len(spec['names'])} columns for a '{kind}' export, found {len(header)}: {header}")
+        header = spec['names']
+    else:
+        missing = [column for column in spec['columns'] if column not in header]
+        if missing:
+            raise ValueError(f"{os.path.basename(path)}: columns {missing} of the '{kind}' export are missing. Found columns: {header}")
+
+    # columns that are not used by the notebooks are kept as strings
+    return {column: spec['columns'].get(column, pl.String) for column in header}
+
+
+# removes the parquet copies of the file that were written to the .cache directory before the artefacts were stored as Arrow IPC
+def remove_stale_sidecars(path: str):
+    directory, filename = os.path.split(path)
+    cache_dir = os.path.join(directory, CACHE_DIR_NAME)
+    pattern = re.compile(re.escape(os.path.splitext(filename)[0]) + r'\.[0-9a-f]{16}\.parquet')
+    for entry in os.listdir(cache_dir):
+        if pattern.fullmatch(entry):
+            os.remove(os.path.join(cache_dir, entry))
+
+
+def scan_export(path: str, kind: str) -> pl.LazyFrame:
+    spec = EXPORT_SCHEMAS[kind]
+    # a header with other names than the declared ones is skipped, polars would reject it
+    renamed_header = spec['header'] and spec['names'] is not None
+    return pl.scan_csv(
+        path,
+        separator=spec['separator'],
+        has_header=spec['header'] and not renamed_header,
+        skip_rows=1 if renamed_header else 0,
+        schema=file_schema(path, kind),
+        null_values=spec['null_values'],
+        encoding='utf8-lossy',
+    )
+
+
+# reads the file with the declared types. The first time a file (identified by its content hash) is read, it is stored
+# as an artefact (see scripts/artefacts.py), which is memory-mapped instead of reading the file from then on.
+def read_export(path: str, kind: str, use_cache: bool = True) -> pl.DataFrame:
+    if not use_cache:
+        return scan_export(path, kind).collect()
+
+    file_schema(path, kind) # checking the header even if the stored copy is used
+    directory, filename = os.path.split(path)
+    name = os.path.splitext(filename)[0]
+    sources = {filename: file_hash(path)}
+    df = load_artefact(directory, name, sources)
+    if df is not None:
+        return df
+
+    df = scan_export(path, kind).collect()
+    save_artefact(directory, name, df, step=f"read_export ({kind})", sources=sources)
+    remove_stale_sidecars(path)
+    return df
+
+
+# same as read_export, but returns a pandas dataframe (without the stored copy)
+def read_export_pandas(path: str, kind: str):
+    import pandas as pd
+
+    spec = EXPORT_SCHEMAS[kind]
+    schema = file_schema(path, kind)
+    return pd.read_csv(
+        path,
+        sep=spec['separator'],
+        header=0 if spec['header'] else None,
+        names=list(schema),
+        dtype={column: PANDAS_DTYPES[dtype] for column, dtype in schema.items()},
+        na_values=spec['null_values'],
+    )
@@ -0,0 +1,168 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError: # the memory usage is then only measured where the operating system provides it without psutil
+    psutil = None
+
+TRACE_DIR = 'traces' # relative to the notebooks
+MB = 1024 * 1024
+
+# The spans (one per stage) measured since start_trace(). Every finished span is also appended to the JSONL trace file.
+trace = {'file': None, 'spans': [], 'trace_python_memory': False}
+open_spans = []
+lock = threading.Lock()
+
+
+def rss():
+    return psutil.Process().memory_info().rss if psutil is not None else None
+
+
+# highest memory usage of the process so far
+def peak_rss():
+    if psutil is not None and hasattr(info := psutil.Process().memory_info(), 'peak_wset'): # Windows
+        return info.peak_wset
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes on Linux
+
+
+def to_mb(value):
+    return round(value / MB, 1) if value is not None else None
+
+
+def count_rows(value):
+    if isinstance(value, tuple):
+        return count_rows(value[0]) if value else None
+    if hasattr(value, '__len__') and not isinstance(value, (str, dict)):
+        return len(value)
+    return None
+
+
+# tracemalloc only has one peak, so before a span starts or ends the peak so far is handed to all open spans
+def update_python_peaks():
+    if not tracemalloc.is_tracing():
+        return
+    peak = tracemalloc.get_traced_memory()[1]
+    for span in open_spans:
+        span['python_peak'] = max(span['python_peak'], peak)
+    tracemalloc.reset_peak()
+
+
+# Starts a new trace. With trace_python_memory=True the memory allocated by Python is traced as well (tracemalloc),
+# which makes everything noticeably slower.
+def start_trace(name: str, directory: str = TRACE_DIR, trace_python_memory: bool = False) -> str:
+    os.makedirs(directory, exist_ok=True)
+    trace['file'] = os.path.join(directory, f"trace_{name}_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.jsonl")
+    trace['spans'] = []
+    trace['trace_python_memory'] = trace_python_memory
+    if trace_python_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return trace['file']
+
+
+# called by everything that sends a request to WIAG, FactGrid or the translation API
+def count_http_call(calls: int = 1):
+    with lock:
+        for span in open_spans:
+            span['http_calls'] += calls
+
+
+# Measures the block as the stage 'name'. The number of output rows can be set with span['rows_out'] = ...
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    with lock:
+        update_python_peaks()
+        span = {
+            'name': name,
+            'parent': open_spans[-1]['name'] if open_spans else None,
+            'depth': len(open_spans),
+            'started': datetime.now().isoformat(timespec='milliseconds'),
+            'rows_in': rows_in,
+            'rows_out': None,
+            'http_calls': 0,
+            'python_peak': 0,
+        }
+        open_spans.append(span)
+        trace['spans'].append(span)
+
+    rss_start = rss()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span['error'] = type(e).__name__
+        raise
+    finally:
+        span['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        span['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        rss_end = rss()
+        peak = peak_rss()
+        span['rss_start_mb'] = to_mb(rss_start)
+        span['rss_end_mb'] = to_mb(rss_end)
+        span['peak_rss_mb'] = to_mb(max(peak, rss_end) if peak is not None and rss_end is not None else peak)
+        with lock:
+            update_python_peaks()
+            open_spans.remove(span)
+        span['python_peak_mb'] = to_mb(span.pop('python_peak')) if tracemalloc.is_tracing() else None
+
+        if trace['file'] is not None:
+            with open(trace['file'], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(span) + '\n')
+
+
+# decorator measuring every call of the function as a stage (the rows of the first argument and of the result are counted)
+def instrumented(name: str = None):
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with stage(stage_name, count_rows(args[0]) if args else None) as span:
+                    result = await function(*args, **kwargs)
+                    span['rows_out'] = count_rows(result)
+                    return result
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage(stage_name, count_rows(args[0]) if args else None) as span:
+                    result = function(*args, **kwargs)
+                    span['rows_out'] = count_rows(result)
+                    return result
+
+        return wrapper
+    return decorator
+
+
+def print_summary():
+    if not trace['spans']:
+        print("No stages were measured.")
+        return
+
+    import polars as pl
+
+    columns = ['stage', 'wall_s', 'cpu_s', 'rows_in', 'rows_out', 'http_calls', 'rss_end_mb', 'peak_rss_mb', 'python_peak_mb']
+    summary = pl.DataFrame([
+        {'stage': '  ' * span['depth'] + span['name'] + (f" ({span['error']})" if 'error' in span else '')} | {column: span.get(column) for column in columns[1:]}
+        for span in trace['spans']
+    ], schema={'stage': pl.String, 'wall_s': pl.Float64, 'cpu_s': pl.Float64, 'rows_in': pl.Int64, 'rows_out': pl.Int64, 'http_calls': pl.Int64,
+               'rss_end_mb': pl.Float64, 'peak_rss_mb': pl.Float64, 'python_peak_mb': pl.Float64})
+
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=200, fmt_str_lengths=60, tbl_hide_dataframe_shape=True, tbl_hide_column_data_types=True):
+        print(summary)
+    if trace['file'] is not None:
+        print(f"The trace was saved to {trace['file']}")
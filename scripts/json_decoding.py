@@ -0,0 +1,58 @@
+import functools
+import json
+
+try:
+    import msgspec
+except ImportError: # only if the environment was not installed from pyproject.toml: then the json module is used
+    msgspec = None
+
+# Decoding of the JSON responses of WIAG and the FactGrid query service. With msgspec (a dependency of the project) the
+# responses are decoded into typed structs that only have the fields read here - everything else in the response (e.g.
+# the type and language of every SPARQL value or the offices of a WIAG person) is skipped without creating objects.
+
+if msgspec is not None:
+    # a value of a SPARQL result (its 'type', 'datatype' and 'xml:lang' are not needed)
+    class Term(msgspec.Struct, gc=False):
+        value: str
+
+    class WiagIdentifier(msgspec.Struct, gc=False):
+        Factgrid: str | None = None
+
+    class WiagPerson(msgspec.Struct, gc=False):
+        wiagId: str
+        identifier: WiagIdentifier = msgspec.field(default_factory=WiagIdentifier)
+
+    class WiagPersons(msgspec.Struct, gc=False):
+        persons: list[WiagPerson]
+
+    wiag_decoder = msgspec.json.Decoder(WiagPersons)
+
+    # one decoder per combination of variables: a binding is decoded into a struct with a field for each variable
+    @functools.cache
+    def bindings_decoder(variables: tuple):
+        binding = msgspec.defstruct('Binding', [(variable, Term | None, None) for variable in variables], gc=False)
+        results = msgspec.defstruct('Results', [('bindings', list[binding])], gc=False)
+        return msgspec.json.Decoder(msgspec.defstruct('SparqlResponse', [('results', results)], gc=False))
+
+
+# The values of 'variables' in a SPARQL JSON result, one list per variable (None where a binding has no value)
+def decode_bindings(content: bytes, variables) -> dict:
+    variables = tuple(variables)
+    if msgspec is not None:
+        bindings = bindings_decoder(variables).decode(content).results.bindings
+        return {
+            variable: [term.value if (term := getattr(binding, variable)) is not None else None for binding in bindings]
+            for variable in variables
+        }
+    bindings = json.loads(content)['results']['bindings']
+    return {variable: [binding[variable]['value'] if variable in binding else None for binding in bindings] for variable in variables}
+
+
+# The WIAG-ID of the person of a response of the WIAG API (/id/<WIAG-ID>?format=Json), which is a different one if
+# WIAG redirected to it, and the FactGrid URL of the person (None if it has none)
+def decode_wiag_person(content) -> tuple:
+    if msgspec is not None:
+        person = wiag_decoder.decode(content).persons[0]
+        return (person.wiagId, person.identifier.Factgrid)
+    person = json.loads(content)['persons'][0]
+    return (person['wiagId'], person.get('identifier', {}).get('Factgrid'))
@@ -0,0 +1,86 @@
+import re
+import polars as pl
+
+# Trigram index over the labels of FactGrid items. It suggests the most similar items for names that could not be
+# matched exactly (missing dioceses, institutions and institution roles), so they don't have to be searched by hand.
+
+TOP_K = 3
+MIN_SCORE = 0.3 # share of trigrams the name and the label have in common (Jaccard similarity)
+
+
+def normalize(label: str) -> str:
+    return ' '.join(re.sub(r'[^\w]+', ' ', label.lower()).split())
+
+
+def trigrams(label: str) -> set:
+    padded = f"  {normalize(label)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# The index maps every trigram to the positions of the labels containing it. Every item can have several labels
+# (e.g. the label and the alternative labels of the dioceses), the best one counts.
+def build_label_index(df: pl.DataFrame, id_column: str, label_columns: list) -> dict:
+    import numpy as np # only imported when an index is needed
+
+    labels_df = pl.concat([
+        df.select(pl.col(id_column).alias('id'), pl.col(column).alias('label')) for column in label_columns
+    ]).drop_nulls().filter(pl.col('label') != '').unique(maintain_order=True)
+
+    postings = {}
+    sizes = []
+    for position, label in enumerate(labels_df.get_column('label')):
+        grams = trigrams(label)
+        sizes.append(len(grams))
+        for gram in grams:
+            postings.setdefault(gram, []).append(position)
+
+    return {
+        'ids': labels_df.get_column('id').to_list(),
+        'labels': labels_df.get_column('label').to_list(),
+        'sizes': np.array(sizes, dtype=np.int32),
+        'postings': {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()},
+    }
+
+
+# returns up to k (id, label, score) tuples, the most similar first
+def search_label_index(index: dict, name: str, k: int = TOP_K, min_score: float = MIN_SCORE) -> list:
+    import numpy as np
+
+    name_grams = trigrams(name)
+    grams = [gram for gram in name_grams if gram in index['postings']]
+    if not grams:
+        return []
+
+    shared = np.bincount(np.concatenate([index['postings'][gram] for gram in grams]), minlength=len(index['sizes']))
+    scores = shared / (len(name_grams) + index['sizes'] - shared)
+    # twice as many as needed, because several labels of the same item can be among the best
+    best = np.argpartition(-scores, 2 * k - 1)[:2 * k] if len(scores) > 2 * k else np.arange(len(scores))
+
+    candidates = []
+    seen_ids = set()
+    for position in best[np.argsort(-scores[best], kind='stable')]:
+        if scores[position] < min_score or len(candidates) == k:
+            break
+        if index['ids'][position] in seen_ids:
+            continue
+        seen_ids.add(index['ids'][position])
+        candidates.append((index['ids'][position], index['labels'][position], round(float(scores[position]), 3)))
+    return candidates
+
+
+# the candidates for all names at once (every name is only searched once): one row per name and candidate
+def suggest_candidates(index: dict, names, k: int = TOP_K, min_score: float = MIN_SCORE) -> pl.DataFrame:
+    rows = [
+        (name, rank, fg_id, label, score)
+        for name in dict.fromkeys(name for name in names if name is not None)
+        for rank, (fg_id, label, score) in enumerate(search_label_index(index, name, k, min_score), start=1)
+    ]
+    return pl.DataFrame(rows, schema={'name': pl.String, 'rank': pl.Int32, 'candidate_id': pl.String, 'candidate_label': pl.String, 'score': pl.Float64}, orient='row')
+
+
+# adds the candidates for the names in 'name_column' as one column 'candidates' ("Q123 Label (0.85); ...")
+def with_candidates(df: pl.DataFrame, name_column: str, index: dict, k: int = TOP_K) -> pl.DataFrame:
+    candidates_df = suggest_candidates(index, df.get_column(name_column), k).group_by('name', maintain_order=True).agg(
+        pl.format('{} {} ({})', 'candidate_id', 'candidate_label', 'score').str.join('; ').alias('candidates')
+    )
+    return df.join(candidates_df, how='left', left_on=name_column, right_on='name', maintain_order='left')
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+import polars as pl
+from scripts.ingest import CACHE_DIR_NAME, file_hash, read_export
+
+MANIFEST_FILE = 'manifest.json'
+CACHE_TTL = timedelta(days=7) # cached frames of an outdated key are deleted once they were not used for this long
+
+
+def manifest_path(directory: str) -> str:
+    return os.path.join(directory, MANIFEST_FILE)
+
+
+def load_manifest(directory: str) -> dict:
+    path = manifest_path(directory)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(directory: str, manifest: dict):
+    with open(manifest_path(directory), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+# Records the export in the manifest of its directory (SHA-256, number of rows, the query/page it was exported from and
+# the time it was downloaded) and returns the entry. 'changed' tells whether the content differs from the last time the
+# file was registered, 'age_days' how many days ago the file was downloaded.
+def register_input(path: str, kind: str, source: str) -> dict:
+    directory, filename = os.path.split(path)
+    manifest = load_manifest(directory)
+    previous = manifest.get(filename, {})
+
+    digest = file_hash(path)
+    downloaded = datetime.fromtimestamp(os.path.getmtime(path))
+    entry = {
+        'sha256': digest,
+        'rows': previous['rows'] if previous.get('sha256') == digest else read_export(path, kind).height,
+        'kind': kind,
+        'source': source,
+        'downloaded': downloaded.isoformat(timespec='seconds'),
+        'registered': datetime.now().isoformat(timespec='seconds'),
+    }
+    manifest[filename] = entry
+    save_manifest(directory, manifest)
+
+    return entry | {'changed': previous.get('sha256') != digest, 'age_days': (datetime.now().date() - downloaded.date()).days}
+
+
+def print_input_status(filename: str, entry: dict):
+    if entry['changed']:
+        print(f"{filename}: new content ({entry['rows']} rows, sha256 {entry['sha256'][:12]}), derived data will be recomputed.")
+    else:
+        print(f"{filename}: unchanged since the last run ({entry['rows']} rows, sha256 {entry['sha256'][:12]}), cached derived data is reused.")
+    if entry['age_days'] > 0:
+        print(f"WARNING: {filename} was downloaded {entry['age_days']} day(s) ago ({entry['downloaded']}). Make sure you are not using outdated data.")
+
+
+# content hash of a dataframe, used as a cache key for data that does not come from a file (e.g. FactGrid downloads)
+def frame_hash(df: pl.DataFrame) -> str:
+    sha = hashlib.sha256(str(df.schema).encode())
+    sha.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha256('\n'.join([pl.__version__, *parts]).encode()).hexdigest()[:16]
+
+
+# Deletes the cached frames of 'name' that were stored for another key and not used for CACHE_TTL. Recently used
+# versions stay, because another notebook run may still be reading them.
+def prune_cached(cache_dir: str, name: str, key: str):
+    cutoff = (datetime.now() - CACHE_TTL).timestamp()
+    for entry in os.listdir(cache_dir):
+        stem, _, extension = entry.rpartition('.')
+        if extension == 'parquet':
+            stem = stem.rpartition('.')[0] # without the part number
+        elif extension != 'json':
+            continue
+        entry_name, _, entry_key = stem.rpartition('.')
+        if entry_name != name or entry_key == key:
+            continue
+        index_file = os.path.join(cache_dir, f"{name}.{entry_key}.json")
+        try:
+            last_used = os.path.getmtime(index_file if os.path.exists(index_file) else os.path.join(cache_dir, entry))
+            if last_used < cutoff:
+                os.remove(os.path.join(cache_dir, entry))
+        except FileNotFoundError: # already pruned by another run
+            pass
+
+
+def write_json(path: str, value):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+
+
+# writes to a temporary file first, so other runs never see a partly written file
+def write_replacing(path: str, write):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+# Returns the frames computed by compute() for the given key. If they were already computed for the same key, they are
+# loaded from the cache directory instead. compute() can return a single frame or a tuple of frames. Reading a key
+# updates the time of its index file, which prune_cached() uses as the time it was last used.
+def cached(directory: str, name: str, key: str, compute):
+    cache_dir = os.path.join(directory, CACHE_DIR_NAME)
+    index_file = os.path.join(cache_dir, f"{name}.{key}.json")
+
+    try:
+        with open(index_file, encoding='utf-8') as f:
+            parts = json.load(f)
+        frames = tuple(pl.read_parquet(os.path.join(cache_dir, part)) for part in parts)
+        os.utime(index_file)
+        return frames[0] if len(frames) == 1 else frames
+    except FileNotFoundError: # not computed yet (or pruned while reading)
+        pass
+
+    result = compute()
+    frames = result if isinstance(result, tuple) else (result,)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    parts = [f"{name}.{key}.{i}.parquet" for i in range(len(frames))]
+    for part, frame in zip(parts, frames):
+        write_replacing(os.path.join(cache_dir, part), frame.write_parquet)
+    write_replacing(index_file, lambda path: write_json(path, parts))
+    prune_cached(cache_dir, name, key)
+
+    return result
@@ -0,0 +1,13 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+# The folders the notebooks read the exports from and write the generated files to. They can be changed by setting the
+# environment variables or adding them to the .env file in the project directory (see endpoints.py for the services).
+load_dotenv()
+
+INPUT_PATH = os.environ.get('INPUT_PATH', r"C:\Users\Public\sync_notebooks\input_files")
+OUTPUT_PATH = os.environ.get('OUTPUT_PATH', r"C:\Users\Public\sync_notebooks\output_files")
+
+# the database of the rate limits that all notebooks on this computer share (see rate_limit.py)
+RATE_LIMIT_FILE = os.environ.get('RATE_LIMIT_FILE', os.path.join(tempfile.gettempdir(), 'sync_notebooks_rate_limits.sqlite'))
@@ -0,0 +1,81 @@
+import polars as pl
+
+# Renders frames as QuickStatements commands (V1 or CSV, see https://www.wikidata.org/wiki/Help:QuickStatements).
+# What is written for a column depends on its kind:
+ITEM = 'item' # an item or property ID (Q123), written as is
+STRING = 'string' # a string value, written in double quotes
+TEXT = 'text' # labels, descriptions, aliases and sitelinks: in double quotes in V1, as is in CSV
+RAW = 'raw' # already formatted values (e.g. dates or several qualifiers joined by tabs), written as is
+
+CHUNK_ROWS = 50_000 # rows rendered and written at once
+BUFFER_SIZE = 1 << 20
+
+
+# tabs and line breaks would end the field or the command, so they are replaced by a space
+def clean(value: pl.Expr) -> pl.Expr:
+    return value.cast(pl.String).str.replace_all(r'[\t\r\n]+', ' ')
+
+
+# QuickStatements takes everything between the first and the last quotation mark, so quotes inside need no escaping
+def quoted(value: pl.Expr) -> pl.Expr:
+    return pl.concat_str([pl.lit('"'), clean(value), pl.lit('"')])
+
+
+def v1_value(column: str, kind: str) -> pl.Expr:
+    if kind in (STRING, TEXT):
+        return quoted(pl.col(column))
+    if kind == ITEM:
+        return clean(pl.col(column))
+    return pl.col(column).cast(pl.String)
+
+
+# One CREATE block per row with a 'LAST' command for every column of 'spec' (column: kind) that is not empty.
+# 'multi' maps list columns to the property of their values (e.g. {'role_groups': 'P165'}), which are added as
+# statements as well.
+def v1_create_blocks(df: pl.DataFrame, spec: dict, multi: dict = None) -> pl.Series:
+    commands = [
+        pl.concat_str([pl.lit(f"LAST\t{column}\t"), v1_value(column, kind)])
+        for column, kind in spec.items()
+    ]
+    commands += [
+        pl.when(pl.col(column).list.len() > 0).then(
+            pl.col(column).list.eval(pl.concat_str([pl.lit(f"LAST\t{property}\t"), clean(pl.element())])).list.join('\n')
+        )
+        for column, property in (multi or {}).items()
+    ]
+    return df.select(
+        pl.concat_str([pl.lit('CREATE'), *commands], separator='\n', ignore_nulls=True).alias('v1')
+    ).get_column('v1')
+
+
+# One statement per row: item, property and value followed by the qualifiers and sources given as (property, column,
+# kind) and a RAW column with more of them already joined by tabs. Empty qualifiers and sources are left out, rows
+# without item or value give no statement (null).
+def v1_statements(df: pl.DataFrame, item: str, property: str, value: tuple, qualifiers: list = (), raw: str = None) -> pl.Series:
+    (value_column, value_kind) = value
+    fields = [clean(pl.col(item)), pl.lit(property), v1_value(value_column, value_kind)]
+    for (qualifier, column, kind) in qualifiers:
+        fields.append(pl.concat_str([pl.lit(qualifier + '\t'), v1_value(column, kind)]))
+    if raw is not None:
+        fields.append(pl.when(pl.col(raw) != '').then(pl.col(raw)))
+    statement = pl.when(pl.col(item).is_not_null() & pl.col(value_column).is_not_null()).then(
+        pl.concat_str(fields, separator='\t', ignore_nulls=True)
+    )
+    return df.select(statement.alias('v1')).get_column('v1')
+
+
+# writes the commands rendered by render(chunk) for chunks of CHUNK_ROWS rows of df - each command on its own line(s)
+def write_v1(df: pl.DataFrame, path: str, render) -> int:
+    with open(path, 'w', encoding='utf-8', newline='\n', buffering=BUFFER_SIZE) as out_stream:
+        for chunk in df.iter_slices(CHUNK_ROWS):
+            commands = render(chunk).drop_nulls()
+            if len(commands) > 0:
+                out_stream.write(commands.str.join('\n').item() + '\n')
+    return df.height
+
+
+# Writes a QuickStatements CSV file. The columns of 'spec' with the kind STRING are put in double quotes (which the
+# CSV writer then escapes), all other columns are written as they are.
+def write_csv(df: pl.DataFrame, path: str, spec: dict = None):
+    strings = [column for column, kind in (spec or {}).items() if kind == STRING]
+    df.with_columns(quoted(pl.col(column)).alias(column) for column in strings).write_csv(path)
@@ -0,0 +1,78 @@
+import functools
+import sqlite3
+import time
+from contextlib import closing
+from scripts.paths import RATE_LIMIT_FILE
+
+# A rate limit that all processes on this computer share, e.g. two notebooks translating at the same time or the
+# workers of one translation: together they make at most 'calls' calls in any 'period' seconds. It works like a bucket
+# of 'calls' tokens in which every token comes back 'period' seconds after it was taken, so the full allowance can be
+# used right away but is never exceeded. The times of the calls are kept in an SQLite database (RATE_LIMIT_FILE, see
+# paths.py) that a process locks while it takes a token; 'name' tells the limits of different services apart.
+
+BUSY_TIMEOUT = 60 # seconds to wait for another process that holds the lock
+
+
+def connect(path: str):
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    connection.execute("CREATE TABLE IF NOT EXISTS calls (name TEXT NOT NULL, time REAL NOT NULL)")
+    connection.execute("CREATE INDEX IF NOT EXISTS calls_name_time ON calls (name, time)")
+    return connection
+
+
+# the seconds until a token comes back, given the times of the calls in the last period in order (0 if one is left)
+def wait_time(times: list, calls: int, period: float, now: float) -> float:
+    if len(times) < calls:
+        return 0
+    return max(times[len(times) - calls] + period - now, 0)
+
+
+# takes a token if one is left, otherwise returns the seconds to wait for the next one
+def try_acquire(connection, name: str, calls: int, period: float) -> float:
+    connection.execute("BEGIN IMMEDIATE") # other processes can read but not take tokens until the commit
+    try:
+        now = time.time()
+        connection.execute("DELETE FROM calls WHERE name = ? AND time <= ?", (name, now - period))
+        times = [t for (t,) in connection.execute("SELECT time FROM calls WHERE name = ? ORDER BY time", (name,))]
+        wait = wait_time(times, calls, period, now)
+        if wait == 0:
+            connection.execute("INSERT INTO calls (name, time) VALUES (?, ?)", (name, now))
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return wait
+
+
+# Waits until a call is allowed and takes its token. Returns the seconds waited.
+def acquire(name: str, calls: int, period: float, path: str = None) -> float:
+    start = time.time()
+    with closing(connect(path or RATE_LIMIT_FILE)) as connection:
+        while (wait := try_acquire(connection, name, calls, period)) > 0:
+            time.sleep(wait)
+    return time.time() - start
+
+
+# The tokens left and the seconds until the next one comes back (0 if tokens are left), without taking one
+def budget(name: str, calls: int, period: float, path: str = None) -> dict:
+    with closing(connect(path or RATE_LIMIT_FILE)) as connection:
+        now = time.time()
+        times = [t for (t,) in connection.execute("SELECT time FROM calls WHERE name = ? AND time > ? ORDER BY time", (name, now - period))]
+    return {
+        'name': name,
+        'calls': calls,
+        'period_s': period,
+        'available': max(calls - len(times), 0),
+        'wait_s': round(wait_time(times, calls, period, now), 3),
+    }
+
+
+# decorator: every call of the function takes a token of the shared limit first
+def rate_limited(name: str, calls: int, period: float):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            acquire(name, calls, period)
+            return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,36 +1,46 @@
 import polars as pl
-from openai import OpenAI
 import os
-import json
-import re
-import time
 import traceback
-from ratelimit import limits, sleep_and_retry
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from scripts.endpoints import LLM_BASE_URL
+from scripts.instrumentation import instrumented, count_http_call
+from scripts.rate_limit import budget, rate_limited
 
 # API configuration
-base_url = "https://chat-ai.academiccloud.de/v1"
+base_url = LLM_BASE_URL
 model = "openai-gpt-oss-120b"
-load_dotenv()  # load .env file into environment
-api_key = os.environ["API_KEY"]
 
+# The limit of the API is shared by all notebooks on this computer that translate at the same time (see rate_limit.py)
 PERIOD_IN_SECONDS = 60
 MAX_CALLS_PER_PERIOD = 15
+WORKERS = 4 # rows of a batch translated at the same time, so the limit is used even if an answer takes long
 STEP_SIZE = 100
 MAX_BATCH_ATTEMPTS = 10
 MAX_ROW_ATTEMPTS = 5
 DEBUG = True
 REASONING_LOG_FILE = f"scripts/translate_reasoning_output.txt"
 
-client = OpenAI(api_key=api_key, base_url=base_url)
+client = None # created by get_client() on the first translation, so the API key is only needed for translating
+
+
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI # takes about a second to import
+
+        api_key = os.environ.get("API_KEY")
+        if not api_key:
+            raise RuntimeError("No API key for the translations: add API_KEY=... to the .env file in the project directory (or set the environment variable).")
+        client = OpenAI(api_key=api_key, base_url=base_url)
+    return client
 
 # ------------------------------------------------------------------------------------------------------
 
 
-@sleep_and_retry
-@limits(calls=MAX_CALLS_PER_PERIOD, period=PERIOD_IN_SECONDS)
+@rate_limited(base_url, calls=MAX_CALLS_PER_PERIOD, period=PERIOD_IN_SECONDS)
 def get_translation(user_prompt: str, system_prompt: str):
-    chat_completion = client.chat.completions.create(
+    count_http_call()
+    chat_completion = get_client().chat.completions.create(
         messages=[
             {
                 "role": "system",
@@ -47,25 +57,37 @@ def get_translation(user_prompt: str, system_prompt: str):
 # ------------------------------------------------------------------------------------------------------
 
 
+# the tokens of the rate limit left and the seconds until the next one comes back
+def translation_budget() -> dict:
+    return budget(base_url, MAX_CALLS_PER_PERIOD, PERIOD_IN_SECONDS)
+
+
+def translate_row(to_translate: pl.DataFrame, index: int, system_prompt: str):
+    dump = get_translation(to_translate.item(index, "Lde"), system_prompt)
+    if DEBUG:
+        print(f"row {index} done", flush=True)
+    return dump
+
+
 def translate_batch(to_translate: pl.DataFrame, start: int, end: int, system_prompt: str):
-    originals = []
     translations = []
 
-    with open(REASONING_LOG_FILE, "a", encoding="utf-8") as f:
-        for index in range(start, end):
-            dump = get_translation(to_translate.item(index, "Lde"), system_prompt)
-            translations.append(dump["choices"][0]["message"]["content"])
+    executor = ThreadPoolExecutor(WORKERS)
+    try:
+        with open(REASONING_LOG_FILE, "a", encoding="utf-8") as f:
+            dumps = executor.map(lambda index: translate_row(to_translate, index, system_prompt), range(start, end))
+            for dump in dumps: # in the order of the rows
+                translations.append(dump["choices"][0]["message"]["content"])
 
-            # entire response for debug purposes
-            #with open(f"{index}.json", "w") as f:
-                #json.dump(dump, f, ensure_ascii=False, indent=2)
+                # entire response for debug purposes
+                #with open(f"{index}.json", "w") as f:
+                    #json.dump(dump, f, ensure_ascii=False, indent=2)
 
-            # just the message to more easily understand the "thinking process"
-            f.write(dump["choices"][0]["message"]["reasoning_content"])
-            f.write('\n\n')
-
-            if DEBUG:
-                print(f"row {index} done", flush=True)
+                # just the message to more easily understand the "thinking process"
+                f.write(dump["choices"][0]["message"]["reasoning_content"])
+                f.write('\n\n')
+    finally:
+        executor.shutdown(cancel_futures=True) # if a row failed, the rows not started yet are not sent
 
     batch_output = pl.Series("translation", translations)
 
@@ -77,9 +99,14 @@ def translate_batch(to_translate: pl.DataFrame, start: int, end: int, system_pro
 # ------------------------------------------------------------------------------------------------------
 
 
+@instrumented()
 def translate(to_translate: pl.DataFrame, system_prompt: str) -> pl.DataFrame:
     batch_outputs = pl.Series(name="Len", dtype=pl.String)
     start = 0
+    get_client() # without an API key this fails here instead of in every attempt below
+    limit = translation_budget()
+    if limit['wait_s'] > 0:
+        print(f"The rate limit is used up by other translations, the first call waits {limit['wait_s']:.0f} seconds.", flush=True)
 
     if os.path.exists(REASONING_LOG_FILE):
         os.remove(REASONING_LOG_FILE)
@@ -114,4 +141,26 @@ def translate(to_translate: pl.DataFrame, system_prompt: str) -> pl.DataFrame:
 
     print("all batches done")
 
-    return to_translate.with_columns(Len = batch_outputs)
\ No newline at end of file
+    return to_translate.with_columns(Len = batch_outputs)
+
+
+# Like translate, but the labels the glossary covers (see scripts/glossary.py) are translated right away and only the
+# others are sent to the LLM. role_column holds the role, institution_column (if given) the institution of an
+# institution role; without them the whole label ('Lde') is taken as the role. Only institutions made of the known
+# place names 'places' (FgReference.place_names) are covered by the glossary.
+@instrumented()
+def translate_with_glossary(to_translate: pl.DataFrame, system_prompt: str, role_column: str = "Lde", institution_column: str = None, places: set = frozenset()) -> pl.DataFrame:
+    from scripts.glossary import glossary_translation
+
+    institutions = to_translate.get_column(institution_column) if institution_column else [None] * to_translate.height
+    pairs = list(zip(to_translate.get_column(role_column), institutions))
+    glossary = {pair: glossary_translation(*pair, places) for pair in set(pairs)}
+    translated_df = to_translate.with_row_index("row").with_columns(Len = pl.Series([glossary[pair] for pair in pairs], dtype=pl.String))
+
+    remaining_df = translated_df.filter(pl.col("Len").is_null())
+    covered = to_translate.height - remaining_df.height
+    print(f"{covered} of {to_translate.height} labels ({covered / max(to_translate.height, 1):.0%}) were translated with the glossary, {remaining_df.height} are sent to the LLM.")
+    if remaining_df.height > 0:
+        remaining_df = translate(remaining_df.drop("Len"), system_prompt)
+
+    return pl.concat([translated_df.filter(pl.col("Len").is_not_null()), remaining_df]).sort("row").drop("row")
\ No newline at end of file
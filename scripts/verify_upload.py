@@ -0,0 +1,122 @@
+import csv
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+import polars as pl
+from scripts.endpoints import FG_API_URL, FG_SPARQL_URL
+from scripts.artefacts import load_artefact, save_artefact
+from scripts.instrumentation import instrumented, count_http_call
+from scripts.fg_reference import PERSON_CROSSWALK_ARTEFACT, PERSON_CROSSWALK_QUERY, SHARD_TIMEOUT, SHARD_TRIES, backoff, fg_wiag_ids
+
+# Checks an upload to FactGrid by reading only the items that the QuickStatements CSV file changed, through the
+# Wikibase API (wbgetentities) instead of the query service - which would mean downloading everything again and only
+# shows the edits after a delay. The stored download of the persons (see load_person_crosswalk in
+# scripts/fg_reference.py) is then updated with what the items have now, so the checks after the upload and notebooks
+# 4, 5 and 6 see the changes.
+
+ENTITIES_BATCH_SIZE = 50 # the most IDs wbgetentities takes at once
+ENTITIES_WORKERS = 4 # requests sent at the same time
+CROSSWALK_PROPERTIES = {'P601': 'wiag_ids', 'P472': 'gsns'} # the claims kept in the crosswalk and its column
+
+
+# The claims of a QuickStatements CSV file (qid, then one column per property, "-P601" for removing a value), one
+# row per claim: 'remove' is whether the value is removed from the item or added to it
+def read_quickstatements_csv(path: str) -> pl.DataFrame:
+    rows = []
+    with open(path, encoding='utf-8', newline='') as f:
+        for record in csv.DictReader(f):
+            for column, value in record.items():
+                value = value.strip('"') if value else ''
+                if column != 'qid' and column.lstrip('-').startswith('P') and value != '':
+                    rows.append((record['qid'], column.lstrip('-'), value, column.startswith('-')))
+    return pl.DataFrame(rows, schema={'qid': pl.String, 'property': pl.String, 'value': pl.String, 'remove': pl.Boolean}, orient='row')
+
+
+def get_entities(qids: list, delay: float = 0) -> dict:
+    import requests # only imported when something is downloaded
+
+    time.sleep(delay)
+    count_http_call()
+    r = requests.get(FG_API_URL, params={'action': 'wbgetentities', 'ids': '|'.join(qids), 'props': 'claims', 'format': 'json'}, timeout=SHARD_TIMEOUT)
+    r.raise_for_status()
+    data = r.json()
+    if 'error' in data:
+        raise requests.RequestException(data['error'].get('info', data['error']))
+    return data['entities']
+
+
+def get_entities_retried(qids: list) -> dict:
+    import requests
+
+    for tries in range(1, SHARD_TRIES + 1):
+        try:
+            return get_entities(qids, backoff(tries))
+        except requests.RequestException as e:
+            if tries == SHARD_TRIES:
+                raise
+            print(f"Reading {qids[0]} to {qids[-1]} failed ({str(e).split(' for url')[0]}), trying again.")
+
+
+# the value of a claim as QuickStatements writes it (items by their ID, strings as they are)
+def claim_value(claim: dict):
+    value = claim['mainsnak'].get('datavalue', {}).get('value')
+    return value.get('id') if isinstance(value, dict) else value
+
+
+# The current values of 'properties' of the items, one row per value. Items that do not exist (any more) have no rows,
+# items redirected to another one are read with the ID they were asked for. Read in batches of ENTITIES_BATCH_SIZE
+# items, several at the same time.
+@instrumented()
+def fetch_claims(qids, properties) -> pl.DataFrame:
+    qids = sorted(set(qids))
+    batches = [qids[start:start + ENTITIES_BATCH_SIZE] for start in range(0, len(qids), ENTITIES_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=ENTITIES_WORKERS) as pool:
+        results = list(pool.map(get_entities_retried, batches))
+
+    rows = []
+    for entities in results:
+        redirected = {entity['id']: qid for qid, entity in entities.items() if 'id' in entity}
+        for entity in entities.values():
+            if 'missing' in entity:
+                continue
+            qid = redirected.get(entity['id'], entity['id'])
+            for property in properties:
+                rows += [(qid, property, claim_value(claim)) for claim in entity.get('claims', {}).get(property, []) if claim.get('rank') != 'deprecated']
+    return pl.DataFrame(rows, schema={'qid': pl.String, 'property': pl.String, 'value': pl.String}, orient='row').unique(maintain_order=True)
+
+
+# The claims of the upload that FactGrid does not have (yet): values that were to be added but are missing and values
+# that were to be removed but are still there
+def missing_claims(expected_df: pl.DataFrame, claims_df: pl.DataFrame) -> pl.DataFrame:
+    found_df = expected_df.join(claims_df.with_columns(pl.lit(True).alias('found')), on=['qid', 'property', 'value'], how='left')
+    return found_df.filter(pl.col('found').fill_null(False) == pl.col('remove')).drop('found')
+
+
+# the crosswalk with the values of the items in claims_df (read after the upload) instead of the downloaded ones
+def patch_crosswalk(crosswalk_df: pl.DataFrame, qids, claims_df: pl.DataFrame) -> pl.DataFrame:
+    values_df = pl.DataFrame({'FactGrid_ID': sorted(set(qids))}, schema={'FactGrid_ID': pl.String})
+    for property, column in CROSSWALK_PROPERTIES.items():
+        values_df = values_df.join(
+            claims_df.filter(pl.col('property') == property).group_by('qid').agg(pl.col('value').sort().alias(column)),
+            left_on='FactGrid_ID', right_on='qid', how='left',
+        ).with_columns(pl.col(column).fill_null(pl.lit([], dtype=pl.List(pl.String))))
+    return crosswalk_df.update(values_df, on='FactGrid_ID')
+
+
+# Reads the items changed by the QuickStatements CSV file at 'path' and prints the claims that FactGrid does not have
+# (yet). The stored download of the persons is updated with the values the items have now and saved as an artefact of
+# 'step'. Returns the persons with a WIAG-ID as load_fg_wiag_ids does and the missing claims.
+@instrumented()
+def verify_upload(directory: str, path: str, step: str) -> tuple:
+    expected_df = read_quickstatements_csv(path)
+    qids = expected_df.get_column('qid').unique().to_list()
+    claims_df = fetch_claims(qids, sorted(set(expected_df.get_column('property')) | set(CROSSWALK_PROPERTIES)))
+    missing_df = missing_claims(expected_df, claims_df)
+    print(f"{expected_df.height - missing_df.height} of {expected_df.height} changes of {len(qids)} items are on FactGrid.")
+
+    crosswalk_df = load_artefact(directory, PERSON_CROSSWALK_ARTEFACT)
+    if crosswalk_df is None:
+        raise FileNotFoundError(f"There is no stored download of the persons in {directory}, download them with load_fg_wiag_ids.")
+    crosswalk_df = patch_crosswalk(crosswalk_df, qids, claims_df)
+    save_artefact(directory, PERSON_CROSSWALK_ARTEFACT, crosswalk_df, step, sources={FG_SPARQL_URL: hashlib.sha256(PERSON_CROSSWALK_QUERY.encode()).hexdigest()})
+    return (fg_wiag_ids(crosswalk_df), missing_df)
@@ -0,0 +1,75 @@
+import json
+import os
+from datetime import datetime
+from scripts.artefacts import CACHE_DIR_NAME
+
+# WIAG redirects the IDs of merged persons to the ID of the person they were merged into. The redirects found so far
+# are kept as a union-find forest (every ID points to the ID it was merged into, the roots are the current IDs) in the
+# .cache directory of the input folder, so the IDs can be resolved without asking WIAG again. The IDs in the WIAG
+# export are current and always roots.
+# Only the links are stored, not which roots are current: a root can be merged into another person later, and the
+# check of notebook 2 needs the FactGrid-ID that WIAG has for the current person, which only the export or a response
+# of this run give. A stored redirect therefore only saves the request if its root is in the current export; the others
+# (e.g. persons of corpora that are not exported) are still requested from WIAG.
+
+REDIRECTS_FILE = 'wiag_redirects.json'
+
+
+def redirects_path(directory: str) -> str:
+    return os.path.join(directory, CACHE_DIR_NAME, REDIRECTS_FILE)
+
+
+# 'parent' maps outdated IDs to the ID they redirect to, 'current' holds the IDs known to be current (not stored,
+# they come from the export and the responses of this run)
+def load_redirects(directory: str) -> dict:
+    parent = {}
+    path = redirects_path(directory)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            parent = json.load(f)['redirects']
+    return {'parent': parent, 'current': set()}
+
+
+def save_redirects(directory: str, redirects: dict):
+    # compressed first, so every stored ID points to the current one directly
+    for wiag_id in list(redirects['parent']):
+        find(redirects, wiag_id)
+    os.makedirs(os.path.join(directory, CACHE_DIR_NAME), exist_ok=True)
+    with open(redirects_path(directory), 'w', encoding='utf-8') as f:
+        json.dump({'updated': datetime.now().isoformat(timespec='seconds'), 'redirects': redirects['parent']}, f, indent=1, sort_keys=True)
+
+
+# the current ID for wiag_id - the path to it is compressed on the way, so it is only walked once
+def find(redirects: dict, wiag_id: str) -> str:
+    parent = redirects['parent']
+    root = wiag_id
+    while root in parent:
+        root = parent[root]
+    while wiag_id != root:
+        (parent[wiag_id], wiag_id) = (root, parent[wiag_id])
+    return root
+
+
+def add_redirect(redirects: dict, old_id: str, new_id: str):
+    old_root = find(redirects, old_id)
+    new_root = find(redirects, new_id)
+    if old_root != new_root:
+        redirects['parent'][old_root] = new_root
+    redirects['current'].discard(old_root)
+    redirects['current'].add(new_root)
+
+
+# IDs that WIAG lists as they are (e.g. the IDs of the export) - a stored redirect of one of them is outdated
+def add_current(redirects: dict, wiag_ids):
+    for wiag_id in wiag_ids:
+        redirects['parent'].pop(wiag_id, None)
+        redirects['current'].add(wiag_id)
+
+
+# the current ID for every ID, or None where it is not known (yet)
+def resolve(redirects: dict, wiag_ids) -> list:
+    resolved = []
+    for wiag_id in wiag_ids:
+        root = find(redirects, wiag_id)
+        resolved.append(root if root in redirects['current'] else None)
+    return resolved
@@ -12,35 +12,34 @@
 #
 
 #%%
-import requests
-import csv
 import os
-import json
-import re
-import time
-from datetime import datetime, timezone, date
-import math
+from datetime import datetime, date
 import traceback
 import polars as pl
-import polars.selectors as cs
-from enum import Enum
+from scripts.ingest import read_export
+from scripts.manifest import register_input, print_input_status, cached, cache_key, frame_hash
+from scripts.instrumentation import start_trace, print_summary
+from scripts.quickstatements import STRING, write_csv
 
 today_string = datetime.now().strftime('%Y-%m-%d')
+start_trace('wiag_to_factgrid')
 
 #%% [markdown]
-#For the automatic translation, AI models hosted by the GWDG are used. For this a [SAIA](https://docs.hpc.gwdg.de/services/saia/index.html) API key is needed. You can either uncomment the line in the cell below and replace the placeholder with your key or (safer option) create a text-file (called `.env`) in the project directory containing `API_KEY="PLACEHOLDER"` (with your key inserted) before running the cell below.
+#For the automatic translation, AI models hosted by the GWDG are used. For this a [SAIA](https://docs.hpc.gwdg.de/services/saia/index.html) API key is needed. You can either uncomment the line in the cell below and replace the placeholder with your key or (safer option) create a text-file (called `.env`) in the project directory containing `API_KEY="PLACEHOLDER"` (with your key inserted) before running the cell below. The key is only needed once the first translation is started.
 
 #%%
-#API_KEY="PLACEHOLDER"
+#os.environ["API_KEY"] = "PLACEHOLDER"
 
 import scripts.translate
 
 #%% [markdown]
 #The cell below defines where input files can be found and where the generated files will be saved to. 
 #%%
-input_path = r"C:\Users\Public\sync_notebooks\input_files"
+from scripts.paths import INPUT_PATH, OUTPUT_PATH
 
-output_path = r"C:\Users\Public\sync_notebooks\output_files"
+input_path = INPUT_PATH # the folder set in the .env file, see scripts/paths.py
+
+output_path = OUTPUT_PATH
 
 #%% [markdown]
 ### 2. Download data from WIAG
@@ -63,7 +62,8 @@ output_path = r"C:\Users\Public\sync_notebooks\output_files"
 #%%
 input_file = f'role.csv'
 input_path_file = os.path.join(input_path, input_file)
-wiag_roles_df = pl.read_csv(input_path_file, null_values="NULL")
+wiag_roles_df = read_export(input_path_file, 'role')
+print_input_status(input_file, register_input(input_path_file, 'role', source = 'queries/get_wiag_roles.sql'))
 len(wiag_roles_df)
 
 #%% [markdown]
@@ -90,18 +90,19 @@ else:
     input_file = f'WIAG-Domherren-DB-Ämter-' + domstift + '.csv'
 
 input_path_file = os.path.join(input_path, input_file)
-wiag_offices_df = pl.read_csv(input_path_file, separator=';', infer_schema_length = None)
+wiag_offices_df = read_export(input_path_file, 'aemter')
 len(wiag_offices_df)
 
 #%%
-last_modified = datetime.fromtimestamp(os.path.getmtime(input_path_file))
-now = datetime.now()
-assert last_modified.day == now.day and last_modified.month == now.month, f'The file was last updated on {last_modified.strftime('%d.%m')}'
+offices_input = register_input(input_path_file, 'aemter', source = 'https://wiag-vocab.adw-goe.de/query/can (Export->Amtsdaten)')
+print_input_status(input_file, offices_input)
 
 #%% [markdown]
 ##### Troubleshooting: Old file used
 #
-#You get an error when you run the line above if the file was not updated today.
+#The cell above records the file (content hash, number of rows, download time) in the `manifest.json` in the `input_path` directory. If the content did not change since the last run, the results of the slow steps below (finding the dioceses and the institution roles) are loaded from the cache instead of being computed again.
+#
+#You get a warning when you run the cell above if the file was not downloaded today.
 #Suggested solutions: 
 #* update the file again by downloading it again
 #* if you downloaded the data today, check the file name in input_file. It's pointing to a file that has old data.
@@ -113,11 +114,14 @@ assert last_modified.day == now.day and last_modified.month == now.month, f'The
 #Troubleshooting: If the following cell throws an error, try rerunning the cell. Its probably just a connection problem.
 #
 #This cell downloads institutions (items with a Klosterdatenbank-ID), institution roles (items of type Q257052) and dioceses (items that are a diocese or a subclass of diocese) from FactGrid.
+#
+#The data is stored in the `.cache` folder of the `input_path` directory. If it was downloaded less than an hour ago, the stored data is used. Otherwise only the entries that were changed on FactGrid since the last download are loaded again. If you just created entries on FactGrid and they are still missing below, run the cell with `full_refresh = True` to download everything again.
 
 #%%
-from scripts.wiag_to_factgrid_functions import load_fg_data
+from scripts.fg_reference import load_fg_reference
 
-(factgrid_institution_df, factgrid_diocese_df, factgrid_inst_roles_df) = load_fg_data()
+fg_reference = load_fg_reference(input_path, full_refresh = False)
+(factgrid_institution_df, factgrid_diocese_df, factgrid_inst_roles_df) = (fg_reference.institution_df, fg_reference.diocese_df, fg_reference.inst_roles_df)
 
 #%% [markdown]
 #### Check for possible institution duplicates
@@ -138,38 +142,34 @@ factgrid_institution_df = factgrid_institution_df.filter(pl.col('fg_gsn_id').is_
 ### 4. Join the data
 
 #%% [markdown]
-#First the WIAG "Amtsdaten" for Domherren export is joined with institution data from FactGrid
+#The WIAG "Amtsdaten" for Domherren export is joined with the institutions, dioceses, roles and institution roles on FactGrid. All of these joins (steps 4 to 8) are one plan (`office_plan` in `scripts/wiag_to_factgrid_functions.py`) that is computed at once below; the following steps show the entries that are left out on the way.
+#
+#First the dioceses are searched: for each combination of diocese ID and name of the offices, the associated diocese is searched in the factgrid_diocese_df dataframe. The diocese is found by first searching for the WIAG-ID. Only if no entry was found, the search continues with the diocese's name, first in the diocese label and lastly, if the search was unsuccessfull again, in the diocese alt label.
 
 #%%
-wiag_offices_df = wiag_offices_df.join(factgrid_institution_df, how='left', left_on='institution_id', right_on='fg_gsn_id')
+#search the fg dioceses - only computed again if the offices or the dioceses on FactGrid changed
+from scripts.wiag_to_factgrid_functions import resolve_dioceses
+
+dioc_key = cache_key(offices_input['sha256'], frame_hash(factgrid_diocese_df))
+dioceses_df = cached(input_path, 'resolved_dioceses', dioc_key, lambda: resolve_dioceses(wiag_offices_df, fg_reference))
 
 #%% [markdown]
-#Next the diocese data is added.
-#
-#For each entry in the input dataframe, the associated diocese is searched in the factgrid_diocese_df dataframe. The diocese is found by first searching for the WIAG-ID. Only if no entry was found, the search continues with the diocese's name, first in the diocese label and lastly, if the search was unsuccessfull again, in the diocese alt label.
+#Next the institution roles on FactGrid are searched for each combination of role, institution and diocese (see step 7).
 
 #%%
-#join with fg dioceses
-rows = []
-query = pl.DataFrame() # empty initialisation to enable the call of the clear function below
+#the matching is only done again if the offices, the roles or the institution roles on FactGrid changed
+from scripts.wiag_to_factgrid_functions import match_inst_roles
 
-for row in wiag_offices_df.iter_rows(named = True):
-    query = query.clear()
+inst_role_key = cache_key(offices_input['sha256'], frame_hash(wiag_roles_df), frame_hash(factgrid_inst_roles_df))
+inst_roles_df = cached(input_path, 'inst_role_keys', inst_role_key, lambda: match_inst_roles(wiag_offices_df, wiag_roles_df, fg_reference))
 
-    if row['diocese_id'] != None:
-        query = factgrid_diocese_df.filter(pl.col('dioc_wiag_id') == row['diocese_id'])
-        
-    if query.is_empty() and row['diocese'] != None:
-        query = factgrid_diocese_df.filter(pl.col('dioc_label') == row['diocese'])
-        
-        if query.is_empty():
-            query = factgrid_diocese_df.filter(pl.col('dioc_alt') == row['diocese'])
+#%% [markdown]
+#Now all joins are computed together. If you change one of the lists in step 5, rerun the cells from here.
 
-    if not query.is_empty():
-        rows.append({'role_all-id': row['id'], 'fg_diocese_id': query.row(0)[0]})
-    # #TODO should cases where no result was found be noted/handled?
+#%%
+from scripts.wiag_to_factgrid_functions import office_plan, collect_offices
 
-wiag_offices_df = wiag_offices_df.join(pl.DataFrame(rows), how = 'left', left_on = 'id', right_on = 'role_all-id')
+office_frames = collect_offices(office_plan(wiag_offices_df, factgrid_institution_df, wiag_roles_df, dioceses_df, inst_roles_df))
 
 #%% [markdown]
 ### 5. Missing institutions
@@ -178,42 +178,21 @@ wiag_offices_df = wiag_offices_df.join(pl.DataFrame(rows), how = 'left', left_on
 #### Check for special cases
 #
 #These lists below allow the code below to identify if the role is missing an institution or if the role doesn't require one at all.
-#* The `unbound_role_groups` list contains the role_groups that are not bound to a place at all.
-#* The `diocese_role_groups` list contains the role_groups that are bound to a diocese but not an institution.
-#  * `diocese_role_group_exception_roles` contains roles that belong to this group but are still bound to an institution.
-#Please add more role_groups or roles to the lists if necessary.
-
-#%%
-unbound_role_groups = [
-    'Kurienamt',
-    'Papst',
-    'Kardinal',
-]
-diocese_role_groups = [
-    'Oberstes Leitungsamt Diözese',
-    'Leitungsamt Diözese',
-    'Bischöfliches Hilfspersonal',
-]
-diocese_role_group_exception_roles = [ 
-    'Erzbischöflicher Prokurator',
-]
-
-#%%
-#select all entries that should contain an institution on FactGrid but don't have it after the join operation
-missing_inst_df = wiag_offices_df.filter(
-    pl.col('fg_institution_id').is_null() &
-    pl.col('role_group').is_in(unbound_role_groups).not_() &
-    pl.col('role_group').is_in(diocese_role_groups).not_()
-)
-print(str(missing_inst_df.height) + " entries with missing institution id in FG")
+#* The `UNBOUND_ROLE_GROUPS` list contains the role_groups that are not bound to a place at all.
+#* The `DIOCESE_ROLE_GROUPS` list contains the role_groups that are bound to a diocese but not an institution.
+#  * `DIOCESE_ROLE_GROUP_EXCEPTION_ROLES` contains roles that belong to this group but are still bound to an institution.
+#The lists are defined in `scripts/wiag_to_factgrid_functions.py` (so the batch mode uses the same lists). Please add more role_groups or roles to the lists there if necessary.
 
-#select all entries that should contain a diocese on FactGrid but don't have it after the join operation
-missing_dioc_df = wiag_offices_df.filter(
-    pl.col('fg_diocese_id').is_null() & 
-    pl.col('role_group').is_in(unbound_role_groups).not_() & 
-    pl.col('role_group').is_in(diocese_role_groups) &
-    pl.col('name').is_in(diocese_role_group_exception_roles).not_()
-)
+#%%
+from scripts.wiag_to_factgrid_functions import UNBOUND_ROLE_GROUPS, DIOCESE_ROLE_GROUPS, DIOCESE_ROLE_GROUP_EXCEPTION_ROLES, IGNORED_ROLES
+
+print("role_groups not bound to a place:", UNBOUND_ROLE_GROUPS)
+print("role_groups bound to a diocese:", DIOCESE_ROLE_GROUPS, "except for the roles", DIOCESE_ROLE_GROUP_EXCEPTION_ROLES)
+
+#%%
+#select all entries that should contain an institution or a diocese on FactGrid but don't have it after the join operation
+(missing_inst_df, missing_dioc_df) = (office_frames['missing_institutions'], office_frames['missing_dioceses'])
+print(str(missing_inst_df.height) + " entries with missing institution id in FG")
 print(str(missing_dioc_df.height) + " entries with missing diocese id in FG")
 
 #%% [markdown]
@@ -221,7 +200,7 @@ print(str(missing_dioc_df.height) + " entries with missing diocese id in FG")
 #
 #
 #
-#Any roles showing up here need to be added to the `diocese_role_group_exception_roles` list if they don't need a diocese entry in FactGrid. If you added a name to the `diocese_role_group_exception_roles` list, rerun the cells from the start of step 5 to make sure the change is propagated.
+#Any roles showing up here need to be added to the `DIOCESE_ROLE_GROUP_EXCEPTION_ROLES` list if they don't need a diocese entry in FactGrid. If you added a name to the `DIOCESE_ROLE_GROUP_EXCEPTION_ROLES` list, rerun the cells from the end of step 4 to make sure the change is propagated.
 #
 #
 #
@@ -261,6 +240,16 @@ missing_inst_df.filter(pl.col('institution_id').is_null())
 #%%
 missing_dioc_df.filter(pl.col('diocese_id').is_null())
 
+#%% [markdown]
+##### Similar dioceses on FactGrid
+#
+#For the missing dioceses the most similar dioceses on FactGrid (by label and alternative label) are listed with a similarity score between 0 and 1. If one of them is the right diocese, add the WIAG-ID or the missing label to it on FactGrid instead of creating a new entry.
+
+#%%
+from scripts.label_index import with_candidates
+
+with_candidates(missing_dioc_df.select('diocese', 'diocese_id').unique(), 'diocese', fg_reference.diocese_index)
+
 #%% [markdown]
 #### Missing institutions
 #
@@ -277,19 +266,23 @@ create_institution_factgrid_df = missing_inst_df.filter(pl.col('institution_id')
 
 create_institution_factgrid_df
 
+#%% [markdown]
+#Institutions on FactGrid with a similar label. If one of them is the missing institution, add the GSN (P471) to it on FactGrid instead of creating it.
+
+#%%
+with_candidates(create_institution_factgrid_df.select('Lde', 'P471'), 'Lde', fg_reference.institution_index)
+
 #%% [markdown]
 ### 6. Missing roles
 #
 #These roles do not include the institution information. In other words, this step adds roles to FactGrid like 'archbishop' and not 'archbishop of trier'
 #%% [markdown]
 #### Remove all missing (institution and diocese) entries **
+#
+#The entries missing an institution or diocese are left out of the following joins.
 
 #%%
-all_missing_entries = pl.concat([missing_inst_df, missing_dioc_df], how = "diagonal")
-
-dioc_joined_df = wiag_offices_df.remove(pl.col("id").is_in(all_missing_entries.get_column("id").implode()))
-
-print("From originally " + str(wiag_offices_df.height) + " rows, " + str(dioc_joined_df.height) + " rows, that are not missing an institution or diocese, are left.")
+print("From originally " + str(wiag_offices_df.height) + " rows, " + str(wiag_offices_df.height - missing_inst_df.height - missing_dioc_df.height) + " rows, that are not missing an institution or diocese, are left.")
 
 #%% [markdown]
 #### Check for special cases
@@ -305,18 +298,17 @@ wiag_roles_df.filter(pl.col("name").is_duplicated())
 ##### Check for missing roles in WIAG role table
 
 #%%
-missing_roles_wiag = dioc_joined_df.filter(pl.col("name").is_in(wiag_roles_df.get_column("name").implode()).not_()).unique()
+missing_roles_wiag = office_frames['missing_roles_wiag']
 print(missing_roles_wiag.height)
 missing_roles_wiag.head()
 
 #%% [markdown]
 ##### Join role_fg_id attribute from WIAG
+#
+#The role_fg_id is joined from the WIAG role table without the roles with multiple entries.
 
 #%%
-wiag_roles_df = wiag_roles_df.remove(pl.col("name").is_duplicated())
-
-joined_df = dioc_joined_df.join(wiag_roles_df.rename({'id' : 'role_id', 'factgrid_id': 'role_fg_id'}), on = "name", how = "left")
-
+unique_roles_df = wiag_roles_df.remove(pl.col("name").is_duplicated())
 
 #%% [markdown]
 ##### Ignore all Kanonikatsbewerber and Vikariatsbewerber roles/offices
@@ -324,13 +316,13 @@ joined_df = dioc_joined_df.join(wiag_roles_df.rename({'id' : 'role_id', 'factgri
 #The 'bewerber' suffix means, that this person was applying for this office, so these are not proper offices and don't need to be / shouldn't be added to FactGrid.
 
 #%%
-joined_df = joined_df.remove(pl.col('name').is_in(['Vikariatsbewerber', 'Kanonikatsbewerber', 'Domherr, Anwärter']))
+print("ignored roles:", IGNORED_ROLES)
 
 #%% [markdown]
 ##### Entries with missing FactGrid-entries for the roles in wiag
 
 #%%
-missing_roles_df = joined_df.filter(pl.col('role_fg_id').is_null())
+missing_roles_df = office_frames['missing_roles']
 print(str(missing_roles_df.height) + " entries are missing a role in FactGrid.\n")
 
 print("Roles that are not yet in FactGrid:")
@@ -348,14 +340,14 @@ missing_roles
 #After checking/correcting the translations and adding descriptions or removing the columns, you can copy the content of the generated file (name: `create-missing-roles_<date>.csv`) and paste it into the textfield on quickstatements. As mentioned above, you can either do this right away or at the end.
 
 #%% [markdown]
-#This cell generates the translations of the labels. This can take a few minutes.
+#This cell generates the translations of the labels. Labels made of known role terms and a place (e.g. "Domherr Domstift Bamberg") are translated right away with the glossary in `scripts/glossary.py`, only the others are sent to the AI model. This can take a few minutes.
 
 #%%
 system_prompt = """**Role:** You are a professional translator specializing in historical and religious terminology, with expertise in German–English translation.
     **Task:** You will receive a German name for a role or occupation. Your task is to return the most accurate and context-appropriate English translation.
     **Format:** Only return the translation. Do not add any remarks or formatting. Always start the translation with a capital letter."""
     
-create_missing_roles_df = scripts.translate.translate(missing_roles.rename({"name" : "Lde"}), system_prompt)
+create_missing_roles_df = scripts.translate.translate_with_glossary(missing_roles.rename({"name" : "Lde"}), system_prompt)
 
 #%% [markdown]
 #this cell generates the file and show a sample of the content
@@ -374,7 +366,7 @@ create_missing_roles_df = create_missing_roles_df.with_columns(
     ["qid",	"Lde",	"Len",	"Dde",	"Den",	"P2",	"P131",	"item_id",	"P3"]
 )
 
-create_missing_roles_df.write_csv(os.path.join(output_path, f"create-missing-roles_{today_string}.csv"))
+write_csv(create_missing_roles_df, os.path.join(output_path, f"create-missing-roles_{today_string}.csv"))
 print(f'{create_missing_roles_df.height} rows were written. Here is a sample of them:')
 if create_missing_roles_df.height >= 3:
     display(create_missing_roles_df.sample(n=3))
@@ -386,29 +378,21 @@ else:
 #
 #### Remove all missing (role) entries now **
 #
-#The code below removes all the entries that failed the join with the WIAG role join above.
-
-#%%
-with_roles_in_fg_df = joined_df.remove(pl.col('role_fg_id').is_null())
+#All the entries that failed the join with the WIAG role join above are left out from here on.
 
 #%% [markdown]
 #### Check for people with missing FactGrid-entries or missing FactGrid-IDs in wiag
 #
 #There generally shouldn't be any such persons, since notebook 3 takes care of this.
 #%%
-missing_people_list = with_roles_in_fg_df.filter(pl.col('FactGrid').is_null()).unique('person_id')
+missing_people_list = office_frames['missing_persons']
 print(missing_people_list.height)
 if missing_people_list.height >= 3:
     missing_people_list.sample(n = 3)
 #%% [markdown]
 #To generate quickstatements for creating the persons, go back to [notebook 3](fg_import_persons.ipynb) (fg_import_persons).
 #
-#The code below removes all the entries for persons that don't exist on FactGrid
-
-#%%
-print(len(with_roles_in_fg_df))
-with_roles_in_fg_df = with_roles_in_fg_df.filter(pl.col('FactGrid').is_not_null())
-print(len(with_roles_in_fg_df))
+#The entries for persons that don't exist on FactGrid are left out from here on.
 
 #%% [markdown]
 #### Find out which institution roles are missing on FactGrid
@@ -416,53 +400,13 @@ print(len(with_roles_in_fg_df))
 #these roles have information of the institution as well
 
 #%%
-#in addition to the parameters, this uses the dataframe factgrid_inst_roles_df directly
-
-def find_fg_inst_role(name, inst, dioc):
-    search_result = pl.DataFrame()
-    if inst == None:
-        if dioc != None: # TODO handle cases where inst and dioc are None? - should only be true for [35, 48, 49] Kardinal, Papst, Kurienamt (except maybe special role_groups)
-            if name not in ["Archidiakon", "Koadjutor"]:
-                dioc = dioc.lstrip('Bistum').lstrip('Erzbistum').lstrip('Patriarchat').lstrip()
-            if name == "Fürstbischof" and dioc in ["Passau", "Straßburg"]:
-                name = "Bischof"    
-            search_result = factgrid_inst_roles_df.filter(pl.col('inst_role').str.contains(f"^{name}.*{dioc}"))
-            if name == "Erzbischof" and dioc == "Salzburg":
-                # will be merged in later # TODO what does this mean and why?
-                search_result = factgrid_inst_roles_df.filter(pl.col('fg_inst_role_id') == 'Q172567')
-    else:
-        name = name.replace('Domkanoniker', 'Domherr')
-        search_result = factgrid_inst_roles_df.filter(pl.col('inst_role') == f"{name} {inst}")
-    
-    return search_result
+#the offices with exactly one institution role on FactGrid are joined with it as fg_inst_role_id (used in the last part) - in other words, these are the institution roles that are assigned on FactGrid
+#not_found is used for creating institution roles (e.g. bishop of ...) in the next cell
+#dupl contains the entries that are ignored, because they need to be fixed manually
+not_found_df = office_frames['missing_inst_roles']
+dupl = office_frames['duplicate_inst_roles']
 
-#%%
-data_dict = [] # joined to the main df as fg_inst_role_id (used in the last part) - in other words, these are the institution roles that are assigned on FactGrid
-not_found = [] # used for creating institution roles (e.g. bishop of ...) in the next cell
-dupl = {} # these entries are ignored, because they need to be fixed manually
-
-i = 0
-for (id, name, inst, inst_id, dioc) in with_roles_in_fg_df.select('id', 'name', 'institution', 'institution_id', 'diocese').iter_rows():
-    # Kardinal receives insitution role Q254893 manually -- probably simply handling a simple special case first
-    if name == "Kardinal":
-        data_dict.append((id,"Q254893"))
-        continue
-    
-    search_result = find_fg_inst_role(name, inst, dioc)
-
-    if search_result.is_empty() or len(search_result) == 0:
-        # TODO entries without institution entry in WIAG are simply ignored - makes sense if dioc is set?? (diocese level roles)
-        not_found.append((name, inst, inst_id))
-    elif len(search_result) == 1:
-        data_dict.append((id, search_result['fg_inst_role_id'][0]))
-    elif len(search_result) >= 2:
-        dupl[i] = (name, inst, dioc, search_result)
-    
-    i += 1
-
-factgrid_inst_roles = pl.DataFrame(data_dict, schema = ['id', 'fg_inst_role_id'], orient = 'row')
-
-print("Roles found:", factgrid_inst_roles.height, "duplicates:", len(dupl), "not found:", len(not_found))
+print("Roles found:", office_frames['offices'].height, "duplicates:", dupl.height, "not found:", not_found_df.height)
 
 #%% [markdown]
 #### Generate missing institution roles file
@@ -472,7 +416,6 @@ print("Roles found:", factgrid_inst_roles.height, "duplicates:", len(dupl), "not
 #Once again you also need to either add descriptions (for all the rows) or remove the description columns. Afterwards you can copy the content of the generated file (name: `create-missing-inst-roles_<date>.csv`) and paste it into the textfield on quickstatements.
 
 #%%
-not_found_df = pl.DataFrame(not_found, orient = 'row', schema = ['role', 'institution', 'institution_id'])
 not_found_df = not_found_df.drop_nulls() # remove entries for diocese level roles 
 
 #not_found contains an entry per row where a combination was not found - here we want just one row per unique combination
@@ -482,7 +425,7 @@ not_found_df = not_found_df.unique()
 
 #add role details
 not_found_df = not_found_df.join(
-    wiag_roles_df.rename({'id' : 'role_id', 'factgrid_id': 'role_fg_id'}), how='left', left_on='role', right_on='name'
+    unique_roles_df.rename({'id' : 'role_id', 'factgrid_id': 'role_fg_id'}), how='left', left_on='role', right_on='name'
 )
 #add instution details
 not_found_df = not_found_df.join(factgrid_institution_df, how='left', left_on='institution_id', right_on='fg_gsn_id')
@@ -493,14 +436,20 @@ not_found_df = not_found_df.with_columns(Lde = pl.col('role') + ' ' + pl.col('in
 print(f"{not_found_df.height} institution roles will be created!")
 
 #%% [markdown]
-#This cell generates the translations of the labels. This can take a few minutes.
+#Institution roles on FactGrid with a similar label. If one of them is the same role (e.g. a slightly different spelling of the institution), fix its label on FactGrid and rerun the matching instead of creating the role again.
+
+#%%
+with_candidates(not_found_df.select('Lde', 'institution_id'), 'Lde', fg_reference.inst_role_index)
+
+#%% [markdown]
+#This cell generates the translations of the labels. Labels made of known role terms and a place known from the dioceses and institutions on FactGrid (e.g. "Domherr Domstift Bamberg") are translated right away with the glossary in `scripts/glossary.py`, only the others are sent to the AI model. This can take a few minutes.
 
 #%%
 system_prompt = """**Role:** You are a professional translator specializing in historical and religious terminology, with expertise in German–English translation.
     **Task:** You will receive a German name for a role or occupation including a place that this role is associated with. Your task is to return the most accurate and context-appropriate English translation.
     **Format:** Only return the translation. Do not add any remarks or formatting. Always start the translation with a capital letter."""
 
-create_miss_inst_roles = scripts.translate.translate(not_found_df, system_prompt)
+create_miss_inst_roles = scripts.translate.translate_with_glossary(not_found_df, system_prompt, role_column = 'role', institution_column = 'institution', places = fg_reference.place_names)
 
 #%% [markdown]
 #this cell generates the file and show a sample of the content
@@ -516,11 +465,11 @@ create_miss_inst_roles = create_miss_inst_roles.with_columns(
     P3 = pl.col('role_fg_id'),
     P267 = pl.col('fg_institution_id'),
     # id is the number of the role in the role table in WIAG -- institution_id is the klosterdatenbank id of the institution
-    P1100 = '"off' + pl.col('role_id').cast(str) + '_gsn' + pl.col('institution_id').cast(str) + '"'
+    P1100 = 'off' + pl.col('role_id').cast(str) + '_gsn' + pl.col('institution_id').cast(str)
 ).select(['qid', 'Lde', 'Len', 'Dde', 'Den', 'P2', 'P131', 'P3', 'P267', 'P1100']) # selecting only relevant columns
 
 #export to csv file
-create_miss_inst_roles.write_csv(os.path.join(output_path, f"create-missing-inst-roles_{today_string}.csv"))
+write_csv(create_miss_inst_roles, os.path.join(output_path, f"create-missing-inst-roles_{today_string}.csv"), {'P1100': STRING})
 print(f'{create_miss_inst_roles.height} rows were written. Here is a sample of them:')
 if create_miss_inst_roles.height >= 3:
     display(create_miss_inst_roles.sample(n = 3))
@@ -532,251 +481,29 @@ else:
 #
 #### Ignore all missing (inst role) entries now **
 #
-#The code below ignores entries that are generated above and does a join without them.
+#The entries that are generated above are ignored, the offices are only joined with the institution roles that were found.
 
 #%%
-final_joined_df = with_roles_in_fg_df.join(factgrid_inst_roles, on = 'id')
+final_joined_df = office_frames['offices']
 print(len(final_joined_df))
 final_joined_df.sample(n = 3)
 
 #%% [markdown]
 #### Parse dates
 #
-#The following code parses the date information present in the date_begin or date_end string and converts it to the correct property in FactGrid and it's corresponding value.
+#The function `date_parsing` (in `scripts/wiag_to_factgrid_functions.py`) parses the date information present in the date_begin or date_end string and converts it to the correct property in FactGrid and it's corresponding value.
 #There are also testcases which are run in case you want to modify it.
 #Here is an overview of relevant FactGrid properties: [link](https://database.factgrid.de/query/embed.html#SELECT%20%3FPropertyLabel%20%3FProperty%20%3FPropertyDescription%20%3Freciprocal%20%3FreciprocalLabel%20%3Fexample%20%3Fuseful_statements%20%3Fwd%20WHERE%20%7B%0A%20%20SERVICE%20wikibase%3Alabel%20%7B%20bd%3AserviceParam%20wikibase%3Alanguage%20%22en%22.%20%7D%0A%20%20%3FProperty%20wdt%3AP8%20wd%3AQ77483.%0A%20%20OPTIONAL%20%7B%20%3FProperty%20wdt%3AP364%20%3Fexample.%20%7D%0A%20%20OPTIONAL%20%7B%20%3FProperty%20wdt%3AP86%20%3Freciprocal.%20%7D%0A%20%20OPTIONAL%20%7B%20%3FProperty%20wdt%3AP343%20%3Fwd.%20%7D%0A%20%20OPTIONAL%20%7B%20%3FProperty%20wdt%3AP310%20%3Fuseful_statements.%20%7D%0A%7D%0AORDER%20BY%20%3FPropertyLabel)
 
 #%%
-#defining an enum to more clearly define what type of date is being passed 
-class DateType(Enum):
-    ONLY_DATE = 0
-    BEGIN_DATE = 1
-    END_DATE = 2
-
-#date precision and calendar declaration (see Time at https://www.wikidata.org/wiki/Help:QuickStatements#Add_simple_statement)
-PRECISION_CENTURY = 7
-PRECISION_DECADE = 8
-PRECISION_YEAR = 9
-PRECISION_MONTH = 10
-PRECISION_DAY = 11
-JULIAN_ENDING = '/J'
-
-#defining some constants for better readability of the code:
-#self defined:
-JHS_GROUP = r'(Jhs\.|Jahrhunderts?)'
-JH_GROUP = r'(Jh\.|Jahrhundert)'
-EIGTH_OF_A_CENTURY = 13
-QUARTER_OF_A_CENTURY = 25
-TENTH_OF_A_CENTURY = 10
-
-ANTE_GROUP = "bis|vor|spätestens"
-POST_GROUP = "nach|frühestens|ab|zwischen" # NOTE: 'zwischen' does not actually fit into this group, but because the current strategy for 'zwischen 1087 und 1093' is to just take the first date with post quem, it makes sense to have it here
-CIRCA_GROUP = r"etwa|ca\.|um"
-#pre-compiling the most complex pattern to increase efficiency
-MOST_COMPLEX_PATTERN = re.compile(r'(wohl )?((kurz )?(' + ANTE_GROUP + '|' + POST_GROUP + r') )?((' + CIRCA_GROUP +r') )?(\d{3,4})(\?)?')
-
-#FactGrid properties:
-#simple date properties:
-DATE = 'P106' 
-BEGIN_DATE = 'P49'
-END_DATE = 'P50'
-#when there is uncertainty / when all we know is the latest/earliest possible date:
-DATE_AFTER = 'P41' # the earliest possible date for something
-DATE_BEFORE = 'P43' # the latest possible date for something
-END_TERMINUS_ANTE_QUEM = 'P1123' # latest possible date of the end of a period
-BEGIN_TERMINUS_ANTE_QUEM  = 'P1124' # latest possible date of the begin of a period
-END_TERMINUS_POST_QUEM = 'P1125' # earliest possible date of the end of a period
-BEGIN_TERMINUS_POST_QUEM = 'P1126' # earliest possible date of the beginning of a period
-
-NOTE = 'P73' # Field for free notes
-PRECISION_DATE = 'P467' # FactGrid qualifier for the specific determination of the exactness of a date
-PRECISION_BEGIN_DATE = 'P785'   # qualifier to specify a begin date
-PRECISION_END_DATE = 'P786'
-STRING_PRECISION_BEGIN_DATE = 'P787' # qualifier to specify a begin date; string alternate to P785
-STRING_PRECISION_END_DATE = 'P788'
-
-#qualifiers/options
-SHORTLY_BEFORE = 'Q255211'
-SHORTLY_AFTER = 'Q266009'
-LIKELY = 'Q23356'
-CIRCA = 'Q10'
-OR_FOLLOWING_YEAR = 'Q912616'
-
-def format_datetime(entry: datetime, precision: int):
-    ret_val =  f"+{entry.isoformat()}Z/{precision}"
-
-    if entry.year < 1582: # declaring that the julian calendar is being used by adding '/J' to the end
-        ret_val +=  JULIAN_ENDING
-    
-    #on FactGrid, if the date is at most accurate to a year, the day and month are set to 0. The datetime type in Python does not allow you to set the day or month to 0 so we need to replace it manually
-    if precision <= PRECISION_YEAR:
-        ret_val = ret_val.replace(f"{entry.year}-01-01", f"{entry.year}-00-00", 1)
-    elif precision == PRECISION_MONTH:
-        ret_val = ret_val.replace(f"{entry.year}-{entry.month}-01", f"{entry.year}-{entry.month}-00", 1)
-
-    return ret_val
-
-def date_parsing(date_string: str, date_type: DateType):
-    qualifier = ""
-    precision = PRECISION_CENTURY
-
-    ante_property = (match := re.search(ANTE_GROUP, date_string))
-    post_property = (match := re.search(POST_GROUP, date_string))
-    assert(not ante_property or not post_property)
-
-    #only_date means there is only one date, not a 'begin date' and an 'end date'    
-    match date_type:
-        case DateType.ONLY_DATE:
-            string_precision_qualifier_clause = NOTE
-            exact_precision_qualifier = PRECISION_DATE
-            if ante_property:
-                return_property = DATE_BEFORE
-            elif post_property:
-                return_property = DATE_AFTER
-            else:
-                return_property = DATE
-        case DateType.BEGIN_DATE:
-            string_precision_qualifier_clause = STRING_PRECISION_BEGIN_DATE
-            exact_precision_qualifier = PRECISION_BEGIN_DATE
-            if ante_property:
-                return_property = BEGIN_TERMINUS_ANTE_QUEM
-            elif post_property:
-                return_property = BEGIN_TERMINUS_POST_QUEM
-            else:
-                return_property = BEGIN_DATE
-        case DateType.END_DATE:
-            string_precision_qualifier_clause = STRING_PRECISION_END_DATE
-            exact_precision_qualifier = PRECISION_END_DATE
-            if ante_property:
-                return_property = END_TERMINUS_ANTE_QUEM
-            elif post_property:
-                return_property = END_TERMINUS_POST_QUEM
-            else:
-                return_property = END_DATE
-        case _:
-            assert False, "Unexpected DateType!"
-        
-    string_precision_qualifier_clause += f'\t"{date_string}"'
-
-    if date_string == '?':
-        return tuple()
-    
-    # something like: 12. Jahrhundert
-    if matches := re.match(r'(\d{1,2})\. ' + JH_GROUP, date_string):
-        year = 100 * int(matches.group(1))
-    
-    # something like: 2. Hälfte des 12. Jahrhunderts
-    elif matches := re.match(r'(\d)\. Hälfte (des )?(\d{1,2})\. ' + JHS_GROUP, date_string):
-        half = int(matches.group(1)) - 1
-        centuries = int(matches.group(3)) - 1
-        year   = centuries * 100 + (half * 50) + QUARTER_OF_A_CENTURY
-        qualifier = string_precision_qualifier_clause
-    
-    elif matches := re.match(r'(\w+) Viertel des (\d{1,2})\. ' + JHS_GROUP, date_string):
-        number_map = {
-            "erstes":  0,
-            "zweites": 1,
-            "drittes": 2,
-            "viertes": 3,
-        }
-        quarter = matches.group(1)
-        centuries = int(matches.group(2))
-        year = (centuries - 1) * 100 + (number_map[quarter] * 25) + EIGTH_OF_A_CENTURY
-        qualifier = string_precision_qualifier_clause
-
-    elif matches := re.match(r'frühes (\d{1,2})\. ' + JH_GROUP, date_string):
-        centuries = int(matches.group(1)) - 1
-        year = centuries * 100 + TENTH_OF_A_CENTURY
-        qualifier = string_precision_qualifier_clause
-
-    elif matches := re.match(r'spätes (\d{1,2})\. ' + JH_GROUP, date_string):
-        centuries = int(matches.group(1))
-        year = centuries * 100 - TENTH_OF_A_CENTURY
-        qualifier = string_precision_qualifier_clause
-
-    elif matches := re.match(r'(Anfang|Mitte|Ende) (\d{1,2})\. ' + JH_GROUP, date_string):
-        number_map = {
-            "Anfang":  0,
-            "Mitte": 1,
-            "Ende": 2,
-        }
-        third = number_map[matches.group(1)]
-        centuries = int(matches.group(2)) - 1
-        year = centuries * 100 + (third * 33) + 17
-        qualifier = string_precision_qualifier_clause
-
-    elif matches := re.match(r'(\d{3,4})er Jahre', date_string):
-        year = int(matches.group(1))
-        precision = PRECISION_DECADE
-    
-    elif matches := re.match(r'Wende zum (\d{1,2})\. ' + JH_GROUP, date_string):
-        centuries = int(matches.group(1)) - 1
-        year = centuries * 100 - 10
-        qualifier = string_precision_qualifier_clause
-
-    elif matches := re.match(r'Anfang der (\d{3,4})er Jahre', date_string):
-        year = int(matches.group(1))
-        qualifier = string_precision_qualifier_clause
-        precision = PRECISION_DECADE
-
-    # something like: (1140) 1145
-    elif matches := re.match(r'\((\d{3,4})\s?\?\) (\d{3,4})', date_string):
-        year = int(matches.group(2)) # ignoring the year in parantheses
-        precision = PRECISION_YEAR
-        qualifier = string_precision_qualifier_clause
-    
-    # something like: zwischen 1087 und 1093
-    elif matches := re.match(r'zwischen (\d{3,4}) und (\d{3,4})', date_string):
-        year = int(matches.group(1)) # ignoring the second year
-        precision = PRECISION_YEAR
-        qualifier = string_precision_qualifier_clause
-
-    # something like: 1140/1141
-    # or like: 1140/1152
-    elif matches := re.match(r'(\d{3,4})/(\d{3,4})', date_string):
-        year1 = int(matches.group(1))
-        year2 = int(matches.group(2))
-
-        if year2 - year1 == 1:
-            # check for consecutive years
-            qualifier = exact_precision_qualifier + '\t' + OR_FOLLOWING_YEAR
-        else:
-            qualifier = string_precision_qualifier_clause
-            
-        year = year1
-        precision = PRECISION_YEAR
-
-    # this pattern is pre-compiled above, because it's rather complex and it's much more efficient to compile it just once, instead of on every function call
-    elif matches := MOST_COMPLEX_PATTERN.match(date_string):
-        if matches.group(1): # if 'wohl' was found
-            qualifier = exact_precision_qualifier + '\t' + LIKELY
-        if matches.group(5): # if 'etwa' , 'ca.' or 'um' were found
-            if len(qualifier) != 0:
-                qualifier += '\t'
-            qualifier += exact_precision_qualifier + '\t' + CIRCA
-                
-        if matches.group(3): # if 'kurz' was found -- because of how the regex is defined, this can only happen when combined with 'nach', 'bis', etc.
-            if len(qualifier) != 0:
-                qualifier += '\t'
-
-            if ante_property: # already checked above whether it's before or after
-                qualifier += exact_precision_qualifier + '\t' + SHORTLY_BEFORE
-            else: # post_property
-                qualifier += exact_precision_qualifier + '\t' + SHORTLY_AFTER
-
-        if matches.group(8): # if a question mark at the end were found
-            # TODO is it correct, that on ? the other matches ('ca.' etc.) are ignored, because it's not exact enough?
-            qualifier = string_precision_qualifier_clause
-        
-        year = int(matches.group(7))
-        precision = PRECISION_YEAR
-
-    else:
-        raise Exception(f"Couldn't parse date '{date_string}'")
-
-    entry = datetime(year, 1, 1)
-    return (return_property, format_datetime(entry, precision), qualifier, date(year, 1, 1).isoformat())
-    #return (return_property, format_datetime(entry, precision), qualifier)
+#the date parsing is defined in scripts/wiag_to_factgrid_functions.py, the constants are imported for the test cases below
+from scripts.wiag_to_factgrid_functions import (
+    DateType, date_parsing,
+    DATE, BEGIN_DATE, END_DATE, DATE_AFTER, DATE_BEFORE,
+    END_TERMINUS_ANTE_QUEM, BEGIN_TERMINUS_ANTE_QUEM, END_TERMINUS_POST_QUEM, BEGIN_TERMINUS_POST_QUEM,
+    NOTE, PRECISION_DATE, PRECISION_BEGIN_DATE, PRECISION_END_DATE, STRING_PRECISION_BEGIN_DATE, STRING_PRECISION_END_DATE,
+    SHORTLY_BEFORE, SHORTLY_AFTER, LIKELY, CIRCA, OR_FOLLOWING_YEAR,
+)
 
 #%% [markdown]
 ##### Test cases
@@ -931,35 +658,44 @@ def parse_both_dates(d: dict):
 #
 #If the date parsing function can't handle a date (either because that format hasn't been encountered yet or because the entry is nonsense), it prints the problematic date and the corresponding entry from the dataframe. If the relevant rows contain some nonsense data, use this output to find and fix it. If the data is not nonsense, most likely the date_parsing function above needs to be extended. For this, you probably want to contact whoever is responsible for maintaining the sync_notebooks.
 
+#%%
+from scripts.wiag_to_factgrid_functions import add_date_clauses
+
+offices_df = add_date_clauses(final_joined_df)
+
+#%% [markdown]
+##### Skip offices that are already on FactGrid
+#
+#Every statement uploaded with QuickStatements costs an edit, even if FactGrid already has it. So the office statements (P165) the persons already have on FactGrid are downloaded, and offices with the same statement (same institution role, the WIAG-ID as reference and the same dates) are not written again. Offices with other dates on FactGrid are written, so they are updated.
+#
+#Set `skip_existing_offices = False` to write all offices. Only the persons that have any P165 statement on FactGrid are asked for; if you ran notebook 2 shortly before and **did not upload anything to FactGrid since then** (also not the persons of notebook 3), you can set `reuse_download` to use its download for this.
+
+#%%
+skip_existing_offices = True
+
+if skip_existing_offices:
+    from scripts.fg_reference import load_person_crosswalk, fetch_office_statements
+    from scripts.wiag_to_factgrid_functions import remove_existing_offices
+
+    reuse_download = None # e.g. timedelta(hours = 1) to use the data downloaded by notebook 2 in the last hour (see above)
+    crosswalk_df = load_person_crosswalk(input_path, step = 'wiag_to_factgrid', max_age = reuse_download)
+    statements_df = fetch_office_statements(offices_df.get_column('FactGrid').unique(), crosswalk_df)
+    (offices_df, skipped) = remove_existing_offices(offices_df, statements_df)
+    print(f"{skipped} offices are already on FactGrid and are skipped, {offices_df.height} offices are written.")
+
 #%%
 filepath = os.path.join(output_path, f'quickstatements-offices_{today_string}.v1')
 
-with open(filepath, 'w') as file:
-    for row in final_joined_df.iter_rows(named = True):
-        try:
-            date_clauses = ()
+from scripts.wiag_to_factgrid_functions import write_offices_v1
 
-            if row['date_begin'] != None:
-                if row['date_end'] != None:
-                    date_clauses = (*date_parsing(row['date_begin'], DateType.BEGIN_DATE), *date_parsing(row['date_end'], DateType.END_DATE))
-                else:
-                    date_clauses = date_parsing(row['date_begin'], DateType.ONLY_DATE)
-            else:
-                if row['date_end'] != None:
-                    date_clauses = date_parsing(row['date_end'], DateType.ONLY_DATE)
-                    
-            file.write('\t'.join([
-                row['FactGrid'], 
-                'P165', 
-                row['fg_inst_role_id'],
-                'S601', 
-                '"' + row['person_id'] + '"',
-                *date_clauses,
-            ]) + '\n')
-        except Exception as e:
-            print(traceback.format_exc())
-            print(row)
-            print('\n')
+write_offices_v1(offices_df, filepath)
+
+#%% [markdown]
+#### Runtime of the steps
+#The table below shows for the measured steps how long they took (wall and CPU time), how many rows went in and out, how many requests were sent and how much memory was used. The details are saved in the `traces` folder.
+
+#%%
+print_summary()
 
 #%% [markdown]
 ### 9. Updating FactGrid
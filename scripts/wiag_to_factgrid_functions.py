@@ -1,87 +1,446 @@
-import requests
+import re
+import traceback
+from datetime import datetime, date
+from enum import Enum
 import polars as pl
-import polars.selectors as cs
+from scripts.instrumentation import instrumented
+from scripts.quickstatements import ITEM, STRING, v1_statements, write_v1
 
-FG_SPARQL_URL = 'https://database.factgrid.de/sparql'
 
-#extract out factgrid id
-def extract_id(df, column):
-    return df.with_columns(pl.col(column).str.strip_chars('https://database.factgrid.de/entity/'))
+# For each office the associated diocese is searched in the FactGrid reference data (see FgReference.find_diocese)
+@instrumented()
+def resolve_dioceses(offices_df, fg_reference):
+    keys_df = offices_df.select('diocese_id', 'diocese').unique()
+    keys_df = keys_df.with_columns(pl.Series('fg_diocese_id', [
+        fg_reference.find_diocese(diocese_id, diocese) for (diocese_id, diocese) in keys_df.iter_rows()
+    ], dtype = pl.String)) # many offices share the same diocese
+    # #TODO should cases where no result was found be noted/handled?
 
-#drop irrelevant columns
-def drop_type_columns(df):
-    df = df.drop(
-        cs.ends_with("type"),
-        cs.ends_with("xml:lang")
-        )
-    return df
+    return offices_df.select('id', 'diocese_id', 'diocese').join(
+        keys_df, on = ['diocese_id', 'diocese'], nulls_equal = True, maintain_order = 'left'
+    ).filter(pl.col('fg_diocese_id').is_not_null()).select(pl.col('id').alias('role_all-id'), 'fg_diocese_id')
 
 
-def load_fg_data():
-    # load institutions (items with a Klosterdatenbank-ID)
-    query = (
-        """SELECT ?item ?gsn WHERE {
-    ?item wdt:P471 ?gsn
-    }
-    """
-    )
+# returns the ids of the institution roles on FactGrid that match the office
+def find_fg_inst_role(name, inst, dioc, fg_reference):
+    search_result = []
+    if inst == None:
+        if dioc != None: # TODO handle cases where inst and dioc are None? - should only be true for [35, 48, 49] Kardinal, Papst, Kurienamt (except maybe special role_groups)
+            if name not in ["Archidiakon", "Koadjutor"]:
+                dioc = dioc.lstrip('Bistum').lstrip('Erzbistum').lstrip('Patriarchat').lstrip()
+            if name == "Fürstbischof" and dioc in ["Passau", "Straßburg"]:
+                name = "Bischof"
+            search_result = fg_reference.inst_roles_df.filter(pl.col('inst_role').str.contains(f"^{name}.*{dioc}")).get_column('fg_inst_role_id').to_list()
+            if name == "Erzbischof" and dioc == "Salzburg":
+                # will be merged in later # TODO what does this mean and why?
+                search_result = fg_reference.inst_roles_df.filter(pl.col('fg_inst_role_id') == 'Q172567').get_column('fg_inst_role_id').to_list()
+    else:
+        name = name.replace('Domkanoniker', 'Domherr')
+        search_result = fg_reference.inst_roles_by_label.get(f"{name} {inst}", [])
 
-    r = requests.get(FG_SPARQL_URL, params={'query': query}, headers={"Accept": "application/json"})
-    data = r.json()
-    institution_df = pl.json_normalize(data['results']['bindings'])
-    institution_df = institution_df.cast({'gsn.value':pl.UInt32})
-
-    # load dioceses (items that are an instance or subclass of a diocese)
-    query = (
-    """
-    SELECT DISTINCT ?item ?wiagid ?label ?alternative WHERE {
-    ?item wdt:P2/wdt:P3* wd:Q164535.
-    #?item schema:description ?itemDesc.
-    ?item rdfs:label ?label.
-    OPTIONAL {?item schema:description ?itemDesc.}
-    OPTIONAL {?item skos:altLabel ?alternative. }
-    OPTIONAL {?item wdt:P601 ?wiagid.}
-    FILTER(LANG(?label) in ("en", "de"))
-    }
-    """
+    return search_result
+
+
+# The institution roles on FactGrid (fg_inst_role_ids) for every combination of role, institution and diocese of the
+# offices of persons on FactGrid whose role is on FactGrid. Offices with exactly one are joined to it in office_plan,
+# the combinations without any are used for creating institution roles and the offices with more than one need to be
+# fixed manually.
+@instrumented()
+def match_inst_roles(offices_df, roles_df, fg_reference):
+    keys_df = join_roles(offices_df.filter(pl.col('FactGrid').is_not_null()), roles_df).filter(pl.col('role_fg_id').is_not_null())
+    keys_df = keys_df.select('name', 'institution', 'diocese').unique(maintain_order = True)
+    # Kardinal receives insitution role Q254893 manually -- probably simply handling a simple special case first
+    return keys_df.with_columns(pl.Series('fg_inst_role_ids', [
+        ["Q254893"] if name == "Kardinal" else find_fg_inst_role(name, inst, dioc, fg_reference) for (name, inst, dioc) in keys_df.iter_rows()
+    ], dtype = pl.List(pl.String)))
+
+
+#defining an enum to more clearly define what type of date is being passed 
+class DateType(Enum):
+    ONLY_DATE = 0
+    BEGIN_DATE = 1
+    END_DATE = 2
+
+#date precision and calendar declaration (see Time at https://www.wikidata.org/wiki/Help:QuickStatements#Add_simple_statement)
+PRECISION_CENTURY = 7
+PRECISION_DECADE = 8
+PRECISION_YEAR = 9
+PRECISION_MONTH = 10
+PRECISION_DAY = 11
+JULIAN_ENDING = '/J'
+
+#defining some constants for better readability of the code:
+#self defined:
+JHS_GROUP = r'(Jhs\.|Jahrhunderts?)'
+JH_GROUP = r'(Jh\.|Jahrhundert)'
+EIGTH_OF_A_CENTURY = 13
+QUARTER_OF_A_CENTURY = 25
+TENTH_OF_A_CENTURY = 10
+
+ANTE_GROUP = "bis|vor|spätestens"
+POST_GROUP = "nach|frühestens|ab|zwischen" # NOTE: 'zwischen' does not actually fit into this group, but because the current strategy for 'zwischen 1087 und 1093' is to just take the first date with post quem, it makes sense to have it here
+CIRCA_GROUP = r"etwa|ca\.|um"
+#pre-compiling the most complex pattern to increase efficiency
+MOST_COMPLEX_PATTERN = re.compile(r'(wohl )?((kurz )?(' + ANTE_GROUP + '|' + POST_GROUP + r') )?((' + CIRCA_GROUP +r') )?(\d{3,4})(\?)?')
+
+#FactGrid properties:
+#simple date properties:
+DATE = 'P106' 
+BEGIN_DATE = 'P49'
+END_DATE = 'P50'
+#when there is uncertainty / when all we know is the latest/earliest possible date:
+DATE_AFTER = 'P41' # the earliest possible date for something
+DATE_BEFORE = 'P43' # the latest possible date for something
+END_TERMINUS_ANTE_QUEM = 'P1123' # latest possible date of the end of a period
+BEGIN_TERMINUS_ANTE_QUEM  = 'P1124' # latest possible date of the begin of a period
+END_TERMINUS_POST_QUEM = 'P1125' # earliest possible date of the end of a period
+BEGIN_TERMINUS_POST_QUEM = 'P1126' # earliest possible date of the beginning of a period
+
+NOTE = 'P73' # Field for free notes
+PRECISION_DATE = 'P467' # FactGrid qualifier for the specific determination of the exactness of a date
+PRECISION_BEGIN_DATE = 'P785'   # qualifier to specify a begin date
+PRECISION_END_DATE = 'P786'
+STRING_PRECISION_BEGIN_DATE = 'P787' # qualifier to specify a begin date; string alternate to P785
+STRING_PRECISION_END_DATE = 'P788'
+
+#qualifiers/options
+SHORTLY_BEFORE = 'Q255211'
+SHORTLY_AFTER = 'Q266009'
+LIKELY = 'Q23356'
+CIRCA = 'Q10'
+OR_FOLLOWING_YEAR = 'Q912616'
+
+def format_datetime(entry: datetime, precision: int):
+    ret_val =  f"+{entry.isoformat()}Z/{precision}"
+
+    if entry.year < 1582: # declaring that the julian calendar is being used by adding '/J' to the end
+        ret_val +=  JULIAN_ENDING
+    
+    #on FactGrid, if the date is at most accurate to a year, the day and month are set to 0. The datetime type in Python does not allow you to set the day or month to 0 so we need to replace it manually
+    if precision <= PRECISION_YEAR:
+        ret_val = ret_val.replace(f"{entry.year}-01-01", f"{entry.year}-00-00", 1)
+    elif precision == PRECISION_MONTH:
+        ret_val = ret_val.replace(f"{entry.year}-{entry.month}-01", f"{entry.year}-{entry.month}-00", 1)
+
+    return ret_val
+
+def date_parsing(date_string: str, date_type: DateType):
+    qualifier = ""
+    precision = PRECISION_CENTURY
+
+    ante_property = (match := re.search(ANTE_GROUP, date_string))
+    post_property = (match := re.search(POST_GROUP, date_string))
+    assert(not ante_property or not post_property)
+
+    #only_date means there is only one date, not a 'begin date' and an 'end date'    
+    match date_type:
+        case DateType.ONLY_DATE:
+            string_precision_qualifier_clause = NOTE
+            exact_precision_qualifier = PRECISION_DATE
+            if ante_property:
+                return_property = DATE_BEFORE
+            elif post_property:
+                return_property = DATE_AFTER
+            else:
+                return_property = DATE
+        case DateType.BEGIN_DATE:
+            string_precision_qualifier_clause = STRING_PRECISION_BEGIN_DATE
+            exact_precision_qualifier = PRECISION_BEGIN_DATE
+            if ante_property:
+                return_property = BEGIN_TERMINUS_ANTE_QUEM
+            elif post_property:
+                return_property = BEGIN_TERMINUS_POST_QUEM
+            else:
+                return_property = BEGIN_DATE
+        case DateType.END_DATE:
+            string_precision_qualifier_clause = STRING_PRECISION_END_DATE
+            exact_precision_qualifier = PRECISION_END_DATE
+            if ante_property:
+                return_property = END_TERMINUS_ANTE_QUEM
+            elif post_property:
+                return_property = END_TERMINUS_POST_QUEM
+            else:
+                return_property = END_DATE
+        case _:
+            assert False, "Unexpected DateType!"
+        
+    string_precision_qualifier_clause += f'\t"{date_string}"'
+
+    if date_string == '?':
+        return tuple()
+    
+    # something like: 12. Jahrhundert
+    if matches := re.match(r'(\d{1,2})\. ' + JH_GROUP, date_string):
+        year = 100 * int(matches.group(1))
+    
+    # something like: 2. Hälfte des 12. Jahrhunderts
+    elif matches := re.match(r'(\d)\. Hälfte (des )?(\d{1,2})\. ' + JHS_GROUP, date_string):
+        half = int(matches.group(1)) - 1
+        centuries = int(matches.group(3)) - 1
+        year   = centuries * 100 + (half * 50) + QUARTER_OF_A_CENTURY
+        qualifier = string_precision_qualifier_clause
+    
+    elif matches := re.match(r'(\w+) Viertel des (\d{1,2})\. ' + JHS_GROUP, date_string):
+        number_map = {
+            "erstes":  0,
+            "zweites": 1,
+            "drittes": 2,
+            "viertes": 3,
+        }
+        quarter = matches.group(1)
+        centuries = int(matches.group(2))
+        year = (centuries - 1) * 100 + (number_map[quarter] * 25) + EIGTH_OF_A_CENTURY
+        qualifier = string_precision_qualifier_clause
+
+    elif matches := re.match(r'frühes (\d{1,2})\. ' + JH_GROUP, date_string):
+        centuries = int(matches.group(1)) - 1
+        year = centuries * 100 + TENTH_OF_A_CENTURY
+        qualifier = string_precision_qualifier_clause
+
+    elif matches := re.match(r'spätes (\d{1,2})\. ' + JH_GROUP, date_string):
+        centuries = int(matches.group(1))
+        year = centuries * 100 - TENTH_OF_A_CENTURY
+        qualifier = string_precision_qualifier_clause
+
+    elif matches := re.match(r'(Anfang|Mitte|Ende) (\d{1,2})\. ' + JH_GROUP, date_string):
+        number_map = {
+            "Anfang":  0,
+            "Mitte": 1,
+            "Ende": 2,
+        }
+        third = number_map[matches.group(1)]
+        centuries = int(matches.group(2)) - 1
+        year = centuries * 100 + (third * 33) + 17
+        qualifier = string_precision_qualifier_clause
+
+    elif matches := re.match(r'(\d{3,4})er Jahre', date_string):
+        year = int(matches.group(1))
+        precision = PRECISION_DECADE
+    
+    elif matches := re.match(r'Wende zum (\d{1,2})\. ' + JH_GROUP, date_string):
+        centuries = int(matches.group(1)) - 1
+        year = centuries * 100 - 10
+        qualifier = string_precision_qualifier_clause
+
+    elif matches := re.match(r'Anfang der (\d{3,4})er Jahre', date_string):
+        year = int(matches.group(1))
+        qualifier = string_precision_qualifier_clause
+        precision = PRECISION_DECADE
+
+    # something like: (1140) 1145
+    elif matches := re.match(r'\((\d{3,4})\s?\?\) (\d{3,4})', date_string):
+        year = int(matches.group(2)) # ignoring the year in parantheses
+        precision = PRECISION_YEAR
+        qualifier = string_precision_qualifier_clause
+    
+    # something like: zwischen 1087 und 1093
+    elif matches := re.match(r'zwischen (\d{3,4}) und (\d{3,4})', date_string):
+        year = int(matches.group(1)) # ignoring the second year
+        precision = PRECISION_YEAR
+        qualifier = string_precision_qualifier_clause
+
+    # something like: 1140/1141
+    # or like: 1140/1152
+    elif matches := re.match(r'(\d{3,4})/(\d{3,4})', date_string):
+        year1 = int(matches.group(1))
+        year2 = int(matches.group(2))
+
+        if year2 - year1 == 1:
+            # check for consecutive years
+            qualifier = exact_precision_qualifier + '\t' + OR_FOLLOWING_YEAR
+        else:
+            qualifier = string_precision_qualifier_clause
+            
+        year = year1
+        precision = PRECISION_YEAR
+
+    # this pattern is pre-compiled above, because it's rather complex and it's much more efficient to compile it just once, instead of on every function call
+    elif matches := MOST_COMPLEX_PATTERN.match(date_string):
+        if matches.group(1): # if 'wohl' was found
+            qualifier = exact_precision_qualifier + '\t' + LIKELY
+        if matches.group(5): # if 'etwa' , 'ca.' or 'um' were found
+            if len(qualifier) != 0:
+                qualifier += '\t'
+            qualifier += exact_precision_qualifier + '\t' + CIRCA
+                
+        if matches.group(3): # if 'kurz' was found -- because of how the regex is defined, this can only happen when combined with 'nach', 'bis', etc.
+            if len(qualifier) != 0:
+                qualifier += '\t'
+
+            if ante_property: # already checked above whether it's before or after
+                qualifier += exact_precision_qualifier + '\t' + SHORTLY_BEFORE
+            else: # post_property
+                qualifier += exact_precision_qualifier + '\t' + SHORTLY_AFTER
+
+        if matches.group(8): # if a question mark at the end were found
+            # TODO is it correct, that on ? the other matches ('ca.' etc.) are ignored, because it's not exact enough?
+            qualifier = string_precision_qualifier_clause
+        
+        year = int(matches.group(7))
+        precision = PRECISION_YEAR
+
+    else:
+        raise Exception(f"Couldn't parse date '{date_string}'")
+
+    entry = datetime(year, 1, 1)
+    return (return_property, format_datetime(entry, precision), qualifier, date(year, 1, 1).isoformat())
+    #return (return_property, format_datetime(entry, precision), qualifier)
+
+
+# role_groups that are not bound to a place at all
+UNBOUND_ROLE_GROUPS = [
+    'Kurienamt',
+    'Papst',
+    'Kardinal',
+]
+# role_groups that are bound to a diocese but not an institution
+DIOCESE_ROLE_GROUPS = [
+    'Oberstes Leitungsamt Diözese',
+    'Leitungsamt Diözese',
+    'Bischöfliches Hilfspersonal',
+]
+# roles that belong to DIOCESE_ROLE_GROUPS but are still bound to an institution
+DIOCESE_ROLE_GROUP_EXCEPTION_ROLES = [
+    'Erzbischöflicher Prokurator',
+]
+# the 'bewerber' suffix means, that this person was applying for this office, so these are not proper offices and don't need to be / shouldn't be added to FactGrid
+IGNORED_ROLES = ['Vikariatsbewerber', 'Kanonikatsbewerber', 'Domherr, Anwärter']
+
+
+# returns the offices that should have an institution (first) or a diocese (second) on FactGrid, but don't have it after the join
+def find_missing_places(offices_df):
+    missing_inst_df = offices_df.filter(
+        pl.col('fg_institution_id').is_null() &
+        pl.col('role_group').is_in(UNBOUND_ROLE_GROUPS).not_() &
+        pl.col('role_group').is_in(DIOCESE_ROLE_GROUPS).not_()
+    )
+    missing_dioc_df = offices_df.filter(
+        pl.col('fg_diocese_id').is_null() &
+        pl.col('role_group').is_in(UNBOUND_ROLE_GROUPS).not_() &
+        pl.col('role_group').is_in(DIOCESE_ROLE_GROUPS) &
+        pl.col('name').is_in(DIOCESE_ROLE_GROUP_EXCEPTION_ROLES).not_()
     )
+    return (missing_inst_df, missing_dioc_df)
 
-    r = requests.get(FG_SPARQL_URL, params={'query': query}, headers={"Accept": "application/json"})
-    data = r.json()
-    diocese_df = pl.json_normalize(data['results']['bindings'])
-
-    # load institution roles (any item that is a "Career statement that captures a sequence of incumbents")
-    query = (
-    """
-    SELECT ?item ?label WHERE {
-    ?item wdt:P2 wd:Q257052.
-    ?item rdfs:label ?label.
-    FILTER(LANG(?label) in ("de"))
-    }
-    """
+
+# joins the role_fg_id attribute from WIAG - roles with multiple entries in the WIAG role table and IGNORED_ROLES are dropped
+def join_roles(offices_df, roles_df):
+    roles_df = roles_df.remove(pl.col("name").is_duplicated())
+    joined_df = offices_df.join(roles_df.rename({'id' : 'role_id', 'factgrid_id': 'role_fg_id'}), on = "name", how = "left")
+    return joined_df.remove(pl.col('name').is_in(IGNORED_ROLES))
+
+
+# Steps 4 to 8 of notebook 4 (and the batch mode) as one lazy plan: the offices joined with their institution, diocese
+# (dioceses_df from resolve_dioceses), role and institution role (inst_roles_df from match_inst_roles) on FactGrid, and
+# as side outputs the offices left out on the way. Run all of them with collect_offices, so the shared part of the plan
+# is only computed once.
+def office_plan(offices_df, institution_df, roles_df, dioceses_df, inst_roles_df) -> dict:
+    offices = offices_df.lazy().join(institution_df.lazy(), how = 'left', left_on = 'institution_id', right_on = 'fg_gsn_id', maintain_order = 'left')
+    offices = offices.join(dioceses_df.lazy(), how = 'left', left_on = 'id', right_on = 'role_all-id', maintain_order = 'left')
+
+    (missing_inst, missing_dioc) = find_missing_places(offices)
+    placed = offices.join(pl.concat([missing_inst.select('id'), missing_dioc.select('id')]), on = 'id', how = 'anti', maintain_order = 'left')
+    # names of the offices that are not in the WIAG role table at all
+    missing_roles_wiag = placed.join(roles_df.lazy().select('name'), on = 'name', how = 'anti', maintain_order = 'left').filter(pl.col('name').is_not_null()).unique(maintain_order = True)
+
+    joined = join_roles(placed, roles_df.lazy())
+    with_roles = joined.filter(pl.col('role_fg_id').is_not_null())
+    # persons missing on FactGrid are created by notebook 3, their offices are left out here
+    missing_persons = with_roles.filter(pl.col('FactGrid').is_null()).unique('person_id', maintain_order = True)
+
+    matched = with_roles.filter(pl.col('FactGrid').is_not_null()).join(
+        inst_roles_df.lazy(), on = ['name', 'institution', 'diocese'], how = 'left', nulls_equal = True, maintain_order = 'left'
     )
+    matches = pl.col('fg_inst_role_ids').list.len().fill_null(0)
+    return {
+        'offices': matched.filter(matches == 1).with_columns(pl.col('fg_inst_role_ids').list.first().alias('fg_inst_role_id')).drop('fg_inst_role_ids'),
+        'missing_institutions': missing_inst,
+        'missing_dioceses': missing_dioc,
+        'missing_roles_wiag': missing_roles_wiag,
+        'missing_roles': joined.filter(pl.col('role_fg_id').is_null()),
+        'missing_persons': missing_persons,
+        'missing_inst_roles': matched.filter(matches == 0).select(pl.col('name').alias('role'), 'institution', 'institution_id'),
+        'duplicate_inst_roles': matched.filter(matches >= 2).select('id', 'name', 'institution', 'diocese', 'fg_inst_role_ids'),
+    }
+
+
+# computes all frames of the plan together on the streaming engine
+@instrumented()
+def collect_offices(plan: dict) -> dict:
+    return dict(zip(plan, pl.collect_all(plan.values(), engine = 'streaming')))
+
+
+def date_clauses(date_begin, date_end):
+    if date_begin != None:
+        if date_end != None:
+            return (*date_parsing(date_begin, DateType.BEGIN_DATE), *date_parsing(date_end, DateType.END_DATE))
+        return date_parsing(date_begin, DateType.ONLY_DATE)
+    if date_end != None:
+        return date_parsing(date_end, DateType.ONLY_DATE)
+    return ()
+
+
+# Adds the parsed dates as 'date_clauses' (already joined by tabs). If the date parsing function can't handle a date,
+# the problematic entry is printed and skipped. Every combination of dates is only parsed once.
+@instrumented()
+def add_date_clauses(final_joined_df):
+    clauses = []
+    errors = {}
+    for (date_begin, date_end) in final_joined_df.select('date_begin', 'date_end').unique(maintain_order = True).iter_rows():
+        try:
+            clauses.append((date_begin, date_end, '\t'.join(date_clauses(date_begin, date_end))))
+        except Exception as e:
+            errors[(date_begin, date_end)] = traceback.format_exc()
+
+    clauses_df = pl.DataFrame(clauses, schema = {
+        'date_begin': final_joined_df.schema['date_begin'], 'date_end': final_joined_df.schema['date_end'], 'date_clauses': pl.String,
+    }, orient = 'row')
+    offices_df = final_joined_df.join(clauses_df, on = ['date_begin', 'date_end'], how = 'left', nulls_equal = True, maintain_order = 'left')
+    for row in offices_df.filter(pl.col('date_clauses').is_null()).drop('date_clauses').iter_rows(named = True):
+        print(errors[(row['date_begin'], row['date_end'])])
+        print(row)
+        print('\n')
+
+    return offices_df.filter(pl.col('date_clauses').is_not_null())
+
+
+# the time values of the date clauses ("P49\t+1150-00-00T00:00:00Z/7/J") - compared by property, year and precision
+DATE_VALUE_PATTERN = r'(P\d+)\t\+0*(\d+)-\d\d-\d\dT\d\d:\d\d:\d\dZ/(\d+)'
+
 
-    r = requests.get(FG_SPARQL_URL, params={'query': query}, headers={"Accept": "application/json"})
-    data = r.json()
-    inst_role_df = pl.json_normalize(data['results']['bindings'])
+def date_values(date_clauses: pl.Expr) -> pl.Expr:
+    return date_clauses.str.extract_all(DATE_VALUE_PATTERN).list.eval(
+        pl.element().str.replace(DATE_VALUE_PATTERN, '${1} ${2} ${3}')
+    ).list.unique().list.sort().list.join(';')
 
-    # clean data
-    institution_df = extract_id(institution_df, 'item.value')
-    diocese_df = extract_id(diocese_df, 'item.value')
-    inst_role_df = extract_id(inst_role_df, 'item.value')
 
-    institution_df = drop_type_columns(institution_df)
-    diocese_df = drop_type_columns(diocese_df)
-    inst_role_df = drop_type_columns(inst_role_df)
+# Removes the offices of which FactGrid already has the same statement: the same institution role for the person with
+# the WIAG-ID as reference and the same dates (statements_df from fetch_office_statements). Offices with other dates
+# or without the reference on FactGrid are kept, so they are updated. Returns the remaining offices and the number of
+# removed ones.
+@instrumented()
+def remove_existing_offices(offices_df, statements_df):
+    existing_df = statements_df.with_columns(
+        pl.format('{} {} {}', 'property', pl.col('time').str.extract(r'^\+?0*(\d+)-', 1), 'precision').alias('date_value')
+    ).group_by('statement', 'person_id').agg(
+        pl.col('FactGrid', 'fg_inst_role_id').first(),
+        pl.col('date_value').drop_nulls().unique().sort().str.join(';').alias('dates'),
+    ).drop('statement').unique()
 
-    #rename columns
-    institution_df.columns = ['fg_institution_id', 'fg_gsn_id']
-    diocese_df.columns = ["fg_diocese_id", "dioc_label", "dioc_alt", "dioc_wiag_id"]
-    inst_role_df.columns = ["fg_inst_role_id", "inst_role"]
+    keys = ['FactGrid', 'fg_inst_role_id', 'person_id', 'dates']
+    new_offices_df = offices_df.with_columns(date_values(pl.col('date_clauses')).alias('dates')).join(
+        existing_df, on = keys, how = 'anti', nulls_equal = True, maintain_order = 'left'
+    ).drop('dates')
+    return (new_offices_df, offices_df.height - new_offices_df.height)
 
-    #clean the diocese alts by removing BITECA and BETA entries 
-    diocese_df = diocese_df.with_columns(pl.col('dioc_alt').str.replace('^(BITECA|BETA).*', ''))
 
-    print(f"{institution_df.height} institutions, {diocese_df.height} dioceses and {inst_role_df.height} institution roles were loaded from FactGrid.")
+# writes a P165 statement with the WIAG-ID as reference and the dates as qualifiers for every office (the dates are
+# parsed first, if that was not done already)
+@instrumented()
+def write_offices_v1(final_joined_df, filepath):
+    if 'date_clauses' not in final_joined_df.columns:
+        final_joined_df = add_date_clauses(final_joined_df)
 
-    return (institution_df, diocese_df, inst_role_df)
\ No newline at end of file
+    write_v1(final_joined_df, filepath, lambda chunk: v1_statements(
+        chunk, 'FactGrid', 'P165', ('fg_inst_role_id', ITEM), [('S601', 'person_id', STRING)], raw = 'date_clauses'
+    ))
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+from aiohttp import web
+from benchmarks.synthetic import generate, SPARQL_FILES
+from standins.server import create_app, add_fault_arguments, parse_faults, SERVICES
+import scripts.fg_wiag_ids_functions as fg_wiag_ids_functions
+
+# Runs check_fg (fg_wiag_ids) against the WIAG stand-in with synthetic data and reports the throughput, the number of
+# attempts and the responses of the stand-in. The faults are the same as for standins.server, e.g.
+#   python -m standins.loadtest --persons 5000 --error-503 0.05 --reset 0.01 --latency-ms 50
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def wiag_entries(directory: str) -> list:
+    with open(os.path.join(directory, SPARQL_FILES['p601']), encoding='utf-8') as f:
+        bindings = json.load(f)['results']['bindings']
+    return [(binding['wiag']['value'], binding['person']['value'].split('/')[-1]) for binding in bindings]
+
+
+async def run(directory: str, faults: dict, batch_size: int) -> dict:
+    app = create_app(os.path.join(directory, 'recordings'), faults, synthetic_path=directory)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, 'localhost', port).start()
+
+    fg_wiag_ids_functions.WIAG_BASE_URL = f"http://localhost:{port}{SERVICES['wiag']['prefix']}"
+    fg_wiag_ids_functions.BATCH_SIZE = batch_size
+    entries = wiag_entries(directory)
+
+    start = time.perf_counter()
+    entries_update, different_fgID, missing_fgID = await fg_wiag_ids_functions.check_fg(entries)
+    seconds = time.perf_counter() - start
+    await runner.cleanup()
+
+    stats = app['state']['stats']['wiag']
+    return {
+        'entries': len(entries),
+        'seconds': round(seconds, 2),
+        'entries_per_s': round(len(entries) / seconds, 1),
+        'requests': stats['requests'],
+        'retries': stats['requests'] - len(entries),
+        'responses': {key: value for key, value in stats.items() if key not in ('requests', 'recorded', 'missing')},
+        'results': {'to_be_updated': len(entries_update), 'different_fg_id': len(different_fgID), 'missing_fg_id': len(missing_fgID)},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test of check_fg against the WIAG stand-in.")
+    parser.add_argument('--persons', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=fg_wiag_ids_functions.BATCH_SIZE)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, args.persons, args.seed)
+        result = asyncio.run(run(directory, parse_faults(args), args.batch_size))
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+import aiohttp
+from aiohttp import web
+
+# Local stand-ins for WIAG, the FactGrid SPARQL endpoint and API and the LLM API. Responses are replayed from recordings (which
+# can be made by running the server with --record in front of the real services) or, if no recording exists, generated
+# from the synthetic data of the benchmarks. Latency, server errors, rate limiting and dropped connections can be
+# injected to test how the notebooks cope with them. The notebooks use the stand-ins when the base URLs printed on
+# start are set as environment variables (or in the .env file).
+
+# path prefix on the stand-in server and the real service
+SERVICES = {
+    'wiag': {'prefix': '/wiag', 'upstream': 'https://wiag-vocab.adw-goe.de', 'env': 'WIAG_BASE_URL'},
+    'sparql': {'prefix': '/sparql', 'upstream': 'https://database.factgrid.de/sparql', 'env': 'FG_SPARQL_URL'},
+    'fg_api': {'prefix': '/w/api.php', 'upstream': 'https://database.factgrid.de/w/api.php', 'env': 'FG_API_URL'},
+    'llm': {'prefix': '/llm/v1', 'upstream': 'https://chat-ai.academiccloud.de/v1', 'env': 'LLM_BASE_URL'},
+}
+
+# faults injected into every response (rates are the share of requests, 0 to 1)
+DEFAULT_FAULTS = {
+    'latency_ms': 0, # added to every response
+    'jitter_ms': 0, # random additional latency between 0 and jitter_ms
+    'error_500': 0.0,
+    'error_503': 0.0,
+    'rate_limited': 0.0, # 429 Too Many Requests
+    'reset': 0.0, # the connection is dropped without a response (over HTTPS the client sees this as an SSL error)
+    'max_rps': None, # requests per second above which every request gets a 429
+}
+
+# the reasons as sent by the Apache servers in front of WIAG and FactGrid (check_fg looks for them)
+ERROR_REASONS = {
+    500: 'Internal Server Error',
+    503: 'Service Temporarily Unavailable',
+    429: 'Too Many Requests',
+}
+
+# the SPARQL results of the synthetic data, chosen by a pattern of the query
+SYNTHETIC_QUERIES = [
+    ('?human', 'crosswalk'),
+    ('wdt:P601 []. } UNION', 'crosswalk'), # the items of the crosswalk (its ?item column)
+    ('p:P165', 'p165'),
+    ('wdt:P601', 'p601'),
+    ('wdt:P472', 'p472'),
+    ('wdt:P471', 'institutions'),
+    ('wd:Q164535', 'dioceses'),
+    ('wd:Q257052', 'inst_roles'),
+]
+
+# sharded queries and the office statements (scripts/fg_reference.py) restrict the results to the items of a VALUES clause
+VALUES_CLAUSE = re.compile(r'VALUES \?(\w+) \{([^}]*)\}')
+
+
+def key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+
+def recording_path(state: dict, service: str, key: str) -> str:
+    return os.path.join(state['recordings'], service, f"{key_hash(key)}.json")
+
+
+def load_recording(state: dict, service: str, key: str):
+    path = recording_path(state, service, key)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_recording(state: dict, service: str, key: str, recording: dict):
+    path = recording_path(state, service, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recording | {'key': key}, f, ensure_ascii=False, indent=1)
+
+
+def load_synthetic(directory: str) -> dict:
+    from benchmarks.synthetic import LEBENSDATEN_FILE, SPARQL_FILES
+    from scripts.ingest import read_export
+
+    persons_df = read_export(os.path.join(directory, LEBENSDATEN_FILE), 'lebensdaten', use_cache=False)
+    sparql = {}
+    for name, filename in SPARQL_FILES.items():
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sparql[name] = f.read()
+    # the WIAG-IDs and GSNs of the items on FactGrid, as in the crosswalk query
+    entities = {}
+    for binding in json.loads(sparql['crosswalk'])['results']['bindings']:
+        entities[binding['item']['value'].rsplit('/', 1)[1]] = {
+            property: binding[variable]['value'].split('|') for property, variable in [('P601', 'wiag_ids'), ('P472', 'gsns')] if binding.get(variable, {}).get('value')
+        }
+    return {'persons': dict(persons_df.select('id', 'FactGrid_ID').iter_rows()), 'sparql': sparql, 'entities': entities}
+
+
+# the response of WIAG for a person - outdated IDs of the synthetic data (ending in -002/-003) are redirected to the current one
+def synthetic_wiag(synthetic: dict, tail: str):
+    requested_id = tail.removeprefix('id/')
+    wiag_id = requested_id if requested_id in synthetic['persons'] else requested_id[:-3] + '001'
+    if wiag_id not in synthetic['persons']:
+        return {'status': 200, 'content_type': 'text/html', 'body': f"Kein Eintrag für ID {requested_id} vorhanden."}
+
+    identifier = {}
+    if synthetic['persons'][wiag_id] is not None:
+        identifier['Factgrid'] = f"https://database.factgrid.de/entity/{synthetic['persons'][wiag_id]}"
+    return {'status': 200, 'content_type': 'application/json', 'body': json.dumps({'persons': [{'wiagId': wiag_id, 'identifier': identifier}]})}
+
+
+def values_shard(results: dict, variable: str, qids: set) -> dict:
+    bindings = [binding for binding in results['results']['bindings'] if binding[variable]['value'].rsplit('/', 1)[1] in qids]
+    return {'head': results['head'], 'results': {'bindings': bindings}}
+
+
+def synthetic_sparql(synthetic: dict, query: str):
+    for pattern, name in SYNTHETIC_QUERIES:
+        if pattern in query:
+            body = synthetic['sparql'][name]
+            values = VALUES_CLAUSE.search(query)
+            if values is not None:
+                qids = {value.removeprefix('wd:') for value in values.group(2).split()}
+                body = json.dumps(values_shard(json.loads(body), values.group(1), qids))
+            return {'status': 200, 'content_type': 'application/sparql-results+json', 'body': body}
+    return None
+
+
+# wbgetentities for the items of the synthetic crosswalk, with their WIAG-IDs and GSNs as claims
+def synthetic_fg_api(synthetic: dict, query: dict):
+    if query.get('action') != 'wbgetentities':
+        return None
+    entities = {}
+    for qid in query.get('ids', '').split('|'):
+        if qid not in synthetic['entities']:
+            entities[qid] = {'id': qid, 'missing': ''}
+            continue
+        entities[qid] = {'type': 'item', 'id': qid, 'claims': {
+            property: [{'mainsnak': {'property': property, 'datavalue': {'value': value, 'type': 'string'}}, 'rank': 'normal'} for value in values]
+            for property, values in synthetic['entities'][qid].items()
+        }}
+    return {'status': 200, 'content_type': 'application/json', 'body': json.dumps({'entities': entities, 'success': 1})}
+
+
+# answers every prompt with the prompt itself, in the format of the OpenAI chat completions API
+def synthetic_llm(body: dict):
+    prompt = body['messages'][-1]['content']
+    return {'status': 200, 'content_type': 'application/json', 'body': json.dumps({
+        'id': f"chatcmpl-{key_hash(prompt)}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'stand-in'),
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': prompt, 'reasoning_content': ''}}],
+    })}
+
+
+def choose_fault(state: dict, service: str):
+    faults = state['faults'][service]
+
+    if faults['max_rps'] is not None:
+        recent = state['recent'][service]
+        now = time.monotonic()
+        while recent and now - recent[0] > 1:
+            recent.popleft()
+        recent.append(now)
+        if len(recent) > faults['max_rps']:
+            return 429
+
+    draw = random.random()
+    for fault in ['reset', 'error_500', 'error_503', 'rate_limited']:
+        if draw < faults[fault]:
+            return {'reset': 'reset', 'error_500': 500, 'error_503': 503, 'rate_limited': 429}[fault]
+        draw -= faults[fault]
+    return None
+
+
+async def forward(state: dict, service: str, request: web.Request, tail: str, body: bytes) -> dict:
+    url = SERVICES[service]['upstream'] + (f"/{tail}" if tail else '')
+    headers = {name: value for name, value in request.headers.items() if name.lower() in ('accept', 'content-type', 'authorization')}
+    async with state['session'].request(request.method, url, params=request.query, data=body or None, headers=headers) as response:
+        return {'status': response.status, 'content_type': response.content_type, 'body': await response.text()}
+
+
+async def handle(request: web.Request, service: str) -> web.StreamResponse:
+    state = request.app['state']
+    stats = state['stats'][service]
+    stats['requests'] += 1
+    faults = state['faults'][service]
+
+    await asyncio.sleep((faults['latency_ms'] + random.random() * faults['jitter_ms']) / 1000)
+
+    fault = choose_fault(state, service)
+    if fault is not None:
+        stats[str(fault)] = stats.get(str(fault), 0) + 1
+        if fault == 'reset':
+            request.transport.abort()
+            return web.Response(status=500)
+        headers = {'Retry-After': '1'} if fault == 429 else {}
+        reason = ERROR_REASONS[fault]
+        page = f"<html><head><title>{fault} {reason}</title></head><body><h1>{reason}</h1></body></html>"
+        return web.Response(status=fault, reason=reason, text=page, content_type='text/html', headers=headers)
+
+    tail = request.match_info.get('tail', '')
+    body = await request.read()
+    if service == 'wiag':
+        key = f"{tail}?{request.query_string}"
+    elif service == 'fg_api':
+        key = request.query_string
+    elif service == 'sparql':
+        query = request.query.get('query') or (await request.post()).get('query', '')
+        key = ' '.join(query.split())
+    else:
+        llm_body = json.loads(body)
+        key = json.dumps({field: llm_body.get(field) for field in ['model', 'messages', 'temperature']}, sort_keys=True, ensure_ascii=False)
+
+    recording = load_recording(state, service, key)
+    if recording is None and state['record']:
+        recording = await forward(state, service, request, tail, body)
+        save_recording(state, service, key, recording)
+        stats['recorded'] += 1
+    if recording is None and state['synthetic'] is not None:
+        if service == 'wiag':
+            recording = synthetic_wiag(state['synthetic'], tail)
+        elif service == 'sparql':
+            recording = synthetic_sparql(state['synthetic'], key)
+        elif service == 'fg_api':
+            recording = synthetic_fg_api(state['synthetic'], request.query)
+        else:
+            recording = synthetic_llm(llm_body)
+    if recording is None:
+        stats['missing'] += 1
+        return web.Response(status=404, text=f"No recording for {service}: {key[:200]}")
+
+    stats['replayed'] += 1
+    return web.Response(status=recording['status'], text=recording['body'], content_type=recording['content_type'])
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app['state']['stats'])
+
+
+async def on_startup(app):
+    app['state']['session'] = aiohttp.ClientSession()
+
+
+async def on_cleanup(app):
+    await app['state']['session'].close()
+
+
+# faults: {service: {fault: value}} (missing values are taken from DEFAULT_FAULTS)
+def create_app(recordings: str, faults: dict = None, record: bool = False, synthetic_path: str = None) -> web.Application:
+    app = web.Application()
+    app['state'] = {
+        'recordings': recordings,
+        'record': record,
+        'faults': {service: DEFAULT_FAULTS | (faults or {}).get(service, {}) for service in SERVICES},
+        'synthetic': load_synthetic(synthetic_path) if synthetic_path else None,
+        'recent': {service: deque() for service in SERVICES},
+        'stats': {service: {'requests': 0, 'replayed': 0, 'recorded': 0, 'missing': 0} for service in SERVICES},
+    }
+    app.router.add_get(SERVICES['wiag']['prefix'] + '/{tail:.*}', lambda request: handle(request, 'wiag'))
+    app.router.add_route('*', SERVICES['sparql']['prefix'], lambda request: handle(request, 'sparql'))
+    app.router.add_get(SERVICES['fg_api']['prefix'], lambda request: handle(request, 'fg_api'))
+    app.router.add_post(SERVICES['llm']['prefix'] + '/{tail:.*}', lambda request: handle(request, 'llm'))
+    app.router.add_get('/_stats', handle_stats)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def base_urls(host: str, port: int) -> dict:
+    return {SERVICES[service]['env']: f"http://{host}:{port}{SERVICES[service]['prefix']}" for service in SERVICES}
+
+
+def parse_faults(args) -> dict:
+    faults = {}
+    if args.faults:
+        with open(args.faults, encoding='utf-8') as f:
+            faults = json.load(f)
+    cli_faults = {fault: getattr(args, fault) for fault in DEFAULT_FAULTS if getattr(args, fault) is not None}
+    return {service: cli_faults | faults.get(service, {}) for service in SERVICES}
+
+
+def add_fault_arguments(parser):
+    parser.add_argument('--faults', help="JSON file with the faults per service, e.g. {\"wiag\": {\"error_503\": 0.05}}")
+    for fault, default in DEFAULT_FAULTS.items():
+        parser.add_argument(f"--{fault.replace('_', '-')}", dest=fault, type=float if isinstance(default, float) else int, default=None,
+                            help=f"for all services (default: {default})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-ins for WIAG, FactGrid SPARQL and API and the LLM API.")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recordings', default=os.path.join('standins', 'recordings'), help="directory with the recorded responses")
+    parser.add_argument('--record', action='store_true', help="forward unknown requests to the real services and record the responses")
+    parser.add_argument('--synthetic', help="directory with synthetic data (python -m benchmarks.synthetic) to answer requests without a recording")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    print("Set these environment variables (or add them to .env) to use the stand-ins:")
+    for name, url in base_urls(args.host, args.port).items():
+        print(f"{name}={url}")
+
+    web.run_app(create_app(args.recordings, parse_faults(args), args.record, args.synthetic), host=args.host, port=args.port)